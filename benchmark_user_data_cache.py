@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória do cache de dados de usuários (utils/generate_user_data.py)
+
+Simula um soak test em que cada usuário é gerado uma vez, com user_id sempre
+crescendo, e mede com tracemalloc a memória retida por usuário em cache:
+
+    antes   - dict por usuário (6 chaves) em dicts de classe sem limite
+    depois  - UserRecord (__slots__) em LRU, sem limite e com limite
+    lote    - UserDataBatch (arrays NumPy), sem cache
+
+Uso:
+    python benchmark_user_data_cache.py
+    python benchmark_user_data_cache.py --users 200000 --cache-size 10000
+"""
+import argparse
+import gc
+import random
+import string
+import time
+import tracemalloc
+
+from utils.generate_user_data import OptimizedUserData, FastCPFGenerator, NOMES
+
+
+def legacy_generate(cache, cpf_cache, user_id):
+    """Geração antiga: dict por usuário, caches sem limite"""
+    if user_id in cache:
+        return cache[user_id]
+    rng = random.Random(user_id)
+    telefone = f"5545{''.join([str(rng.randint(0, 9)) for _ in range(8)])}"
+    email = f"{''.join(rng.choices(string.ascii_lowercase, k=8))}@smarttalks.com.br"
+    cpf_formatted = FastCPFGenerator.compute_cpf(user_id)
+    cpf_cache[user_id] = cpf_formatted
+    data = {
+        'user_id': user_id,
+        'telefone': telefone,
+        'email': email,
+        'cpf_formatted': cpf_formatted,
+        'cpf_numbers': FastCPFGenerator.cpf_only_numbers(cpf_formatted),
+        'nome': f"{rng.choice(NOMES)} {'Smart Talks'}"
+    }
+    cache[user_id] = data
+    return data
+
+
+def measure(label, run):
+    """Executa `run` e devolve (rótulo, bytes retidos, segundos)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = run()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return label, retained, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória por usuário em cache")
+    parser.add_argument("--users", type=int, default=50_000, help="Usuários gerados (user_id 1..N)")
+    parser.add_argument("--cache-size", type=int, default=10_000, help="Limite do LRU no cenário limitado")
+    args = parser.parse_args()
+    users = args.users
+
+    def before():
+        cache, cpf_cache = {}, {}
+        for user_id in range(1, users + 1):
+            legacy_generate(cache, cpf_cache, user_id)
+        return cache, cpf_cache
+
+    def after(max_entries):
+        def run():
+            OptimizedUserData.set_cache_size(max_entries)
+            OptimizedUserData._cache.clear()
+            for user_id in range(1, users + 1):
+                OptimizedUserData.generate_data(user_id)
+            return None
+        return run
+
+    def batch():
+        return OptimizedUserData.generate_batch(users)
+
+    # No cenário "antes" os CPFs ficam no dict próprio dele, não no LRU
+    OptimizedUserData.set_cache_size(0)
+    results = [measure("antes: dict sem limite", before) + (users,)]
+    results.append(measure("depois: UserRecord, LRU sem limite", after(None)) + (users,))
+    unbounded_stats = OptimizedUserData.cache_summary()
+    results.append(measure(f"depois: UserRecord, LRU {args.cache_size}", after(args.cache_size))
+                   + (min(users, args.cache_size),))
+    bounded_stats = OptimizedUserData.cache_summary()
+    results.append(measure("lote NumPy (sem cache)", batch) + (users,))
+
+    print(f"\n{users} usuários gerados uma vez cada (user_id crescente)\n")
+    print(f"{'Cenário':<40} {'Retido':>10} {'Em memória':>11} {'Bytes/usuário':>14} {'Tempo':>8}")
+    print("-" * 87)
+    for label, retained, elapsed, entries in results:
+        print(f"{label:<40} {retained / 1024 / 1024:>8.1f}MB {entries:>11} {retained / entries:>14.1f} {elapsed:>7.2f}s")
+
+    print(f"\nLRU sem limite:  {unbounded_stats['users']}")
+    print(f"LRU limitado:    {bounded_stats['users']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos receptores de webhook: Flask, FastAPI e gevent (pywsgi)
+
+Cada receptor sobe em um processo próprio, importando o app real do
+locustfile correspondente (com o monkey-patch do gevent que o Locust aplica).
+Este processo dispara POSTs concorrentes em /responses/<session_id> durante
+alguns segundos por nível de concorrência e reporta webhooks/s e latências.
+
+Uso:
+    python benchmark_webhook_receivers.py
+    python benchmark_webhook_receivers.py --servers gevent flask --duration 5 --concurrency 50 200
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import time
+
+import gevent
+from geventhttpclient import HTTPClient
+
+BASE_PORT = 5101
+SERVERS = ["gevent", "flask", "fastapi"]
+WEBHOOK_PAYLOAD = json.dumps({
+    "messages": [{"role": "assistant", "type": "text", "text": "Olá! Como posso te ajudar hoje? 😊"}]
+})
+
+
+def serve(kind, port):
+    """Sobe um receptor (modo subprocesso)"""
+    if kind == "flask":
+        import locustfile
+        logging.disable(logging.INFO)
+        locustfile.flask_app.run(host="127.0.0.1", port=port, debug=False, use_reloader=False, threaded=True)
+    elif kind == "fastapi":
+        import locustfile_fast
+        logging.disable(logging.INFO)
+        locustfile_fast.FLASK_HOST = "127.0.0.1"
+        locustfile_fast.FLASK_PORT = port
+        locustfile_fast.start_fastapi()
+    elif kind == "gevent":
+        import locustfile
+        from utils.webhook_server import make_webhook_app, start_gevent_server
+        logging.disable(logging.INFO)
+        server = start_gevent_server(make_webhook_app(locustfile.webhook_store), "127.0.0.1", port)
+        server.serve_forever()
+    else:
+        raise ValueError(f"Unknown server: {kind}")
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            client = HTTPClient("127.0.0.1", port, connection_timeout=1, network_timeout=1)
+            if client.get("/health").status_code == 200:
+                client.close()
+                return True
+        except Exception:
+            pass
+        gevent.sleep(0.2)
+    return False
+
+
+def run_load(port, concurrency, duration):
+    """Loop fechado: `concurrency` greenlets enviando webhooks até o fim do tempo"""
+    client = HTTPClient("127.0.0.1", port, concurrency=concurrency,
+                        connection_timeout=10, network_timeout=30)
+    latencies = []
+    errors = [0]
+    deadline = time.time() + duration
+    headers = {"Content-Type": "application/json"}
+
+    def worker(worker_id):
+        n = 0
+        while time.time() < deadline:
+            n += 1
+            start = time.perf_counter()
+            try:
+                response = client.post(f"/responses/bench-{worker_id}-{n}", body=WEBHOOK_PAYLOAD, headers=headers)
+                response.read()
+                if response.status_code != 200:
+                    errors[0] += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors[0] += 1
+
+    start = time.time()
+    gevent.joinall([gevent.spawn(worker, i) for i in range(concurrency)])
+    elapsed = time.time() - start
+    client.close()
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+    return {
+        'concurrency': concurrency,
+        'webhooks': len(latencies),
+        'errors': errors[0],
+        'webhooks_per_sec': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': pct(0.50),
+        'p99_ms': pct(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", nargs="+", default=SERVERS, choices=SERVERS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[10, 50, 200, 500])
+    parser.add_argument("--duration", type=float, default=5.0, help="segundos por nível de concorrência")
+    parser.add_argument("--serve", choices=SERVERS, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=BASE_PORT, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    best = {}
+    print(f"{'server':<8} {'conc':>5} {'webhooks/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for i, kind in enumerate(args.servers):
+        port = BASE_PORT + i
+        proc = subprocess.Popen([sys.executable, __file__, "--serve", kind, "--port", str(port)],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_until_ready(port):
+                print(f"{kind:<8} failed to start")
+                continue
+            for concurrency in args.concurrency:
+                result = run_load(port, concurrency, args.duration)
+                print(f"{kind:<8} {concurrency:>5} {result['webhooks_per_sec']:>11.0f} "
+                      f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}")
+                best[kind] = max(best.get(kind, 0.0), result['webhooks_per_sec'])
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print()
+    print("Max sustained webhooks/s:")
+    for kind, rate in sorted(best.items(), key=lambda item: -item[1]):
+        print(f"  {kind:<8} {rate:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
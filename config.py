@@ -32,6 +32,62 @@ FLASK_HOST = "0.0.0.0"
 # Path base para webhooks
 WEBHOOK_PATH = "/responses"
 
+# Servidor que recebe os webhooks:
+#   "gevent" - WSGIServer do gevent no mesmo hub dos usuários do Locust (recomendado)
+#   "native" - servidor original de cada locustfile (Flask ou FastAPI em thread separada)
+WEBHOOK_SERVER = "gevent"
+
+# Como a Voyager alcança o receptor de webhooks:
+#   "ngrok"  - túnel público HTTPS criado a cada execução
+#   "direct" - URL direta em CALLBACK_BASE_URL, sem ngrok (rede local, IP interno
+#              ou load balancer); não adiciona TLS nem ida e volta pública
+CALLBACK_TRANSPORT = "ngrok"
+
+# URL base usada com CALLBACK_TRANSPORT = "direct" (deve ser alcançável pela Voyager)
+CALLBACK_BASE_URL = f"http://127.0.0.1:{FLASK_PORT}"
+
+# ============================================================================
+# VOYAGER LOCAL (mock_voyager.py)
+# ============================================================================
+
+# Host/porta do mock. Para usá-lo: VOYAGER_API_URL = "http://127.0.0.1:8081"
+# e CALLBACK_TRANSPORT = "direct"
+MOCK_VOYAGER_HOST = "0.0.0.0"
+MOCK_VOYAGER_PORT = 8081
+
+# Distribuição do atraso entre o 202 e o webhook:
+#   {"type": "constant", "ms": 2000}
+#   {"type": "lognormal", "median_ms": 2500, "sigma": 0.6}
+#   {"type": "histogram", "file": "latencias.json"}  (lista de amostras em ms
+#                                                     ou {"buckets": [[ms, peso], ...]})
+MOCK_LATENCY = {"type": "lognormal", "median_ms": 2500, "sigma": 0.6}
+
+# Roteiro de respostas (a última contém o link de pagamento)
+MOCK_SCRIPT_FILE = "fixed_conversation/user_assistant_messages.txt"
+
+# Conversas sem mensagens há mais que isto (segundos) são descartadas
+MOCK_SESSION_TTL = 600
+
+# Perfis de falha do mock: probabilidade por turno de cada falha
+#   http_5xx  - POST responde 503          drop      - webhook nunca chega
+#   duplicate - webhook enviado 2 vezes     reorder   - resposta em partes, fora de ordem
+#   alt_field - texto em `text`, sem `messages`
+#   empty     - `messages` vazio            slow_tail - atraso x Pareto(slow_tail_alpha)
+MOCK_FAULT_PROFILES = {
+    "none": {},
+    "drops": {"drop": 0.05},
+    "duplicates": {"duplicate": 0.2},
+    "reorder": {"reorder": 0.3},
+    "errors": {"http_5xx": 0.05},
+    "formats": {"alt_field": 0.1, "empty": 0.02},
+    "slow_tail": {"slow_tail": 0.05, "slow_tail_alpha": 1.2},
+    "flaky": {"drop": 0.02, "duplicate": 0.05, "reorder": 0.05, "http_5xx": 0.02,
+              "alt_field": 0.02, "slow_tail": 0.02},
+}
+
+# Perfil usado quando --fault-profile não é informado
+MOCK_FAULT_PROFILE = "none"
+
 # ============================================================================
 # CONFIGURAÇÕES DE TESTE
 # ============================================================================
@@ -45,12 +101,200 @@ MESSAGE_TYPE = "text"
 # Timeout para aguardar resposta do webhook (segundos)
 WEBHOOK_TIMEOUT = 120
 
-# Intervalo de polling para verificar webhook (segundos)
-POLLING_INTERVAL = 0.5
-
 # Tempo de espera entre requisições de um mesmo usuário (segundos)
 USER_WAIT_TIME = 3
 
+# Cronograma planejado dos turnos de uma conversa: segundos entre o envio de um
+# turno e o do próximo. O usuário nunca envia antes do horário planejado; se a
+# Voyager atrasar e o envio sair depois do horário, o atraso entra na latência
+# corrigida (coordinated omission: "coordinated_omission" no resumo e
+# "Voyager Webhook Corrected" no Locust). Use a cadência de um cliente real
+# (resposta da Voyager + tempo para responder), ex.: 8.0.
+# None = sem cronograma (0.5s entre os turnos; corrigida = medida, sem a entrada
+# "Voyager Webhook Corrected").
+# O locust_replay.py usa o cronograma gravado de cada conversa
+TURN_PACING_INTERVAL = None
+
+# Modelo de carga:
+#   "closed" - cada usuário do Locust faz uma conversa e fica parado; o ritmo
+#              de conversas novas é a taxa de spawn (-r)
+#   "open"   - conversas novas começam no ritmo de ARRIVAL_PROFILE, mesmo se a
+#              Voyager ficar lenta. O número de usuários (-u) passa a ser o
+#              limite de conversas simultâneas e o usuário que termina volta
+#              como um novo cliente (novos dados e persona)
+LOAD_MODEL = "closed"
+
+# Ritmo de chegada de conversas novas no modelo "open" (conversas/s):
+#   {"type": "constant", "rate": 0.5}
+#   {"type": "ramp", "start_rate": 0.1, "end_rate": 2.0, "duration": 600}  (depois da rampa fica em end_rate)
+#   {"type": "poisson", "rate": 0.5}  (intervalos exponenciais, como clientes reais)
+# "constant" e "ramp" também aceitam "poisson": True
+ARRIVAL_PROFILE = {"type": "constant", "rate": 0.5}
+
+# Segundos que uma chegada espera por um usuário livre (todos em conversa)
+# antes de ser descartada como "Missed Arrival". None = espera sempre
+ARRIVAL_MAX_DELAY = 30
+
+# Gera os dados (telefone, e-mail, CPF) dos usuários 1..N de uma vez, com
+# NumPy, no início do teste, em vez de um por vez durante o spawn. Útil para
+# populações grandes. 0 = gera cada usuário sob demanda
+USER_DATA_PRELOAD = 0
+
+# Semente do lote acima (mesma semente = mesmos dados)
+USER_DATA_SEED = 0
+
+# Máximo de usuários gerados sob demanda mantidos em cache (LRU). Cada
+# usuário é gerado uma vez, então em soak tests longos um cache sem limite só
+# cresce. None = sem limite
+USER_DATA_CACHE_SIZE = 10_000
+
+# Roteiro de mensagens do locust_fixed.py (lista JSON). Placeholders
+# preenchidos com os dados de cada usuário antes da conversa:
+# {nome}, {telefone}, {email}, {cpf_formatted}, {cpf_numbers}
+FIXED_MESSAGES_FILE = "fixed_conversation/user_messages.txt"
+
+# ============================================================================
+# PERSONAS (locustfile.py / locustfile_fast.py)
+# ============================================================================
+
+# Roteiros das personas, carregados uma vez no início do teste. Cada usuário
+# recebe um deles ao acaso; uma persona nova que case com o padrão entra
+# automaticamente. Placeholders preenchidos com os dados do usuário:
+# {nome}, {telefone}, {email}, {cpf_formatted}, {cpf_numbers}
+PERSONAS_GLOB = "personas/persona_*.txt"
+
+# ============================================================================
+# SIMULADOR DE USUÁRIO (locustfile.py / locustfile_fast.py)
+# ============================================================================
+
+# Quem responde à Voyager no papel do cliente:
+#   "gemini"   - chat do Gemini com a persona (realista, mas custa tokens e sofre 429)
+#   "scripted" - simulador local por regras a partir do roteiro da persona e dos
+#                dados do usuário (sem rede e sem custo; para testes de alta escala)
+USER_SIMULATOR = "gemini"
+
+# Tempo de resposta do simulador "scripted": faixa (mín, máx) em segundos.
+# (0.0, 0.0) = responde na hora
+SCRIPTED_RESPONSE_DELAY = (0.0, 0.0)
+
+# ============================================================================
+# CACHE DE RESPOSTAS DO GEMINI (locustfile.py / locustfile_fast.py)
+# ============================================================================
+
+# Reaproveita a resposta da persona em turnos que se repetem entre usuários
+# (saudação, opt-in...). Telefone, e-mail e CPF são guardados como placeholders
+# e preenchidos com os dados de cada usuário
+GEMINI_CACHE_ENABLED = False
+
+# Arquivo onde o cache é salvo ao final e recarregado no início (None = só em memória)
+GEMINI_CACHE_FILE = "logs/gemini_cache.json.gz"
+
+# Número máximo de respostas guardadas (as menos usadas saem primeiro)
+GEMINI_CACHE_MAX_ENTRIES = 5000
+
+# Validade de cada resposta (segundos); vale também entre execuções
+GEMINI_CACHE_TTL = 86400
+
+# Contexto que entra na chave, além da persona e da mensagem da Voyager:
+#   "turn"    - número do turno (mais acertos)
+#   "history" - hash de todas as mensagens da Voyager até o turno (mais fiel)
+GEMINI_CACHE_KEY = "turn"
+
+# Fração dos acertos servida do cache (o resto vai ao Gemini e renova a entrada).
+# 1.0 = sempre usa o cache quando houver resposta; 0.5 = metade vai ao Gemini
+GEMINI_CACHE_HIT_RATE = 1.0
+
+# ============================================================================
+# POOL DE CLIENTES DO GEMINI (locustfile.py / locustfile_fast.py)
+# ============================================================================
+
+# Clientes genai.Client compartilhados por todos os usuários (cada um tem seu
+# próprio pool de conexões HTTP). Os chats dos usuários são criados a partir deles
+GEMINI_POOL_CLIENTS = 1
+
+# Máximo de sockets abertos com o Gemini, somando todos os clientes
+GEMINI_POOL_MAX_CONNECTIONS = 100
+
+# Máximo de chamadas simultâneas ao Gemini; as demais esperam uma vaga
+# (métrica "Gemini Pool Wait"). None = sem limite
+GEMINI_POOL_MAX_IN_FLIGHT = 100
+
+# Esperas menores que isto (ms) não viram entrada "Gemini Pool Wait" nem
+# "Gemini Queue Wait" no Locust, só entram no resumo (gemini_pool,
+# gemini_scheduler): sem o limite cada chamada ao Gemini gera entradas de
+# 0 ms, e as esperas reais somem na média
+GEMINI_WAIT_EVENT_MIN_MS = 1
+
+# ============================================================================
+# LIMITES DE TAXA DO GEMINI (locustfile.py / locustfile_fast.py)
+# ============================================================================
+
+# Cota do projeto no Gemini: requisições e tokens (entrada + saída) por minuto.
+# As chamadas que não cabem na janela do último minuto esperam em uma fila
+# justa (métrica "Gemini Queue Wait"). None = sem limite
+GEMINI_RPM = 1000
+GEMINI_TPM = 1_000_000
+
+# Número de processos do Locust que dividem a mesma cota (ex.: --processes 4
+# ou vários workers); cada processo usa 1/N dos limites acima
+GEMINI_RATE_LIMIT_PROCESSES = 1
+
+# Após um 429 do Gemini, as admissões ficam suspensas por este tempo (segundos)
+GEMINI_429_COOLDOWN = 5
+
+# ============================================================================
+# JANELA DE HISTÓRICO DO GEMINI
+# ============================================================================
+
+# Turnos (mensagem da Voyager + resposta da persona) reenviados ao Gemini a
+# cada chamada, além da persona. Sem janela, os tokens de entrada crescem a
+# cada turno e o custo da conversa cresce de forma quadrática; com janela, a
+# persona responde só com o contexto recente e os tokens não são comparáveis
+# com testes sem ela. Ex.: 8
+# 0 = histórico completo (comportamento do Chat do google-genai)
+GEMINI_HISTORY_TURNS = 0
+
+# Resumo dos turnos que saíram da janela, anexado à persona:
+# "none" (descarta), "local" (linhas dos turnos antigos, sem chamada extra)
+# ou "gemini" (o Gemini reescreve o resumo a cada GEMINI_HISTORY_TURNS/2 turnos)
+GEMINI_HISTORY_SUMMARY = "local"
+
+# Tamanho máximo do resumo, em caracteres
+GEMINI_HISTORY_SUMMARY_MAX_CHARS = 1500
+
+# ============================================================================
+# RETRY E CIRCUIT BREAKER
+# ============================================================================
+
+# Retry com backoff exponencial e "full jitter": a espera antes da tentativa
+# n+1 é sorteada entre 0 e min(max_delay, base_delay * 2^n), para que os
+# usuários não tentem de novo todos juntos. O orçamento limita os retries do
+# processo: cada chamada acrescenta budget_ratio retries, até budget_reserve
+# acumulados. A Voyager só repete 429, 5xx e erros de conexão
+GEMINI_RETRY = {"max_attempts": 3, "base_delay": 1.0, "max_delay": 20.0, "budget_ratio": 0.2, "budget_reserve": 20}
+VOYAGER_RETRY = {"max_attempts": 3, "base_delay": 0.5, "max_delay": 10.0, "budget_ratio": 0.1, "budget_reserve": 10}
+
+# Circuit breaker por dependência: abre após failure_threshold falhas seguidas
+# (na Voyager, timeouts de webhook também contam). Aberto, as chamadas falham
+# na hora (evento "<Dependência> Circuit Open"); após recovery_timeout
+# segundos, uma chamada de teste decide se ele volta a fechar. Resultados
+# atrasados de outras chamadas não mudam o estado. probe_timeout (padrão:
+# recovery_timeout) é o prazo da chamada de teste antes de ser dada como
+# perdida; na Voyager ela só termina com o webhook, então cobre o WEBHOOK_TIMEOUT
+GEMINI_BREAKER = {"failure_threshold": 10, "recovery_timeout": 30}
+VOYAGER_BREAKER = {"failure_threshold": 20, "recovery_timeout": 30, "probe_timeout": WEBHOOK_TIMEOUT + 30}
+
+# ============================================================================
+# REPLAY DE CONVERSAS GRAVADAS (locust_replay.py)
+# ============================================================================
+
+# Corpus gerado por: python -m utils.replay_corpus logs/conversation_*.json
+REPLAY_CORPUS_FILE = "logs/replay_corpus.json.gz"
+
+# Velocidade do replay: 1.0 = ritmo original, 2.0 = 2x mais rápido,
+# 0 = sem tempo de "pensar" entre turnos
+REPLAY_SPEED = 1.0
+
 # ============================================================================
 # CONFIGURAÇÕES DE LOG
 # ============================================================================
@@ -61,6 +305,56 @@ LOG_LEVEL = "INFO"
 # Formato do log
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 
+# Os logs só entram em uma fila; uma thread grava no arquivo e no terminal fora
+# do hub do gevent.
+#   "verbose" - todos os registros a partir de LOG_LEVEL
+#   "quiet"   - WARNING/ERROR sempre e só uma amostra (LOG_SAMPLE_RATE) dos
+#               registros de cada turno; use em testes com muitos usuários
+LOG_MODE = "verbose"
+
+# Fração dos registros INFO/DEBUG mantida no modo "quiet"
+LOG_SAMPLE_RATE = 0.01
+
+# Registros aguardando gravação; com a fila cheia os abaixo de WARNING são
+# descartados (contados em "logging" no resumo do teste)
+LOG_QUEUE_SIZE = 10_000
+
+# Cada conversa encerrada é gravada na hora em logs/load_test_*results_*.jsonl
+# (uma linha por conversa; o resumo final é somado durante o teste, sem guardar
+# as conversas em memória). True = grava em gzip (.jsonl.gz)
+RESULTS_COMPRESS = False
+
+# Logs de cada conversa: gravados em segundo plano (fora do hub do gevent) em
+# segmentos logs/conversations_*_NNNN.jsonl, com um índice .idx por session_id.
+# Um segmento novo é aberto ao passar deste tamanho (MB)
+CONVERSATION_LOG_SEGMENT_MB = 64
+
+# Logs aguardando gravação; com a fila cheia, o usuário espera uma vaga
+# (evento "Conversation Log Queue Wait")
+CONVERSATION_LOG_QUEUE_SIZE = 1000
+
+# Máximo de logs serializados e gravados de uma vez pelo escritor
+CONVERSATION_LOG_BATCH_SIZE = 50
+
+# ============================================================================
+# LATÊNCIA POR TURNO
+# ============================================================================
+
+# Histogramas (estilo HDR, memória fixa) por número do turno para o POST aceito
+# pela Voyager, a espera do webhook e o Gemini; p50/p90/p99/p99.9 de cada turno
+# vão para "turn_latency" no resumo do teste.
+# Maior latência rastreada (ms); valores acima contam como este valor
+TURN_HISTOGRAM_MAX_MS = 600_000
+
+# Dígitos significativos mantidos em toda a faixa (2 = erro de ~1%)
+TURN_HISTOGRAM_DIGITS = 2
+
+# Também cria uma entrada no Locust por etapa e turno (tipo "TURN", ex.:
+# "Voyager Webhook T03"), com os percentis do turno na UI e no CSV do Locust.
+# São até 3 x MAX_ITERATIONS linhas a mais na tabela; os histogramas por turno
+# ("turn_latency" no resumo) são gravados de qualquer forma
+TURN_STATS_IN_LOCUST = False
+
 # ============================================================================
 # CONFIGURAÇÕES OPCIONAIS
 # ============================================================================
@@ -71,6 +365,20 @@ SHOW_FULL_PAYLOAD = False
 # Limpar webhooks da memória após recuperar
 CLEAR_WEBHOOKS_AFTER_READ = True
 
+# Tempo máximo (segundos) que um webhook fica na memória antes de ser descartado.
+# Webhooks descartados sem leitura viram o evento "Orphaned Webhook"; os que
+# chegam após o WEBHOOK_TIMEOUT viram "Late Webhook" (com o atraso em ms)
+WEBHOOK_TTL = 300
+
+# Um turno da Voyager pode chegar em vários webhooks. Eles são acumulados até
+# passar esta janela (segundos) sem novos webhooks para a sessão.
+# 0 = o turno fecha no primeiro webhook
+WEBHOOK_COALESCE_WINDOW = 0.0
+
+# Campo do payload que marca o fim do turno (fecha na hora, sem esperar a janela).
+# None = só a janela de silêncio fecha o turno
+WEBHOOK_END_OF_TURN_FIELD = None
+
 # Número máximo de caracteres da resposta a exibir no log
 MAX_RESPONSE_CHARS = 100
 
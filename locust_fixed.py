@@ -3,42 +3,44 @@
 import logging
 import time
 import uuid
-import re
 import os
 import json
 from threading import Thread, Lock
 from flask import Flask, request, jsonify
-from locust import HttpUser, task, events, constant_pacing
+from locust import HttpUser, task, events, constant_pacing, constant
 from pyngrok import ngrok
 from dotenv import load_dotenv
 import requests as req
 from config import (
     VOYAGER_API_URL, VOYAGER_ENDPOINT, CHANNEL_ID, CLIENT_DOMAIN,
     FLASK_PORT, FLASK_HOST, WEBHOOK_PATH, DEFAULT_MESSAGE, MESSAGE_TYPE,
-    WEBHOOK_TIMEOUT, POLLING_INTERVAL, USER_WAIT_TIME,
-    LOG_LEVEL, LOG_FORMAT, MAX_RESPONSE_CHARS, CLEAR_WEBHOOKS_AFTER_READ
+    WEBHOOK_TIMEOUT, USER_WAIT_TIME, LOAD_MODEL, ARRIVAL_PROFILE, ARRIVAL_MAX_DELAY, TURN_PACING_INTERVAL, USER_DATA_PRELOAD, USER_DATA_SEED, USER_DATA_CACHE_SIZE,
+    FIXED_MESSAGES_FILE,
+    LOG_LEVEL, LOG_FORMAT, LOG_MODE, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE, RESULTS_COMPRESS, MAX_RESPONSE_CHARS, CLEAR_WEBHOOKS_AFTER_READ,
+    CONVERSATION_LOG_SEGMENT_MB, CONVERSATION_LOG_QUEUE_SIZE, CONVERSATION_LOG_BATCH_SIZE,
+    TURN_HISTOGRAM_MAX_MS, TURN_HISTOGRAM_DIGITS, TURN_STATS_IN_LOCUST,
+    WEBHOOK_SERVER, WEBHOOK_TTL, WEBHOOK_COALESCE_WINDOW, WEBHOOK_END_OF_TURN_FIELD,
+    CALLBACK_TRANSPORT, CALLBACK_BASE_URL,
+    VOYAGER_RETRY, VOYAGER_BREAKER
 )
 from utils.generate_user_data import OptimizedUserData
+from utils.persona_templates import MessageScript
+from utils.webhook_store import WebhookStore
+from utils.results_sink import ResultsSink
+from utils.log_pipeline import setup_logging, pipeline_stats
+from utils.conversation_log import ConversationLogWriter
+from utils.turn_histograms import TurnLatencyTracker
+from utils.conversation_stages import StageClassifier, ConversationStages, StageFunnel
+from utils.pacing import TurnSchedule, CoordinatedOmissionStats
+from utils.arrivals import ArrivalSchedule, ArrivalDriver
+from utils.webhook_server import make_webhook_app, start_gevent_server
+from utils.resilience import RetryPolicy, CircuitBreaker, CircuitOpenError
 
 # Load environment variables
 load_dotenv()
 
-# Load fixed user messages from file
-FIXED_USER_MESSAGES = [
-  "Olá",
-  "Bom dia! Edman Smart 😉",
-  "Sim, claro! Pode enviar 😊",
-  "Quero comprar ingressos do Aqua Park, por favor! 🎟️🌴",
-  "Ah, legal! 🤩 Poderia consultar a disponibilidade das datas pra mim, por favor?",
-  "Uhm, para o segundo sábado de novembro, por favor! Que seria 08/11/25 ou 09/11/2025, né? 🤔",
-  "Ah, que bom! Pode ser para o dia 08/11/2025 mesmo!\n\nVou precisar de: 1 adulto, 1 gestante e 2 idosos. 😊",
-  "Não, obrigada! Só os ingressos mesmo, por favor. 😉",
-  "Meu nome é Edman Smart. 😉",
-  "É 554501152449. 😊",
-  "farzquwn@smarttalks.com.br, por favor! 😊",
-  "É 011.524.493-03. 😉",
-  "Tudo certo! Pode gerar o link. Vou querer pagar com Pix, por favor. 😉"
-]
+# Load fixed user messages from file (templates, filled in per user)
+FIXED_USER_MESSAGES = MessageScript.load(FIXED_MESSAGES_FILE)
 
 # Configuration Constants
 MAX_ITERATIONS = len(FIXED_USER_MESSAGES) if FIXED_USER_MESSAGES else 20
@@ -52,26 +54,185 @@ if not os.path.exists(logs_dir):
 # Setup logging to both file and console
 log_file = os.path.join(logs_dir, f"load_test_{time.strftime('%d_%m_%y_%H_%M')}.log")
 
-# Configure root logger
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format=LOG_FORMAT,
-    handlers=[
-        logging.FileHandler(log_file),  # Log to file
-        logging.StreamHandler()         # Log to console
-    ]
+# Records only go onto a queue; a threadpool thread writes them to the file and
+# the terminal off the hub. LOG_MODE = "quiet" keeps errors plus a sample of the rest
+logger, console, log_listener = setup_logging(
+    __name__, log_file, LOG_LEVEL, LOG_FORMAT,
+    mode=LOG_MODE, sample_rate=LOG_SAMPLE_RATE, queue_size=LOG_QUEUE_SIZE
 )
-logger = logging.getLogger(__name__)
 
 # Personas will be loaded randomly for each user in on_start method
 
-# Armazenamento de respostas dos webhooks
-webhook_responses = {}
-responses_lock = Lock()
 
-# Storage for conversation results
-conversation_results = []
-results_lock = Lock()
+def on_late_webhook(session_id, late_by):
+    """Webhook que chegou depois do WEBHOOK_TIMEOUT (o usuário já desistiu)"""
+    logger.warning(f"⏰ Webhook atrasado para session_id: {session_id} ({late_by:.1f}s após o timeout)")
+    events.request.fire(
+        request_type="WEBHOOK",
+        name="Late Webhook",
+        response_time=late_by * 1000,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+def on_orphan_webhook(session_id, age):
+    """Webhook que expirou (WEBHOOK_TTL) sem nunca ter sido lido"""
+    logger.warning(f"🗑️  Webhook órfão removido para session_id: {session_id} ({age:.0f}s sem leitura)")
+    events.request.fire(
+        request_type="WEBHOOK",
+        name="Orphaned Webhook",
+        response_time=age * 1000,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+# Armazenamento de respostas dos webhooks (acorda o usuário assim que chega)
+webhook_store = WebhookStore(
+    clear_after_read=CLEAR_WEBHOOKS_AFTER_READ,
+    ttl=WEBHOOK_TTL,
+    on_late=on_late_webhook,
+    on_orphan=on_orphan_webhook,
+    coalesce_window=WEBHOOK_COALESCE_WINDOW,
+    end_of_turn_field=WEBHOOK_END_OF_TURN_FIELD
+)
+
+
+def on_breaker_state_change(name, old_state, new_state):
+    """Troca de estado de um circuit breaker (a linha do tempo vai para o resumo)"""
+    if new_state == "open":
+        logger.error(f"🔌 Circuit breaker {name}: {old_state} -> {new_state} (chamadas falham na hora)")
+    else:
+        logger.warning(f"🔌 Circuit breaker {name}: {old_state} -> {new_state}")
+
+
+def on_circuit_open(name, error):
+    """Chamada recusada com o circuito aberto: evento próprio, sem tocar na dependência"""
+    events.request.fire(
+        request_type="CIRCUIT",
+        name=f"{name} Circuit Open",
+        response_time=0,
+        response_length=0,
+        exception=error,
+        context={}
+    )
+
+
+# Retry e circuit breaker das chamadas à Voyager
+voyager_retry = RetryPolicy(**VOYAGER_RETRY)
+voyager_breaker = CircuitBreaker("Voyager", on_state_change=on_breaker_state_change, **VOYAGER_BREAKER)
+
+# Conversation results, streamed to JSONL as each conversation ends (totals kept as running sums).
+# Created in on_locust_init, named after the running user class (file_suffix)
+results_sink = None
+
+
+def on_conversation_log_written(lag):
+    """Time between a conversation ending and its log reaching disk (background writer)"""
+    # response_length carries the writer queue depth (shown as the average size)
+    events.request.fire(
+        request_type="LOG",
+        name="Conversation Log Lag",
+        response_time=lag * 1000,
+        response_length=conversation_log.queue_depth(),
+        exception=None,
+        context={}
+    )
+
+
+# Conversation logs, written off the hub into rolling segment files indexed by session_id
+# (created in on_locust_init, like results_sink)
+conversation_log = None
+
+
+# Per-turn latency histograms (HDR-style, bounded memory) for each conversation stage
+turn_latency = TurnLatencyTracker(max_ms=TURN_HISTOGRAM_MAX_MS, significant_digits=TURN_HISTOGRAM_DIGITS)
+
+# Locust entry names per stage, suffixed with the turn ("Voyager Webhook T03")
+TURN_STAGE_NAMES = {
+    'voyager_post': "Voyager POST",
+    'voyager_webhook': "Voyager Webhook"
+}
+
+
+def record_turn_latency(stage, turn, response_time, exception=None):
+    """Latência de uma etapa no turno: histograma do turno e entrada "TURN" no Locust (TURN_STATS_IN_LOCUST)"""
+    if exception is None:
+        turn_latency.record(stage, turn, response_time)
+    if TURN_STATS_IN_LOCUST:
+        events.request.fire(
+            request_type="TURN",
+            name=f"{TURN_STAGE_NAMES[stage]} T{turn:02d}",
+            response_time=response_time,
+            response_length=0,
+            exception=exception,
+            context={}
+        )
+
+
+# Booking stage of each Voyager reply (precompiled patterns) and the test-wide funnel
+stage_classifier = StageClassifier()
+stage_funnel = StageFunnel(stage_classifier.stages, max_ms=TURN_HISTOGRAM_MAX_MS)
+
+# Raw vs coordinated-omission-corrected turn latency (pacing schedule: utils/pacing.py)
+co_stats = CoordinatedOmissionStats(max_ms=TURN_HISTOGRAM_MAX_MS)
+
+
+def record_turn_pacing(turn, webhook_ms, send_lag_ms, paced=True):
+    """Latência do turno medida desde o envio e corrigida pelo atraso do envio em relação ao cronograma"""
+    co_stats.record(webhook_ms, send_lag_ms)
+    if not paced:
+        # Sem cronograma a corrigida é a própria medida: não duplica "Voyager Webhook"
+        return
+    turn_latency.record('voyager_webhook_corrected', turn, webhook_ms + send_lag_ms)
+    events.request.fire(
+        request_type="WEBHOOK",
+        name="Voyager Webhook Corrected",
+        response_time=webhook_ms + send_lag_ms,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+def on_arrival_start(delay):
+    """Atraso do início da conversa em relação ao horário planejado da chegada (LOAD_MODEL = "open")"""
+    events.request.fire(
+        request_type="ARRIVAL",
+        name="Conversation Start Delay",
+        response_time=delay * 1000,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+def on_arrival_missed(delay):
+    """Chegada descartada: nenhum usuário livre dentro de ARRIVAL_MAX_DELAY"""
+    events.request.fire(
+        request_type="ARRIVAL",
+        name="Missed Arrival",
+        response_time=delay * 1000,
+        response_length=0,
+        exception=Exception("No free user within ARRIVAL_MAX_DELAY"),
+        context={}
+    )
+
+
+# Open model: conversations start at ARRIVAL_PROFILE and the Locust users (-u) are the concurrency cap
+arrival_driver = ArrivalDriver(
+    ArrivalSchedule(ARRIVAL_PROFILE),
+    max_delay=ARRIVAL_MAX_DELAY,
+    on_start=on_arrival_start,
+    on_missed=on_arrival_missed
+) if LOAD_MODEL == "open" else None
+
+# Classe de usuário em execução (a VoyagerUser daqui ou a do locust_replay.py, que
+# reaproveita este módulo), definida no on_locust_init
+user_class = None
 
 # User ID counter for generating unique user data
 user_id_counter = 0
@@ -79,11 +240,19 @@ user_id_lock = Lock()
 
 # Flask app para receber webhooks
 flask_app = Flask(__name__)
-flask_app.logger.setLevel(logging.WARNING)
+# flask_app.logger é o próprio logger do locustfile (mesmo nome): silencia só
+# os logs de requisição do servidor
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
 # Variável global para armazenar a URL do ngrok
 ngrok_url = None
 
+# URL base que a Voyager usa para chamar os webhooks (ngrok ou CALLBACK_BASE_URL)
+callback_url = None
+
+# Receptor gevent (WEBHOOK_SERVER = "gevent"), parado no encerramento
+webhook_server = None
+
 
 @flask_app.route('/responses/<session_id>', methods=['POST'])
 def receive_webhook(session_id):
@@ -91,10 +260,9 @@ def receive_webhook(session_id):
     try:
         payload = request.get_json()
         
-        with responses_lock:
-            webhook_responses[session_id] = payload
+        webhook_store.put(session_id, payload)
         
-        logger.info(f"✅ Webhook recebido para session_id: {session_id}")
+        logger.debug(f"✅ Webhook recebido para session_id: {session_id}")
         logger.debug(f"Payload: {payload}")
         
         return jsonify({"status": "received"}), 200
@@ -106,7 +274,7 @@ def receive_webhook(session_id):
 @flask_app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "ok", "responses_count": len(webhook_responses)}), 200
+    return jsonify({"status": "ok", "responses_count": len(webhook_store)}), 200
 
 
 def start_flask():
@@ -137,83 +305,105 @@ def start_ngrok():
 
 def save_test_results():
     """Salva os resultados do teste em arquivo JSON"""
-    with results_lock:
-        if not conversation_results:
-            logger.warning("⚠️  No conversation results to save")
-            return
-        
-        # Calculate aggregated statistics
-        total_conversations = len(conversation_results)
-        successful_conversations = sum(1 for c in conversation_results if c['found_link'])
-        total_iterations = sum(c['iterations'] for c in conversation_results)
-        total_messages = sum(c['total_messages'] for c in conversation_results)
-        total_time = sum(c['total_time_ms'] for c in conversation_results)
-        # Calculate averages
-        avg_time = total_time / total_conversations if total_conversations > 0 else 0
-        avg_iterations = total_iterations / total_conversations if total_conversations > 0 else 0
-        avg_messages = total_messages / total_conversations if total_conversations > 0 else 0
-        
-        # Build summary
-        summary = {
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-            'total_conversations': total_conversations,
-            'successful_conversations': successful_conversations,
-            'success_rate': f"{(successful_conversations/total_conversations*100):.2f}%" if total_conversations > 0 else "0%",
-            'total_iterations': total_iterations,
-            'avg_iterations_per_conversation': round(avg_iterations, 2),
-            'total_messages': total_messages,
-            'avg_messages_per_conversation': round(avg_messages, 2),
-            'total_time_ms': round(total_time, 0),
-            'avg_time_per_conversation_ms': round(avg_time, 0),
-            'mode': 'fixed_messages',
-            'fixed_messages_count': len(FIXED_USER_MESSAGES)
-        }
-        
-        # Create logs folder if it doesn't exist
-        logs_dir = "logs"
-        if not os.path.exists(logs_dir):
-            os.makedirs(logs_dir)
-        
-        # Save to JSON file
-        output_file = os.path.join(logs_dir, f"load_test_results_{time.strftime('%d_%m_%y_%H_%M')}.json")
+    results_sink.close()
+    if not results_sink:
+        logger.warning("⚠️  No conversation results to save")
+        return
+    
+    # Calculate aggregated statistics
+    totals = results_sink.totals
+    total_conversations = totals['conversations']
+    successful_conversations = totals['successful']
+    total_iterations = totals['iterations']
+    total_messages = totals['messages']
+    total_time = totals['time_ms']
+    # Calculate averages
+    avg_time = total_time / total_conversations if total_conversations > 0 else 0
+    avg_iterations = total_iterations / total_conversations if total_conversations > 0 else 0
+    avg_messages = total_messages / total_conversations if total_conversations > 0 else 0
+    
+    # Build summary
+    summary = {
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'total_conversations': total_conversations,
+        'successful_conversations': successful_conversations,
+        'success_rate': f"{(successful_conversations/total_conversations*100):.2f}%" if total_conversations > 0 else "0%",
+        'total_iterations': total_iterations,
+        'avg_iterations_per_conversation': round(avg_iterations, 2),
+        'total_messages': total_messages,
+        'avg_messages_per_conversation': round(avg_messages, 2),
+        'total_time_ms': round(total_time, 0),
+        'avg_time_per_conversation_ms': round(avg_time, 0),
+        'callback_transport': CALLBACK_TRANSPORT,
+        'callback_url': callback_url,
+        'webhooks': dict(webhook_store.stats),
+        'user_data_cache': OptimizedUserData.cache_summary()['users'],
+        'conversation_log': conversation_log.summary(),
+        'turn_latency': turn_latency.summary(),
+        'funnel': stage_funnel.summary(),
+        'coordinated_omission': dict(co_stats.summary(), **user_class.pacing_summary()),
+        'arrivals': dict(arrival_driver.summary(), max_delay_s=ARRIVAL_MAX_DELAY) if arrival_driver else None,
+        'load_model': LOAD_MODEL,
+        'logging': dict(pipeline_stats(logger), mode=LOG_MODE),
+        'retries': {'voyager': dict(voyager_retry.stats)},
+        'circuit_breakers': {'voyager': voyager_breaker.summary()},
+        **user_class.mode_summary()
+    }
+    
+    # Create logs folder if it doesn't exist
+    logs_dir = "logs"
+    if not os.path.exists(logs_dir):
+        os.makedirs(logs_dir)
+    
+    # Save to JSON file
+    output_file = os.path.join(logs_dir, f"load_test{user_class.file_suffix}_results_{time.strftime('%d_%m_%y_%H_%M')}.json")
+    
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'summary': summary,
+                'conversations_file': results_sink.path
+            }, f, indent=2, ensure_ascii=False)
         
-        # Create summary list without full message history (already saved in individual files)
-        conversations_summary = []
-        for conv in conversation_results:
-            conv_summary = {
-                'session_id': conv['session_id'],
-                'timestamp': conv['timestamp'],
-                'iterations': conv['iterations'],
-                'total_messages': conv['total_messages'],
-                'found_link': conv['found_link'],
-                'total_time_ms': conv['total_time_ms'],
-                'cost': conv['cost']
-            }
-            if 'error' in conv:
-                conv_summary['error'] = conv['error']
-            conversations_summary.append(conv_summary)
+        logger.info("=" * 80)
+        logger.info("📊 TEST RESULTS SUMMARY")
+        logger.info("=" * 80)
+        logger.info(f"✅ Total conversations: {total_conversations}")
+        logger.info(f"🎯 Successful (link found): {successful_conversations} ({summary['success_rate']})")
+        logger.info(f"📈 Total iterations: {total_iterations} (avg: {summary['avg_iterations_per_conversation']})")
+        logger.info(f"💬 Total messages: {total_messages} (avg: {summary['avg_messages_per_conversation']})")
+        logger.info(f"⏱️  Total time: {total_time/1000:.1f}s (avg: {avg_time/1000:.1f}s per conversation)")
+        logger.info(f"📝 Mode: {user_class.mode_description()}")
+        logger.info(f"🔌 Callback transport: {CALLBACK_TRANSPORT} ({callback_url})")
+        logger.info(f"📬 Webhooks: {webhook_store.stats['received']} received, {webhook_store.stats['late']} late, {webhook_store.stats['orphaned']} orphaned")
+        logger.info(f"🔁 Retries: Voyager {voyager_retry.stats['retries']} - circuit opened: Voyager {voyager_breaker.stats['opened']}x")
+        log_stats = conversation_log.summary()
+        logger.info(f"📝 Conversation logs: {log_stats['written']} written in {log_stats['segments']} segments, "
+                    f"avg lag {log_stats['avg_lag_ms']}ms, max {log_stats['max_lag_ms']}ms, peak queue depth {log_stats['peak_queue_depth']}")
+        funnel = stage_funnel.summary()
+        logger.info("🪜 Funnel: " + " -> ".join(
+            f"{stage} {stats['reached']} (p50 {stats['time_to_stage_ms']['p50']/1000:.1f}s)" for stage, stats in funnel['stages'].items()))
+        drop_offs = {stage: count for stage, count in stage_funnel.dropped_off.items() if count}
+        if drop_offs:
+            logger.info("🚪 Drop-off stages: " + ", ".join(f"{stage} {count}" for stage, count in drop_offs.items()))
+        co_summary = co_stats.summary()
+        if co_summary['turns']:
+            logger.info(f"⏲️  Turn latency p99: {co_summary['raw_ms']['p99']}ms raw, {co_summary['corrected_ms']['p99']}ms corrected "
+                        f"({co_summary['late_turns']}/{co_summary['turns']} turns sent behind schedule, max lag {co_summary['send_lag_ms']['max']}ms)")
+        if arrival_driver:
+            arrivals = arrival_driver.summary()
+            logger.info(f"📥 Arrivals ({arrivals['profile']}): {arrivals['achieved_rate']}/s achieved vs {arrivals['target_rate']}/s target "
+                        f"({arrivals['started']} started, {arrivals['missed']} missed, peak {arrivals['peak_concurrency']} in flight, "
+                        f"start delay p99 {arrivals['start_delay_ms']['p99']}ms)")
+        worst_turns = turn_latency.worst_turns('p99')
+        if worst_turns:
+            logger.info("📐 Slowest turn (p99): " + ", ".join(
+                f"{stage} turn {turn} ({ms:.0f}ms)" for stage, (turn, ms) in worst_turns.items()))
+        logger.info(f"💾 Results saved to: {output_file} (conversations: {results_sink.path}, logs: {conversation_log.index_path})")
+        logger.info("=" * 80)
         
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'summary': summary,
-                    'conversations': conversations_summary
-                }, f, indent=2, ensure_ascii=False)
-            
-            logger.info("=" * 80)
-            logger.info("📊 TEST RESULTS SUMMARY")
-            logger.info("=" * 80)
-            logger.info(f"✅ Total conversations: {total_conversations}")
-            logger.info(f"🎯 Successful (link found): {successful_conversations} ({summary['success_rate']})")
-            logger.info(f"📈 Total iterations: {total_iterations} (avg: {summary['avg_iterations_per_conversation']})")
-            logger.info(f"💬 Total messages: {total_messages} (avg: {summary['avg_messages_per_conversation']})")
-            logger.info(f"⏱️  Total time: {total_time/1000:.1f}s (avg: {avg_time/1000:.1f}s per conversation)")
-            logger.info(f"📝 Mode: Fixed messages ({len(FIXED_USER_MESSAGES)} messages)")
-            logger.info(f"💾 Results saved to: {output_file}")
-            logger.info("=" * 80)
-            
-        except Exception as e:
-            logger.error(f"❌ Error saving results: {e}")
+    except Exception as e:
+        logger.error(f"❌ Error saving results: {e}")
 
 
 @events.init.add_listener
@@ -221,32 +411,91 @@ def on_locust_init(environment, **kwargs):
     """Evento executado quando o Locust é iniciado"""
     logger.info("🚀 Iniciando sistema de teste de carga...")
     
-    # Inicia Flask em thread separada
-    logger.info("📡 Iniciando servidor Flask...")
-    flask_thread = Thread(target=start_flask, daemon=True)
-    flask_thread.start()
+    # Classe de usuário em execução: nomeia os arquivos e fornece as mensagens
+    global user_class, results_sink, conversation_log
+    user_class = environment.user_classes[0] if environment.user_classes else VoyagerUser
+    results_sink = ResultsSink(
+        os.path.join(logs_dir, f"load_test{user_class.file_suffix}_results_{time.strftime('%d_%m_%y_%H_%M')}.jsonl"),
+        compress=RESULTS_COMPRESS
+    )
+    conversation_log = ConversationLogWriter(
+        logs_dir, f"conversations{user_class.file_suffix}_{time.strftime('%d_%m_%y_%H_%M_%S')}",
+        segment_max_bytes=CONVERSATION_LOG_SEGMENT_MB * 1024 * 1024,
+        queue_size=CONVERSATION_LOG_QUEUE_SIZE,
+        batch_size=CONVERSATION_LOG_BATCH_SIZE,
+        on_written=on_conversation_log_written
+    )
+    results_sink.start()
+    conversation_log.start()
+    
+    OptimizedUserData.set_cache_size(USER_DATA_CACHE_SIZE)
+    if USER_DATA_PRELOAD:
+        # Dados de todos os usuários gerados em lote (NumPy), fora do spawn
+        batch = OptimizedUserData.preload(USER_DATA_PRELOAD, seed=USER_DATA_SEED)
+        logger.info(f"👥 Dados de {USER_DATA_PRELOAD} usuários gerados em lote")
+    else:
+        batch = None
     
-    # Aguarda Flask iniciar
-    time.sleep(2)
+    # Fonte das mensagens (roteiro fixo ou corpus de replay) preparada uma única vez
+    user_class.prepare(batch)
     
-    # Inicia ngrok
-    logger.info("🔗 Iniciando túnel ngrok...")
-    start_ngrok()
+    global webhook_server
+    if WEBHOOK_SERVER == "gevent":
+        # Receptor gevent no mesmo hub dos usuários (sem thread separada)
+        logger.info("📡 Iniciando receptor de webhooks gevent...")
+        webhook_server = start_gevent_server(make_webhook_app(webhook_store, WEBHOOK_PATH), FLASK_HOST, FLASK_PORT)
+    else:
+        # Inicia Flask em thread separada
+        logger.info("📡 Iniciando servidor Flask...")
+        flask_thread = Thread(target=start_flask, daemon=True)
+        flask_thread.start()
+        
+        # Aguarda Flask iniciar
+        time.sleep(2)
+    
+    global callback_url
+    if CALLBACK_TRANSPORT == "direct":
+        # Voyager chama o receptor diretamente, sem túnel
+        callback_url = CALLBACK_BASE_URL.rstrip('/')
+        logger.info(f"🔌 Callback direto (sem ngrok): {callback_url}")
+    else:
+        # Inicia ngrok
+        logger.info("🔗 Iniciando túnel ngrok...")
+        callback_url = start_ngrok()
     
     logger.info("✅ Sistema pronto para receber requisições!")
 
 
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    """LOG_MODE "quiet": amostra os logs só enquanto o teste roda"""
+    log_listener.set_sampling(True)
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    log_listener.set_sampling(False)
+
+
 @events.quitting.add_listener
 def on_locust_quit(environment, **kwargs):
     """Evento executado quando o Locust é encerrado"""
-    logger.info("🛑 Encerrando ngrok...")
-    try:
-        ngrok.kill()
-    except:
-        pass
+    if CALLBACK_TRANSPORT != "direct":
+        logger.info("🛑 Encerrando ngrok...")
+        try:
+            ngrok.kill()
+        except:
+            pass
+    
+    if webhook_server:
+        webhook_server.stop(timeout=1)
     
-    # Save results to JSON
+    # Write the conversation logs still queued, then save results to JSON
+    conversation_log.close()
     save_test_results()
+    
+    # Write the log records still queued
+    log_listener.stop()
 
 
 class VoyagerUser(HttpUser):
@@ -255,14 +504,44 @@ class VoyagerUser(HttpUser):
     # URL da API Voyager
     host = VOYAGER_API_URL
     
-    # Tempo de espera entre conversas completas
-    wait_time = constant_pacing(USER_WAIT_TIME)
+    # Tempo de espera entre conversas completas (modelo aberto: o ritmo vem de ARRIVAL_PROFILE)
+    wait_time = constant_pacing(USER_WAIT_TIME) if LOAD_MODEL != "open" else constant(0)
+    
+    # Modo do teste no resumo e em cada log de conversa
+    mode = 'fixed_messages'
+    
+    # Sufixo dos arquivos de resultados e de logs de conversa (ex.: load_test_replay_results_*)
+    file_suffix = ''
+    
+    @classmethod
+    def prepare(cls, user_data_batch=None):
+        """Prepares the message source once, at init (the fixed script is prerendered for a preloaded batch)"""
+        if user_data_batch is not None:
+            FIXED_USER_MESSAGES.prerender(user_data_batch)
+    
+    @classmethod
+    def mode_summary(cls):
+        """Mode fields of the test summary"""
+        return {'mode': cls.mode, 'fixed_messages_count': len(FIXED_USER_MESSAGES)}
+    
+    @classmethod
+    def mode_description(cls):
+        """Mode line of the final log"""
+        return f"Fixed messages ({len(FIXED_USER_MESSAGES)} messages)"
+    
+    @classmethod
+    def pacing_summary(cls):
+        """Pacing fields of the coordinated omission summary"""
+        return {'pacing_interval_s': TURN_PACING_INTERVAL}
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.base_session_id = None
-        self.conversation_completed = False  # Flag to ensure only one conversation per user
-        self.message_index = 0  # Track current position in fixed messages
+        self.new_customer()
+    
+    def new_customer(self):
+        """Assigns a new user ID and user data (on creation and each time the open model recycles the user)"""
+        self.conversation_completed = False  # Flag to ensure only one conversation per customer
         
         # Generate unique user ID and data
         global user_id_counter
@@ -276,35 +555,49 @@ class VoyagerUser(HttpUser):
         
     def on_start(self):
         """Initialize user session"""
+        # Fixed messages filled in with this user's data (no string work in the conversation loop)
+        self.fixed_messages = FIXED_USER_MESSAGES.messages_for(self.user_data)
         logger.info(f"🚀 User {self.user_id} starting with {len(FIXED_USER_MESSAGES)} fixed messages")
         logger.info(f"📋 User data - Phone: {self.user_data['telefone']}, Email: {self.user_data['email']}, CPF: {self.user_data['cpf_formatted']}")
     
+    def recycle(self):
+        """Open model: a user whose conversation finished comes back as a new customer"""
+        self.new_customer()
+        self.on_start()
+    
+    def messages_to_send(self):
+        """User messages of this customer's conversation, in order"""
+        return self.fixed_messages
+    
+    def turn_schedule(self, start):
+        """Planned send time of each turn (TURN_PACING_INTERVAL)"""
+        return TurnSchedule(start, interval=TURN_PACING_INTERVAL)
+    
+    def wait_for_next_turn(self, schedule, turn):
+        """Small delay after turn `turn`, never ahead of the pacing schedule (TURN_PACING_INTERVAL)"""
+        schedule.wait_for(turn + 1)
+    
+    def turn_fields(self, turn):
+        """Extra fields of the timing of turn `turn` (1, 2, ...)"""
+        return {}
+    
+    def conversation_fields(self):
+        """Extra fields of the conversation log summary"""
+        return {'fixed_messages_used': len(FIXED_USER_MESSAGES)}
+    
     def wait_for_webhook(self, session_id, timeout=WEBHOOK_TIMEOUT):
         """
-        Aguarda a resposta do webhook por polling
+        Aguarda a resposta do webhook (acordado pelo handler, sem polling)
         
         Args:
             session_id: ID da sessão para verificar
             timeout: Tempo máximo de espera em segundos
             
         Returns:
-            dict: Payload recebido ou None se timeout
+            WebhookTurn: Payload do turno (todos os webhooks combinados) e
+            instantes do primeiro/último webhook, ou None se timeout
         """
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
-            with responses_lock:
-                if session_id in webhook_responses:
-                    response = webhook_responses[session_id]
-                    # Remove da memória após recuperar
-                    if CLEAR_WEBHOOKS_AFTER_READ:
-                        del webhook_responses[session_id]
-                    return response
-            
-            # Aguarda antes de verificar novamente
-            time.sleep(POLLING_INTERVAL)
-        
-        return None
+        return webhook_store.wait(session_id, timeout)
     
     def extract_voyager_messages(self, webhook_response):
         """
@@ -341,18 +634,11 @@ class VoyagerUser(HttpUser):
     
     def save_conversation_log(self, conversation_data):
         """
-        Save individual conversation to JSON file
-        """
-        # Create logs folder if it doesn't exist
-        logs_dir = "logs"
-        if not os.path.exists(logs_dir):
-            os.makedirs(logs_dir)
-        
-        # Generate filename with timestamp and session_id (short version)
-        short_session = conversation_data['session_id'][:8]
-        timestamp = time.strftime('%d_%m_%y_%H_%M_%S')
-        output_file = os.path.join(logs_dir, f"conversation_{short_session}_{timestamp}.json")
+        Queue the conversation log for the background writer (conversation_log)
         
+        Serialization and disk I/O happen off the hub, so they don't land in the
+        next conversation's timings; only a full queue makes the user wait.
+        """
         # Build conversation log
         log_data = {
             'summary': {
@@ -364,18 +650,69 @@ class VoyagerUser(HttpUser):
                 'total_messages': conversation_data['total_messages'],
                 'timestamp': conversation_data['timestamp'],
                 'total_time_ms': conversation_data['total_time_ms'],
-                'mode': 'fixed_messages',
-                'fixed_messages_used': len(FIXED_USER_MESSAGES)
+                'mode': self.mode,
+                **self.conversation_fields()
             },
+            'turns': conversation_data.get('turns', []),
             'messages': conversation_data['messages']
         }
         
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(log_data, f, indent=2, ensure_ascii=False)
-            logger.info(f"💾 Conversation saved to: {output_file}")
-        except Exception as e:
-            logger.error(f"❌ Error saving conversation log: {e}")
+        waited = conversation_log.submit(log_data)
+        events.request.fire(
+            request_type="LOG",
+            name="Conversation Log Queue Wait",
+            response_time=waited * 1000,
+            response_length=0,
+            exception=None,
+            context={}
+        )
+        logger.debug(f"💾 Conversation queued for {conversation_log.name} (queue depth: {conversation_log.queue_depth()})")
+    
+    def post_to_voyager(self, payload):
+        """
+        POSTs the message to Voyager, retrying 429/5xx and connection errors
+        with exponential backoff and jitter (VOYAGER_RETRY)
+        
+        Returns:
+            tuple: (response, start time of the accepted attempt, breaker probe id),
+            or (None, None, None) when the attempts ran out or the Voyager
+            circuit breaker is open
+        """
+        voyager_retry.record_request()
+        
+        for attempt in range(voyager_retry.max_attempts):
+            try:
+                probe = voyager_breaker.before_call()
+            except CircuitOpenError as e:
+                logger.error(f"🔌 {e} - message not sent")
+                on_circuit_open("Voyager", e)
+                return None, None, None
+            
+            start_time = time.time()
+            response = self.client.post(
+                VOYAGER_ENDPOINT,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                name="Voyager Message"
+            )
+            
+            if response.status_code in [200, 201, 202]:
+                # Success is recorded on the breaker when the webhook arrives
+                return response, start_time, probe
+            
+            voyager_breaker.record_failure(probe)
+            logger.error(f"❌ Voyager API error - Status: {response.status_code}")
+            
+            # Other 4xx won't get better on retry; status 0 is a connection error
+            retryable = response.status_code in (0, 429) or response.status_code >= 500
+            if not retryable or attempt == voyager_retry.max_attempts - 1 or not voyager_retry.can_retry():
+                return None, None, None
+            
+            delay = voyager_retry.backoff(attempt)
+            logger.warning(f"   Retrying Voyager in {delay:.1f}s (attempt {attempt + 2}/{voyager_retry.max_attempts})")
+            time.sleep(delay)
+        
+        return None, None, None
     
     def send_to_voyager(self, message_text, iteration_suffix):
         """
@@ -385,7 +722,7 @@ class VoyagerUser(HttpUser):
         """
         # Unique webhook session ID for this specific request
         webhook_session_id = f"{self.base_session_id}_{iteration_suffix}"
-        webhook_url = f"{ngrok_url}{WEBHOOK_PATH}/{webhook_session_id}"
+        webhook_url = f"{callback_url}{WEBHOOK_PATH}/{webhook_session_id}"
         
         payload = {
             "type": "text",
@@ -395,42 +732,47 @@ class VoyagerUser(HttpUser):
             "webhook": webhook_url
         }
         
-        start_time = time.time()
-        
+        probe = None
         try:
-            response = self.client.post(
-                VOYAGER_ENDPOINT,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                name="Voyager Message"
-            )
-            
-            if response.status_code not in [200, 201, 202]:
-                logger.error(f"❌ Voyager API error - Status: {response.status_code}")
+            response, start_time, probe = self.post_to_voyager(payload)
+            if response is None:
                 return None
+            record_turn_latency('voyager_post', iteration_suffix, (time.time() - start_time) * 1000)
             
             # Wait for webhook response
             logger.info(f"⏳ Waiting for webhook response (timeout: {WEBHOOK_TIMEOUT}s)")
-            webhook_response = self.wait_for_webhook(webhook_session_id, timeout=WEBHOOK_TIMEOUT)
+            webhook_turn = self.wait_for_webhook(webhook_session_id, timeout=WEBHOOK_TIMEOUT)
+            webhook_response = webhook_turn.payload if webhook_turn else None
             
             # Log webhook response status
             if webhook_response:
-                logger.info(f"✅ Got webhook response in {(time.time() - start_time):.1f}s")
+                voyager_breaker.record_success(probe)
+                logger.info(f"✅ Got webhook response in {(webhook_turn.last_at - start_time):.3f}s ({webhook_turn.parts} webhook(s))")
                 logger.debug(f"Webhook response: {json.dumps(webhook_response)[:500]}")
             else:
+                voyager_breaker.record_failure(probe)
                 logger.error(f"❌ Webhook timeout after {WEBHOOK_TIMEOUT}s")
             
-            # Fire custom event for webhook
+            # Fire custom events for webhook: first message and complete turn (last message)
             total_time = (time.time() - start_time) * 1000
             if webhook_response:
+                events.request.fire(
+                    request_type="WEBHOOK",
+                    name="Voyager Webhook First Message",
+                    response_time=(webhook_turn.first_at - start_time) * 1000,
+                    response_length=len(str(webhook_response)),
+                    exception=None,
+                    context={}
+                )
                 events.request.fire(
                     request_type="WEBHOOK",
                     name="Voyager Webhook",
-                    response_time=total_time,
+                    response_time=(webhook_turn.last_at - start_time) * 1000,
                     response_length=len(str(webhook_response)),
                     exception=None,
                     context={}
                 )
+                record_turn_latency('voyager_webhook', iteration_suffix, (webhook_turn.last_at - start_time) * 1000)
             else:
                 events.request.fire(
                     request_type="WEBHOOK",
@@ -440,24 +782,40 @@ class VoyagerUser(HttpUser):
                     exception=Exception("Webhook timeout"),
                     context={}
                 )
+                record_turn_latency('voyager_webhook', iteration_suffix, total_time, exception=Exception("Webhook timeout"))
             
             return webhook_response
             
         except Exception as e:
+            voyager_breaker.record_failure(probe)
             logger.error(f"❌ Error sending to Voyager: {e}")
             return None
     
     @task
+    def start_conversation(self):
+        """Closed model: one conversation per user. Open model: one conversation per scheduled arrival"""
+        if arrival_driver is None:
+            self.run_complete_conversation()
+            return
+        
+        # The user that finished the previous arrival comes back as a new customer before the next one
+        if self.conversation_completed:
+            self.recycle()
+        arrival_driver.wait()
+        with arrival_driver.in_flight():
+            self.run_complete_conversation()
+    
     def run_complete_conversation(self):
-        """Runs a complete conversation using fixed messages"""
+        """Runs a complete conversation, sending messages_to_send() on turn_schedule()"""
         
         # Only run one conversation per user
         if self.conversation_completed:
             # User already completed their conversation, just wait
             return
         
-        if not FIXED_USER_MESSAGES:
-            logger.error("❌ No fixed messages loaded, skipping conversation")
+        user_messages = self.messages_to_send()
+        if not user_messages:
+            logger.error("❌ No messages to send, skipping conversation")
             self.conversation_completed = True
             return
         
@@ -466,33 +824,37 @@ class VoyagerUser(HttpUser):
         
         # Initialize conversation tracking
         conversation_messages = []
+        turn_timings = []
+        conversation_stages = ConversationStages(stage_classifier)
         iteration_count = 0
         found_link = False
         
         conversation_start_time = time.time()
+        schedule = self.turn_schedule(conversation_start_time)
         
-        print(f"\n{'='*80}")
-        print(f"🎬 STARTING CONVERSATION - Base Session ID: {self.base_session_id}")
-        print(f"{'='*80}\n")
+        console.info(f"\n{'='*80}")
+        console.info(f"🎬 STARTING CONVERSATION - Base Session ID: {self.base_session_id}")
+        console.info(f"{'='*80}\n")
         logger.info(f"🎬 Starting conversation - Base Session ID: {self.base_session_id}")
         
         try:
-            # Main conversation loop - iterate through fixed messages
-            while self.message_index < len(FIXED_USER_MESSAGES) and not found_link:
+            # Main conversation loop - iterate through the user messages
+            while iteration_count < len(user_messages) and not found_link:
+                # Get current message
+                current_message = user_messages[iteration_count]
                 iteration_count += 1
                 
-                # Get current message from fixed list
-                current_message = FIXED_USER_MESSAGES[self.message_index]
-                self.message_index += 1
-                
-                logger.info(f"🔄 Iteration {iteration_count}/{len(FIXED_USER_MESSAGES)} - Session: {self.base_session_id}")
+                logger.info(f"🔄 Iteration {iteration_count}/{len(user_messages)} - Session: {self.base_session_id}")
                 
                 # A. Send message to Voyager
                 logger.info(f"📤 Sending to Voyager (iteration {iteration_count}): {current_message[:100]}...")
+                turn_start_time = time.time()
+                send_lag_ms = schedule.lag(iteration_count, turn_start_time) * 1000
                 voyager_response = self.send_to_voyager(current_message, iteration_count)
+                turn_webhook_ms = (time.time() - turn_start_time) * 1000
                 
                 if not voyager_response:
-                    print(f"❌ VOYAGER WEBHOOK TIMEOUT (iteration {iteration_count}) - Breaking conversation")
+                    console.info(f"❌ VOYAGER WEBHOOK TIMEOUT (iteration {iteration_count}) - Breaking conversation")
                     logger.error(f"❌ Failed to get response from Voyager (iteration {iteration_count}) - Ending conversation")
                     logger.error(f"   Message sent: {current_message[:200]}")
                     break
@@ -502,8 +864,8 @@ class VoyagerUser(HttpUser):
                 logger.info(f"📨 Received {len(voyager_messages)} message(s) from Voyager")
                 
                 if not voyager_messages:
-                    print(f"❌ NO MESSAGES IN VOYAGER RESPONSE (iteration {iteration_count})")
-                    print(f"   Full Voyager response: {json.dumps(voyager_response, indent=2)[:500]}")
+                    console.info(f"❌ NO MESSAGES IN VOYAGER RESPONSE (iteration {iteration_count})")
+                    console.info(f"   Full Voyager response: {json.dumps(voyager_response, indent=2)[:500]}")
                     logger.error(f"❌ No messages in Voyager response (iteration {iteration_count}) - Ending conversation")
                     logger.error(f"   Voyager response: {str(voyager_response)[:500]}")
                     
@@ -512,12 +874,12 @@ class VoyagerUser(HttpUser):
                         # Try to extract text from different possible formats
                         text_content = voyager_response.get('text') or voyager_response.get('content') or voyager_response.get('message')
                         if text_content:
-                            print(f"   Found text content in alternative field: {text_content[:200]}")
+                            console.info(f"   Found text content in alternative field: {text_content[:200]}")
                             # Create a synthetic message from this text
                             voyager_messages = [{'role': 'assistant', 'content': text_content}]
                             logger.info(f"   ✅ Recovered message from alternative field")
                         else:
-                            print(f"   Response keys: {list(voyager_response.keys())}")
+                            console.info(f"   Response keys: {list(voyager_response.keys())}")
                             break
                     else:
                         break
@@ -528,40 +890,47 @@ class VoyagerUser(HttpUser):
                     'content': current_message
                 })
                 
+                # Record turn timing (compiled into the replay corpus)
+                turn_timings.append({
+                    'iteration': iteration_count,
+                    'sent_offset_ms': round((turn_start_time - conversation_start_time) * 1000),
+                    'webhook_ms': round(turn_webhook_ms),
+                    'send_lag_ms': round(send_lag_ms),
+                    **self.turn_fields(iteration_count)
+                })
+                record_turn_pacing(iteration_count, turn_webhook_ms, send_lag_ms, paced=schedule.paced)
+                
                 # Add Voyager assistant messages to conversation history
                 for msg in voyager_messages:
                     conversation_messages.append(msg)
                 
-                # C. Check for payment link in Voyager response
-                for msg in voyager_messages:
-                    voyager_links = re.findall(r'https?://[^\s]+', msg['content'])
-                    for link in voyager_links:
-                        if link.startswith('https://pay.smarttalks.ai'):
-                            found_link = True
-                            logger.info(f"🎉 Payment link found in Voyager message: {link}")
-                            logger.debug(f"Full message with link: {msg['content']}")
-                            break
-                    if found_link:
-                        break
+                # C. Tag the reply with its booking stage; the payment link ends the conversation
+                turn_timings[-1]['stage'] = conversation_stages.observe(
+                    [msg['content'] for msg in voyager_messages],
+                    (turn_start_time - conversation_start_time) * 1000 + turn_webhook_ms
+                )
+                if conversation_stages.payment_link:
+                    found_link = True
+                    logger.info(f"🎉 Payment link found in Voyager message: {conversation_stages.payment_link}")
                 
                 if found_link:
                     break
                 
-                # Small delay between iterations
-                time.sleep(0.5)
+                # Delay before the next message (pacing schedule)
+                self.wait_for_next_turn(schedule, iteration_count)
             
             # Log why conversation ended
-            print(f"\n{'='*80}")
+            console.info(f"\n{'='*80}")
             if found_link:
-                print(f"✅ CONVERSATION ENDED: Link found (iteration {iteration_count})")
+                console.info(f"✅ CONVERSATION ENDED: Link found (iteration {iteration_count})")
                 logger.info(f"✅ Conversation ended: Link found (iteration {iteration_count})")
-            elif self.message_index >= len(FIXED_USER_MESSAGES):
-                print(f"⚠️  CONVERSATION ENDED: All messages sent ({iteration_count}/{len(FIXED_USER_MESSAGES)})")
-                logger.warning(f"⚠️  Conversation ended: All messages sent ({iteration_count}/{len(FIXED_USER_MESSAGES)})")
+            elif iteration_count >= len(user_messages):
+                console.info(f"⚠️  CONVERSATION ENDED: All messages sent ({iteration_count}/{len(user_messages)})")
+                logger.warning(f"⚠️  Conversation ended: All messages sent ({iteration_count}/{len(user_messages)})")
             else:
-                print(f"⚠️  CONVERSATION ENDED: Broke early at iteration {iteration_count}/{len(FIXED_USER_MESSAGES)}")
-                logger.warning(f"⚠️  Conversation ended: Broke early at iteration {iteration_count}/{len(FIXED_USER_MESSAGES)}")
-            print(f"{'='*80}\n")
+                console.info(f"⚠️  CONVERSATION ENDED: Broke early at iteration {iteration_count}/{len(user_messages)}")
+                logger.warning(f"⚠️  Conversation ended: Broke early at iteration {iteration_count}/{len(user_messages)}")
+            console.info(f"{'='*80}\n")
             
             # Conversation complete
             total_conversation_time = (time.time() - conversation_start_time) * 1000
@@ -588,11 +957,13 @@ class VoyagerUser(HttpUser):
                 'total_messages': len(conversation_messages),
                 'found_link': found_link,
                 'total_time_ms': round(total_conversation_time, 0),
+                **conversation_stages.result(found_link),
+                'turns': turn_timings,
                 'messages': conversation_messages
             }
             
-            with results_lock:
-                conversation_results.append(conversation_data)
+            results_sink.record(conversation_data)
+            stage_funnel.record(conversation_data)
             
             # Save individual conversation log
             self.save_conversation_log(conversation_data)
@@ -611,9 +982,7 @@ class VoyagerUser(HttpUser):
             )
             
         except Exception as e:
-            logger.error(f"💥 Unexpected error in conversation: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"💥 Unexpected error in conversation: {e}")
             
             # Store failed conversation result
             total_conversation_time = (time.time() - conversation_start_time) * 1000
@@ -633,11 +1002,13 @@ class VoyagerUser(HttpUser):
                 'found_link': False,
                 'total_time_ms': round(total_conversation_time, 0),
                 'error': str(e),
+                **conversation_stages.result(False),
+                'turns': turn_timings,
                 'messages': conversation_messages
             }
             
-            with results_lock:
-                conversation_results.append(conversation_data)
+            results_sink.record(conversation_data)
+            stage_funnel.record(conversation_data)
             
             # Save individual conversation log even for failed conversations
             self.save_conversation_log(conversation_data)
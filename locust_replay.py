@@ -0,0 +1,73 @@
+# python -m utils.replay_corpus logs/conversation_*.json -o logs/replay_corpus.json.gz
+# locust -f locust_replay.py --users 3 --spawn-rate 1 --headless
+
+# Reaproveita o locust_fixed.py (receptor de webhooks, envio à Voyager, eventos
+# de init/quit e resumo): aqui só muda a fonte das mensagens e o ritmo. O módulo
+# é importado inteiro (não "from locust_fixed import VoyagerUser") para o
+# Locust não rodar também a classe base
+import locust_fixed
+from config import REPLAY_CORPUS_FILE, REPLAY_SPEED
+from locust_fixed import logger
+from utils.pacing import TurnSchedule
+from utils.replay_corpus import load_corpus, conversation_turns, turn_offsets
+
+# Corpus de replay (carregado no on_locust_init)
+replay_corpus = None
+
+
+class VoyagerUser(locust_fixed.VoyagerUser):
+    """Usuário virtual que reproduz uma conversa gravada (textos e ritmo originais)"""
+    
+    mode = 'replay'
+    file_suffix = '_replay'
+    
+    @classmethod
+    def prepare(cls, user_data_batch=None):
+        """Loads the corpus once for all users"""
+        global replay_corpus
+        replay_corpus = load_corpus(REPLAY_CORPUS_FILE)
+        logger.info(f"📼 Replay corpus: {REPLAY_CORPUS_FILE} ({len(replay_corpus['conversations'])} conversations, speed {REPLAY_SPEED}x)")
+    
+    @classmethod
+    def mode_summary(cls):
+        return {
+            'mode': cls.mode,
+            'replay_corpus': REPLAY_CORPUS_FILE,
+            'replay_conversations': len(replay_corpus['conversations']),
+            'replay_speed': REPLAY_SPEED
+        }
+    
+    @classmethod
+    def mode_description(cls):
+        return f"Replay ({len(replay_corpus['conversations'])} conversations at {REPLAY_SPEED}x)"
+    
+    @classmethod
+    def pacing_summary(cls):
+        return {'pacing': 'recorded', 'replay_speed': REPLAY_SPEED}
+    
+    def on_start(self):
+        """Pick the recorded conversation this user will replay (round-robin)"""
+        position = (self.user_id - 1) % len(replay_corpus['conversations'])
+        self.replay_source = replay_corpus['conversations'][position]['session_id']
+        self.replay_turns = conversation_turns(replay_corpus, position)
+        logger.info(f"🚀 User {self.user_id} replaying {self.replay_source} ({len(self.replay_turns)} turns)")
+        logger.info(f"📋 User data - Phone: {self.user_data['telefone']}, Email: {self.user_data['email']}, CPF: {self.user_data['cpf_formatted']}")
+    
+    def messages_to_send(self):
+        return [message for message, _, _ in self.replay_turns]
+    
+    def turn_schedule(self, start):
+        """Recorded send time of each turn, scaled by REPLAY_SPEED"""
+        return TurnSchedule(start, offsets=turn_offsets(self.replay_turns, REPLAY_SPEED))
+    
+    def wait_for_next_turn(self, schedule, turn):
+        """Recorded think time between the answer and the next message, never ahead of the recorded schedule"""
+        if REPLAY_SPEED > 0:
+            recorded_think_ms = self.replay_turns[turn - 1][2]
+            schedule.wait_for(turn + 1, min_gap=recorded_think_ms / 1000 / REPLAY_SPEED)
+    
+    def turn_fields(self, turn):
+        return {'recorded_webhook_ms': self.replay_turns[turn - 1][1]}
+    
+    def conversation_fields(self):
+        return {'replay_source': self.replay_source, 'replay_speed': REPLAY_SPEED}
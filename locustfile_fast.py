@@ -1,4 +1,3 @@
-import logging
 import time
 import uuid
 import re
@@ -6,10 +5,11 @@ import os
 import json
 import random
 import asyncio
+from contextlib import nullcontext
 from threading import Thread, Lock
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from locust import HttpUser, task, events, constant_pacing
+from locust import HttpUser, task, events, constant_pacing, constant
 from pyngrok import ngrok
 from google import genai
 from dotenv import load_dotenv
@@ -19,10 +19,37 @@ from uvicorn import Config, Server
 from config import (
     VOYAGER_API_URL, VOYAGER_ENDPOINT, CHANNEL_ID, CLIENT_DOMAIN,
     FLASK_PORT, FLASK_HOST, WEBHOOK_PATH, DEFAULT_MESSAGE, MESSAGE_TYPE,
-    WEBHOOK_TIMEOUT, POLLING_INTERVAL, USER_WAIT_TIME,
-    LOG_LEVEL, LOG_FORMAT, MAX_RESPONSE_CHARS, CLEAR_WEBHOOKS_AFTER_READ
+    WEBHOOK_TIMEOUT, USER_WAIT_TIME, LOAD_MODEL, ARRIVAL_PROFILE, ARRIVAL_MAX_DELAY, TURN_PACING_INTERVAL, USER_DATA_PRELOAD, USER_DATA_SEED, USER_DATA_CACHE_SIZE,
+    LOG_LEVEL, LOG_FORMAT, LOG_MODE, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE, RESULTS_COMPRESS, MAX_RESPONSE_CHARS, CLEAR_WEBHOOKS_AFTER_READ,
+    CONVERSATION_LOG_SEGMENT_MB, CONVERSATION_LOG_QUEUE_SIZE, CONVERSATION_LOG_BATCH_SIZE,
+    TURN_HISTOGRAM_MAX_MS, TURN_HISTOGRAM_DIGITS, TURN_STATS_IN_LOCUST,
+    WEBHOOK_SERVER, WEBHOOK_TTL, WEBHOOK_COALESCE_WINDOW, WEBHOOK_END_OF_TURN_FIELD,
+    CALLBACK_TRANSPORT, CALLBACK_BASE_URL,
+    VOYAGER_RETRY, VOYAGER_BREAKER, GEMINI_RETRY, GEMINI_BREAKER,
+    GEMINI_CACHE_ENABLED, GEMINI_CACHE_FILE, GEMINI_CACHE_MAX_ENTRIES, GEMINI_CACHE_TTL,
+    GEMINI_CACHE_KEY, GEMINI_CACHE_HIT_RATE,
+    USER_SIMULATOR, SCRIPTED_RESPONSE_DELAY, PERSONAS_GLOB,
+    GEMINI_POOL_CLIENTS, GEMINI_POOL_MAX_CONNECTIONS, GEMINI_POOL_MAX_IN_FLIGHT, GEMINI_WAIT_EVENT_MIN_MS,
+    GEMINI_RPM, GEMINI_TPM, GEMINI_RATE_LIMIT_PROCESSES, GEMINI_429_COOLDOWN,
+    GEMINI_HISTORY_TURNS, GEMINI_HISTORY_SUMMARY, GEMINI_HISTORY_SUMMARY_MAX_CHARS
 )
 from utils.generate_user_data import OptimizedUserData
+from utils.webhook_store import WebhookStore
+from utils.results_sink import ResultsSink
+from utils.log_pipeline import setup_logging, pipeline_stats
+from utils.conversation_log import ConversationLogWriter
+from utils.turn_histograms import TurnLatencyTracker
+from utils.conversation_stages import StageClassifier, ConversationStages, StageFunnel
+from utils.pacing import TurnSchedule, CoordinatedOmissionStats
+from utils.arrivals import ArrivalSchedule, ArrivalDriver
+from utils.webhook_server import make_webhook_app, start_gevent_server
+from utils.resilience import RetryPolicy, CircuitBreaker, CircuitOpenError
+from utils.gemini_cache import GeminiResponseCache, normalize_message, depersonalize, personalize
+from utils.persona_simulator import ScriptedPersonaChat
+from utils.persona_templates import load_persona_templates
+from utils.gemini_pool import GeminiClientPool
+from utils.gemini_scheduler import GeminiRateScheduler, estimate_tokens
+from utils.gemini_history import WindowedPersonaChat
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +59,12 @@ load_dotenv()
 MAX_ITERATIONS = 20  # 15 iterations = 30 messages (15 user + 15 assistant)
 INITIAL_MESSAGE = "Olá"
 
+# Metric for the persona replies (Gemini or the local scripted simulator)
+if USER_SIMULATOR == "scripted":
+    PERSONA_REQUEST_TYPE, PERSONA_EVENT_NAME = "SIMULATOR", "Scripted Persona Response"
+else:
+    PERSONA_REQUEST_TYPE, PERSONA_EVENT_NAME = "GEMINI", "Gemini Response"
+
 # Configuração de logging
 # Create logs folder if it doesn't exist
 logs_dir = "logs"
@@ -41,24 +74,250 @@ if not os.path.exists(logs_dir):
 # Setup logging to both file and console
 log_file = os.path.join(logs_dir, f"load_test_fast_{time.strftime('%d_%m_%y_%H_%M')}.log")
 
-# Configure root logger
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format=LOG_FORMAT,
-    handlers=[
-        logging.FileHandler(log_file),  # Log to file
-        logging.StreamHandler()         # Log to console
-    ]
+# Records only go onto a queue; a threadpool thread writes them to the file and
+# the terminal off the hub. LOG_MODE = "quiet" keeps errors plus a sample of the rest
+logger, console, log_listener = setup_logging(
+    __name__, log_file, LOG_LEVEL, LOG_FORMAT,
+    mode=LOG_MODE, sample_rate=LOG_SAMPLE_RATE, queue_size=LOG_QUEUE_SIZE
 )
-logger = logging.getLogger(__name__)
 
-# Armazenamento de respostas dos webhooks
-webhook_responses = {}
-responses_lock = Lock()
 
-# Storage for conversation results
-conversation_results = []
-results_lock = Lock()
+def on_late_webhook(session_id, late_by):
+    """Webhook que chegou depois do WEBHOOK_TIMEOUT (o usuário já desistiu)"""
+    logger.warning(f"⏰ Webhook atrasado para session_id: {session_id} ({late_by:.1f}s após o timeout)")
+    events.request.fire(
+        request_type="WEBHOOK",
+        name="Late Webhook",
+        response_time=late_by * 1000,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+def on_orphan_webhook(session_id, age):
+    """Webhook que expirou (WEBHOOK_TTL) sem nunca ter sido lido"""
+    logger.warning(f"🗑️  Webhook órfão removido para session_id: {session_id} ({age:.0f}s sem leitura)")
+    events.request.fire(
+        request_type="WEBHOOK",
+        name="Orphaned Webhook",
+        response_time=age * 1000,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+# Armazenamento de respostas dos webhooks (acorda o usuário assim que chega)
+webhook_store = WebhookStore(
+    clear_after_read=CLEAR_WEBHOOKS_AFTER_READ,
+    ttl=WEBHOOK_TTL,
+    on_late=on_late_webhook,
+    on_orphan=on_orphan_webhook,
+    coalesce_window=WEBHOOK_COALESCE_WINDOW,
+    end_of_turn_field=WEBHOOK_END_OF_TURN_FIELD
+)
+
+
+def on_breaker_state_change(name, old_state, new_state):
+    """Troca de estado de um circuit breaker (a linha do tempo vai para o resumo)"""
+    if new_state == "open":
+        logger.error(f"🔌 Circuit breaker {name}: {old_state} -> {new_state} (chamadas falham na hora)")
+    else:
+        logger.warning(f"🔌 Circuit breaker {name}: {old_state} -> {new_state}")
+
+
+def on_circuit_open(name, error):
+    """Chamada recusada com o circuito aberto: evento próprio, sem tocar na dependência"""
+    events.request.fire(
+        request_type="CIRCUIT",
+        name=f"{name} Circuit Open",
+        response_time=0,
+        response_length=0,
+        exception=error,
+        context={}
+    )
+
+
+# Retry e circuit breaker das chamadas à Voyager
+voyager_retry = RetryPolicy(**VOYAGER_RETRY)
+voyager_breaker = CircuitBreaker("Voyager", on_state_change=on_breaker_state_change, **VOYAGER_BREAKER)
+
+def on_gemini_pool_wait(waited):
+    """Tempo de espera por uma vaga no pool do Gemini (GEMINI_POOL_MAX_IN_FLIGHT)"""
+    # Esperas curtas ficam só no resumo (gemini_pool)
+    if waited * 1000 < GEMINI_WAIT_EVENT_MIN_MS:
+        return
+    events.request.fire(
+        request_type="GEMINI",
+        name="Gemini Pool Wait",
+        response_time=waited * 1000,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+# Clientes do Gemini compartilhados por todos os usuários (None com o simulador local)
+gemini_pool = GeminiClientPool(
+    api_key=os.environ.get('GOOGLE_API_KEY') or os.environ.get('GEMINI_API_KEY'),
+    clients=GEMINI_POOL_CLIENTS,
+    max_connections=GEMINI_POOL_MAX_CONNECTIONS,
+    max_in_flight=GEMINI_POOL_MAX_IN_FLIGHT,
+    on_wait=on_gemini_pool_wait
+) if USER_SIMULATOR == "gemini" else None
+
+def on_gemini_queue_wait(waited):
+    """Tempo na fila do agendador RPM/TPM antes de a chamada ao Gemini ser admitida"""
+    # Esperas curtas ficam só no resumo (gemini_scheduler)
+    if waited * 1000 < GEMINI_WAIT_EVENT_MIN_MS:
+        return
+    events.request.fire(
+        request_type="GEMINI",
+        name="Gemini Queue Wait",
+        response_time=waited * 1000,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+# Agendador RPM/TPM do Gemini; a cota é dividida entre os processos do Locust
+gemini_scheduler = GeminiRateScheduler(
+    rpm=GEMINI_RPM // GEMINI_RATE_LIMIT_PROCESSES if GEMINI_RPM else None,
+    tpm=GEMINI_TPM // GEMINI_RATE_LIMIT_PROCESSES if GEMINI_TPM else None,
+    on_wait=on_gemini_queue_wait
+) if USER_SIMULATOR == "gemini" and (GEMINI_RPM or GEMINI_TPM) else None
+
+# Retry e circuit breaker das chamadas ao Gemini
+gemini_retry = RetryPolicy(**GEMINI_RETRY)
+gemini_breaker = CircuitBreaker("Gemini", on_state_change=on_breaker_state_change, **GEMINI_BREAKER)
+
+# Personas compiladas uma vez em on_locust_init ({arquivo: PersonaTemplate})
+persona_templates = {}
+persona_files = []
+
+# Cache de respostas do Gemini (None quando desligado ou com o simulador local)
+gemini_cache = GeminiResponseCache(
+    max_entries=GEMINI_CACHE_MAX_ENTRIES,
+    ttl=GEMINI_CACHE_TTL,
+    key_mode=GEMINI_CACHE_KEY,
+    hit_rate=GEMINI_CACHE_HIT_RATE,
+    path=GEMINI_CACHE_FILE
+) if GEMINI_CACHE_ENABLED and USER_SIMULATOR == "gemini" else None
+
+# Conversation results, streamed to JSONL as each conversation ends (totals kept as running sums)
+results_sink = ResultsSink(
+    os.path.join(logs_dir, f"load_test_fast_results_{time.strftime('%d_%m_%y_%H_%M')}.jsonl"),
+    compress=RESULTS_COMPRESS
+)
+
+
+def on_conversation_log_written(lag):
+    """Time between a conversation ending and its log reaching disk (background writer)"""
+    # response_length carries the writer queue depth (shown as the average size)
+    events.request.fire(
+        request_type="LOG",
+        name="Conversation Log Lag",
+        response_time=lag * 1000,
+        response_length=conversation_log.queue_depth(),
+        exception=None,
+        context={}
+    )
+
+
+# Conversation logs, written off the hub into rolling segment files indexed by session_id
+conversation_log = ConversationLogWriter(
+    logs_dir, f"conversations_fast_{time.strftime('%d_%m_%y_%H_%M_%S')}",
+    segment_max_bytes=CONVERSATION_LOG_SEGMENT_MB * 1024 * 1024,
+    queue_size=CONVERSATION_LOG_QUEUE_SIZE,
+    batch_size=CONVERSATION_LOG_BATCH_SIZE,
+    on_written=on_conversation_log_written
+)
+
+
+# Per-turn latency histograms (HDR-style, bounded memory) for each conversation stage
+turn_latency = TurnLatencyTracker(max_ms=TURN_HISTOGRAM_MAX_MS, significant_digits=TURN_HISTOGRAM_DIGITS)
+
+# Locust entry names per stage, suffixed with the turn ("Voyager Webhook T03")
+TURN_STAGE_NAMES = {
+    'voyager_post': "Voyager POST",
+    'voyager_webhook': "Voyager Webhook",
+    'gemini': PERSONA_EVENT_NAME
+}
+
+
+def record_turn_latency(stage, turn, response_time, exception=None):
+    """Latência de uma etapa no turno: histograma do turno e entrada "TURN" no Locust (TURN_STATS_IN_LOCUST)"""
+    if exception is None:
+        turn_latency.record(stage, turn, response_time)
+    if TURN_STATS_IN_LOCUST:
+        events.request.fire(
+            request_type="TURN",
+            name=f"{TURN_STAGE_NAMES[stage]} T{turn:02d}",
+            response_time=response_time,
+            response_length=0,
+            exception=exception,
+            context={}
+        )
+
+
+# Booking stage of each Voyager reply (precompiled patterns) and the test-wide funnel
+stage_classifier = StageClassifier()
+stage_funnel = StageFunnel(stage_classifier.stages, max_ms=TURN_HISTOGRAM_MAX_MS)
+
+# Raw vs coordinated-omission-corrected turn latency (pacing schedule: utils/pacing.py)
+co_stats = CoordinatedOmissionStats(max_ms=TURN_HISTOGRAM_MAX_MS)
+
+
+def record_turn_pacing(turn, webhook_ms, send_lag_ms, paced=True):
+    """Latência do turno medida desde o envio e corrigida pelo atraso do envio em relação ao cronograma"""
+    co_stats.record(webhook_ms, send_lag_ms)
+    if not paced:
+        # Sem cronograma a corrigida é a própria medida: não duplica "Voyager Webhook"
+        return
+    turn_latency.record('voyager_webhook_corrected', turn, webhook_ms + send_lag_ms)
+    events.request.fire(
+        request_type="WEBHOOK",
+        name="Voyager Webhook Corrected",
+        response_time=webhook_ms + send_lag_ms,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+def on_arrival_start(delay):
+    """Atraso do início da conversa em relação ao horário planejado da chegada (LOAD_MODEL = "open")"""
+    events.request.fire(
+        request_type="ARRIVAL",
+        name="Conversation Start Delay",
+        response_time=delay * 1000,
+        response_length=0,
+        exception=None,
+        context={}
+    )
+
+
+def on_arrival_missed(delay):
+    """Chegada descartada: nenhum usuário livre dentro de ARRIVAL_MAX_DELAY"""
+    events.request.fire(
+        request_type="ARRIVAL",
+        name="Missed Arrival",
+        response_time=delay * 1000,
+        response_length=0,
+        exception=Exception("No free user within ARRIVAL_MAX_DELAY"),
+        context={}
+    )
+
+
+# Open model: conversations start at ARRIVAL_PROFILE and the Locust users (-u) are the concurrency cap
+arrival_driver = ArrivalDriver(
+    ArrivalSchedule(ARRIVAL_PROFILE),
+    max_delay=ARRIVAL_MAX_DELAY,
+    on_start=on_arrival_start,
+    on_missed=on_arrival_missed
+) if LOAD_MODEL == "open" else None
 
 # User ID counter for generating unique user data
 user_id_counter = 0
@@ -70,6 +329,12 @@ fastapi_app = FastAPI()
 # Variável global para armazenar a URL do ngrok
 ngrok_url = None
 
+# URL base que a Voyager usa para chamar os webhooks (ngrok ou CALLBACK_BASE_URL)
+callback_url = None
+
+# Receptor gevent (WEBHOOK_SERVER = "gevent"), parado no encerramento
+webhook_server = None
+
 
 @fastapi_app.post('/responses/{session_id}')
 async def receive_webhook(session_id: str, request: Request):
@@ -77,24 +342,22 @@ async def receive_webhook(session_id: str, request: Request):
     try:
         payload = await request.json()
         
-        with responses_lock:
-            webhook_responses[session_id] = payload
+        webhook_store.put(session_id, payload)
         
-        logger.info(f"✅ Webhook recebido para session_id: {session_id}")
+        logger.debug(f"✅ Webhook recebido para session_id: {session_id}")
         logger.debug(f"Payload: {payload}")
-        print(f"✅ FastAPI: Webhook recebido para session_id: {session_id}")
         
         return JSONResponse(content={"status": "received"}, status_code=200)
     except Exception as e:
         logger.error(f"❌ Erro ao processar webhook: {e}")
-        print(f"❌ FastAPI: Erro ao processar webhook: {e}")
+        console.info(f"❌ FastAPI: Erro ao processar webhook: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
 @fastapi_app.get('/health')
 async def health_check():
     """Health check endpoint"""
-    return JSONResponse(content={"status": "ok", "responses_count": len(webhook_responses)}, status_code=200)
+    return JSONResponse(content={"status": "ok", "responses_count": len(webhook_store)}, status_code=200)
 
 
 def start_fastapi():
@@ -134,146 +397,249 @@ def start_ngrok():
     logger.info("=" * 80)
     logger.info(f"🌐 NGROK URL (FastAPI): {ngrok_url}")
     logger.info("=" * 80)
-    print("=" * 80)
-    print(f"🌐 NGROK URL (FastAPI): {ngrok_url}")
-    print("=" * 80)
     
     return ngrok_url
 
 
 def save_test_results():
     """Salva os resultados do teste em arquivo JSON"""
-    with results_lock:
-        if not conversation_results:
-            logger.warning("⚠️  No conversation results to save")
-            return
-        
-        # Calculate aggregated statistics
-        total_conversations = len(conversation_results)
-        successful_conversations = sum(1 for c in conversation_results if c['found_link'])
-        total_iterations = sum(c['iterations'] for c in conversation_results)
-        total_messages = sum(c['total_messages'] for c in conversation_results)
-        total_time = sum(c['total_time_ms'] for c in conversation_results)
-        total_cost = sum(c['cost'] for c in conversation_results)
-        
-        # Gemini token totals
-        total_gemini_input = sum(c['gemini_input_tokens'] for c in conversation_results)
-        total_gemini_output = sum(c['gemini_output_tokens'] for c in conversation_results)
-        
-        # Calculate averages
-        avg_time = total_time / total_conversations if total_conversations > 0 else 0
-        avg_iterations = total_iterations / total_conversations if total_conversations > 0 else 0
-        avg_messages = total_messages / total_conversations if total_conversations > 0 else 0
-        
-        # Build summary
-        summary = {
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-            'total_conversations': total_conversations,
-            'successful_conversations': successful_conversations,
-            'success_rate': f"{(successful_conversations/total_conversations*100):.2f}%" if total_conversations > 0 else "0%",
-            'total_iterations': total_iterations,
-            'avg_iterations_per_conversation': round(avg_iterations, 2),
-            'total_messages': total_messages,
-            'avg_messages_per_conversation': round(avg_messages, 2),
-            'total_time_ms': round(total_time, 0),
-            'avg_time_per_conversation_ms': round(avg_time, 0),
-            'gemini_tokens': {
-                'model': 'gemini-2.5-flash',
-                'total_input_tokens': total_gemini_input,
-                'total_output_tokens': total_gemini_output,
-                'total_tokens': total_gemini_input + total_gemini_output,
-                'cost_usd': round(total_cost, 6),
-                'pricing': {
-                    'input_per_1m_tokens': '$0.30',
-                    'output_per_1m_tokens': '$2.50'
-                }
-            },
-            'total_cost_usd': round(total_cost, 6)
-        }
-        
-        # Create logs folder if it doesn't exist
-        logs_dir = "logs"
-        if not os.path.exists(logs_dir):
-            os.makedirs(logs_dir)
-        
-        # Save to JSON file
-        output_file = os.path.join(logs_dir, f"load_test_fast_results_{time.strftime('%d_%m_%y_%H_%M')}.json")
-        
-        # Create summary list without full message history (already saved in individual files)
-        conversations_summary = []
-        for conv in conversation_results:
-            conv_summary = {
-                'session_id': conv['session_id'],
-                'timestamp': conv['timestamp'],
-                'iterations': conv['iterations'],
-                'total_messages': conv['total_messages'],
-                'found_link': conv['found_link'],
-                'total_time_ms': conv['total_time_ms'],
-                'cost': conv['cost']
+    results_sink.close()
+    if not results_sink:
+        logger.warning("⚠️  No conversation results to save")
+        return
+    
+    # Calculate aggregated statistics
+    totals = results_sink.totals
+    total_conversations = totals['conversations']
+    successful_conversations = totals['successful']
+    total_iterations = totals['iterations']
+    total_messages = totals['messages']
+    total_time = totals['time_ms']
+    total_cost = totals['cost']
+    
+    # Gemini token totals
+    total_gemini_input = totals['gemini_input_tokens']
+    total_gemini_output = totals['gemini_output_tokens']
+    
+    # Average Gemini input tokens per turn (flat with the history window, growing without it)
+    avg_input_tokens_by_turn = results_sink.avg_input_tokens_by_turn()
+    
+    # Calculate averages
+    avg_time = total_time / total_conversations if total_conversations > 0 else 0
+    avg_iterations = total_iterations / total_conversations if total_conversations > 0 else 0
+    avg_messages = total_messages / total_conversations if total_conversations > 0 else 0
+    
+    # Build summary
+    summary = {
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'total_conversations': total_conversations,
+        'successful_conversations': successful_conversations,
+        'success_rate': f"{(successful_conversations/total_conversations*100):.2f}%" if total_conversations > 0 else "0%",
+        'total_iterations': total_iterations,
+        'avg_iterations_per_conversation': round(avg_iterations, 2),
+        'total_messages': total_messages,
+        'avg_messages_per_conversation': round(avg_messages, 2),
+        'total_time_ms': round(total_time, 0),
+        'avg_time_per_conversation_ms': round(avg_time, 0),
+        'user_simulator': USER_SIMULATOR,
+        'callback_transport': CALLBACK_TRANSPORT,
+        'callback_url': callback_url,
+        'webhooks': dict(webhook_store.stats),
+        'user_data_cache': OptimizedUserData.cache_summary()['users'],
+        'conversation_log': conversation_log.summary(),
+        'turn_latency': turn_latency.summary(),
+        'funnel': stage_funnel.summary(),
+        'coordinated_omission': dict(co_stats.summary(), pacing_interval_s=TURN_PACING_INTERVAL),
+        'arrivals': dict(arrival_driver.summary(), max_delay_s=ARRIVAL_MAX_DELAY) if arrival_driver else None,
+        'load_model': LOAD_MODEL,
+        'logging': dict(pipeline_stats(logger), mode=LOG_MODE),
+        'retries': {'voyager': dict(voyager_retry.stats), 'gemini': dict(gemini_retry.stats)},
+        'circuit_breakers': {'voyager': voyager_breaker.summary(), 'gemini': gemini_breaker.summary()},
+        'gemini_cache': dict(gemini_cache.stats, entries=len(gemini_cache),
+                             hit_ratio=round(gemini_cache.hit_ratio(), 4)) if gemini_cache else None,
+        'gemini_pool': gemini_pool.summary() if gemini_pool else None,
+        'gemini_scheduler': gemini_scheduler.summary() if gemini_scheduler else None,
+        'gemini_history': {'turns': GEMINI_HISTORY_TURNS or None, 'summary': GEMINI_HISTORY_SUMMARY} if gemini_pool else None,
+        'gemini_tokens': {
+            'model': 'gemini-2.5-flash',
+            'total_input_tokens': total_gemini_input,
+            'total_output_tokens': total_gemini_output,
+            'total_tokens': total_gemini_input + total_gemini_output,
+            'avg_input_tokens_by_turn': avg_input_tokens_by_turn,
+            'cost_usd': round(total_cost, 6),
+            'pricing': {
+                'input_per_1m_tokens': '$0.30',
+                'output_per_1m_tokens': '$2.50'
             }
-            if 'error' in conv:
-                conv_summary['error'] = conv['error']
-            conversations_summary.append(conv_summary)
+        },
+        'total_cost_usd': round(total_cost, 6)
+    }
+    
+    # Create logs folder if it doesn't exist
+    logs_dir = "logs"
+    if not os.path.exists(logs_dir):
+        os.makedirs(logs_dir)
+    
+    # Save to JSON file
+    output_file = os.path.join(logs_dir, f"load_test_fast_results_{time.strftime('%d_%m_%y_%H_%M')}.json")
+    
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'summary': summary,
+                'conversations_file': results_sink.path
+            }, f, indent=2, ensure_ascii=False)
         
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'summary': summary,
-                    'conversations': conversations_summary
-                }, f, indent=2, ensure_ascii=False)
-            
-            logger.info("=" * 80)
-            logger.info("📊 TEST RESULTS SUMMARY (FASTAPI)")
-            logger.info("=" * 80)
-            logger.info(f"✅ Total conversations: {total_conversations}")
-            logger.info(f"🎯 Successful (link found): {successful_conversations} ({summary['success_rate']})")
-            logger.info(f"📈 Total iterations: {total_iterations} (avg: {summary['avg_iterations_per_conversation']})")
-            logger.info(f"💬 Total messages: {total_messages} (avg: {summary['avg_messages_per_conversation']})")
-            logger.info(f"⏱️  Total time: {total_time/1000:.1f}s (avg: {avg_time/1000:.1f}s per conversation)")
-            logger.info(f"💰 Total cost: ${total_cost:.6f}")
-            logger.info(f"💾 Results saved to: {output_file}")
-            logger.info("=" * 80)
-            
-        except Exception as e:
-            logger.error(f"❌ Error saving results: {e}")
+        logger.info("=" * 80)
+        logger.info("📊 TEST RESULTS SUMMARY (FASTAPI)")
+        logger.info("=" * 80)
+        logger.info(f"✅ Total conversations: {total_conversations}")
+        logger.info(f"🎯 Successful (link found): {successful_conversations} ({summary['success_rate']})")
+        logger.info(f"📈 Total iterations: {total_iterations} (avg: {summary['avg_iterations_per_conversation']})")
+        logger.info(f"💬 Total messages: {total_messages} (avg: {summary['avg_messages_per_conversation']})")
+        logger.info(f"⏱️  Total time: {total_time/1000:.1f}s (avg: {avg_time/1000:.1f}s per conversation)")
+        logger.info(f"💰 Total cost: ${total_cost:.6f}")
+        logger.info(f"🔌 Callback transport: {CALLBACK_TRANSPORT} ({callback_url})")
+        logger.info(f"📬 Webhooks: {webhook_store.stats['received']} received, {webhook_store.stats['late']} late, {webhook_store.stats['orphaned']} orphaned")
+        logger.info(f"🔁 Retries: Voyager {voyager_retry.stats['retries']}, Gemini {gemini_retry.stats['retries']} - "
+                    f"circuit opened: Voyager {voyager_breaker.stats['opened']}x, Gemini {gemini_breaker.stats['opened']}x")
+        if gemini_cache:
+            logger.info(f"🗃️  Gemini cache: {gemini_cache.stats['hits']} hits, {gemini_cache.stats['misses']} misses ({gemini_cache.hit_ratio():.1%})")
+        if gemini_pool:
+            pool_stats = gemini_pool.summary()
+            logger.info(f"🔗 Gemini pool: {pool_stats['clients_created']} clients, {pool_stats['connections_opened']} connections, "
+                        f"peak in use {pool_stats['peak_in_use']}, avg wait {pool_stats['avg_wait_ms']}ms")
+        if gemini_scheduler:
+            scheduler_stats = gemini_scheduler.summary()
+            logger.info(f"🚦 Gemini scheduler: {scheduler_stats['queued']}/{scheduler_stats['admitted']} calls queued, "
+                        f"avg wait {scheduler_stats['avg_wait_ms']}ms, max {scheduler_stats['max_wait_ms']}ms, {scheduler_stats['pauses']} pauses (429)")
+        if avg_input_tokens_by_turn:
+            turns = list(avg_input_tokens_by_turn)
+            logger.info(f"🪟 Gemini input tokens per turn: {avg_input_tokens_by_turn[turns[0]]} (turn {turns[0]}) -> "
+                        f"{avg_input_tokens_by_turn[turns[-1]]} (turn {turns[-1]}), history window: {GEMINI_HISTORY_TURNS or 'full'}")
+        log_stats = conversation_log.summary()
+        logger.info(f"📝 Conversation logs: {log_stats['written']} written in {log_stats['segments']} segments, "
+                    f"avg lag {log_stats['avg_lag_ms']}ms, max {log_stats['max_lag_ms']}ms, peak queue depth {log_stats['peak_queue_depth']}")
+        funnel = stage_funnel.summary()
+        logger.info("🪜 Funnel: " + " -> ".join(
+            f"{stage} {stats['reached']} (p50 {stats['time_to_stage_ms']['p50']/1000:.1f}s)" for stage, stats in funnel['stages'].items()))
+        drop_offs = {stage: count for stage, count in stage_funnel.dropped_off.items() if count}
+        if drop_offs:
+            logger.info("🚪 Drop-off stages: " + ", ".join(f"{stage} {count}" for stage, count in drop_offs.items()))
+        co_summary = co_stats.summary()
+        if co_summary['turns']:
+            logger.info(f"⏲️  Turn latency p99: {co_summary['raw_ms']['p99']}ms raw, {co_summary['corrected_ms']['p99']}ms corrected "
+                        f"({co_summary['late_turns']}/{co_summary['turns']} turns sent behind schedule, max lag {co_summary['send_lag_ms']['max']}ms)")
+        if arrival_driver:
+            arrivals = arrival_driver.summary()
+            logger.info(f"📥 Arrivals ({arrivals['profile']}): {arrivals['achieved_rate']}/s achieved vs {arrivals['target_rate']}/s target "
+                        f"({arrivals['started']} started, {arrivals['missed']} missed, peak {arrivals['peak_concurrency']} in flight, "
+                        f"start delay p99 {arrivals['start_delay_ms']['p99']}ms)")
+        worst_turns = turn_latency.worst_turns('p99')
+        if worst_turns:
+            logger.info("📐 Slowest turn (p99): " + ", ".join(
+                f"{stage} turn {turn} ({ms:.0f}ms)" for stage, (turn, ms) in worst_turns.items()))
+        logger.info(f"💾 Results saved to: {output_file} (conversations: {results_sink.path}, logs: {conversation_log.index_path})")
+        logger.info("=" * 80)
+        
+    except Exception as e:
+        logger.error(f"❌ Error saving results: {e}")
 
 
 @events.init.add_listener
 def on_locust_init(environment, **kwargs):
     """Evento executado quando o Locust é iniciado"""
     logger.info("🚀 Iniciando sistema de teste de carga com FastAPI...")
-    print("🚀 Iniciando sistema de teste de carga com FastAPI...")
     
-    # Inicia FastAPI em thread separada
-    logger.info("📡 Iniciando servidor FastAPI...")
-    print("📡 Iniciando servidor FastAPI...")
-    fastapi_thread = Thread(target=start_fastapi, daemon=True)
-    fastapi_thread.start()
+    results_sink.start()
+    conversation_log.start()
+    
+    OptimizedUserData.set_cache_size(USER_DATA_CACHE_SIZE)
+    if USER_DATA_PRELOAD:
+        # Dados de todos os usuários gerados em lote (NumPy), fora do spawn
+        OptimizedUserData.preload(USER_DATA_PRELOAD, seed=USER_DATA_SEED)
+        logger.info(f"👥 Dados de {USER_DATA_PRELOAD} usuários gerados em lote")
+    
+    global webhook_server
+    if WEBHOOK_SERVER == "gevent":
+        # Receptor gevent no mesmo hub dos usuários (sem thread nem event loop próprio)
+        logger.info("📡 Iniciando receptor de webhooks gevent...")
+        webhook_server = start_gevent_server(make_webhook_app(webhook_store, WEBHOOK_PATH), FLASK_HOST, FLASK_PORT)
+    else:
+        # Inicia FastAPI em thread separada
+        logger.info("📡 Iniciando servidor FastAPI...")
+        fastapi_thread = Thread(target=start_fastapi, daemon=True)
+        fastapi_thread.start()
+        
+        # Aguarda FastAPI iniciar
+        logger.info("⏳ Aguardando FastAPI inicializar (2 segundos)...")
+        time.sleep(2)
+    
+    global callback_url
+    if CALLBACK_TRANSPORT == "direct":
+        # Voyager chama o receptor diretamente, sem túnel
+        callback_url = CALLBACK_BASE_URL.rstrip('/')
+        logger.info(f"🔌 Callback direto (sem ngrok): {callback_url}")
+    else:
+        # Inicia ngrok
+        logger.info("🔗 Iniciando túnel ngrok...")
+        callback_url = start_ngrok()
     
-    # Aguarda FastAPI iniciar
-    print("⏳ Aguardando FastAPI inicializar (2 segundos)...")
-    time.sleep(2)
+    # Lê e compila todas as personas uma única vez (os usuários só preenchem os dados)
+    persona_templates.update(load_persona_templates(PERSONAS_GLOB))
+    persona_files[:] = list(persona_templates)
+    if persona_files:
+        logger.info(f"🎭 {len(persona_files)} personas carregadas: {', '.join(persona_files)}")
+    else:
+        logger.error(f"❌ Nenhuma persona encontrada em {PERSONAS_GLOB}")
     
-    # Inicia ngrok
-    logger.info("🔗 Iniciando túnel ngrok...")
-    print("🔗 Iniciando túnel ngrok...")
-    start_ngrok()
+    if gemini_cache:
+        loaded = gemini_cache.load()
+        logger.info(f"🗃️  Cache do Gemini ativo ({GEMINI_CACHE_KEY}): {loaded} respostas carregadas de {GEMINI_CACHE_FILE}")
     
     logger.info("✅ Sistema pronto para receber requisições!")
-    print("✅ Sistema pronto para receber requisições!")
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    """LOG_MODE "quiet": amostra os logs só enquanto o teste roda"""
+    log_listener.set_sampling(True)
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    log_listener.set_sampling(False)
 
 
 @events.quitting.add_listener
 def on_locust_quit(environment, **kwargs):
     """Evento executado quando o Locust é encerrado"""
-    logger.info("🛑 Encerrando ngrok...")
-    try:
-        ngrok.kill()
-    except:
-        pass
+    if CALLBACK_TRANSPORT != "direct":
+        logger.info("🛑 Encerrando ngrok...")
+        try:
+            ngrok.kill()
+        except:
+            pass
+    
+    if webhook_server:
+        webhook_server.stop(timeout=1)
+    
+    if gemini_pool:
+        gemini_pool.close()
+    
+    if gemini_cache:
+        try:
+            gemini_cache.save()
+            logger.info(f"🗃️  Cache do Gemini salvo: {len(gemini_cache)} respostas em {GEMINI_CACHE_FILE}")
+        except Exception as e:
+            logger.error(f"❌ Erro ao salvar cache do Gemini: {e}")
     
-    # Save results to JSON
+    # Write the conversation logs still queued, then save results to JSON
+    conversation_log.close()
     save_test_results()
+    
+    # Write the log records still queued
+    log_listener.stop()
 
 
 class VoyagerUser(HttpUser):
@@ -282,15 +648,19 @@ class VoyagerUser(HttpUser):
     # URL da API Voyager
     host = VOYAGER_API_URL
     
-    # Tempo de espera entre conversas completas
-    wait_time = constant_pacing(USER_WAIT_TIME)
+    # Tempo de espera entre conversas completas (modelo aberto: o ritmo vem de ARRIVAL_PROFILE)
+    wait_time = constant_pacing(USER_WAIT_TIME) if LOAD_MODEL != "open" else constant(0)
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.base_session_id = None
-        self.gemini_client = None
         self.gemini_chat = None
-        self.conversation_completed = False  # Flag to ensure only one conversation per user
+        self.new_customer()
+    
+    def new_customer(self):
+        """Assigns a new user ID and user data (on creation and each time the open model recycles the user)"""
+        self.gemini_token_estimate = 0
+        self.conversation_completed = False  # Flag to ensure only one conversation per customer
         
         # Generate unique user ID and data
         global user_id_counter
@@ -305,97 +675,168 @@ class VoyagerUser(HttpUser):
     def on_start(self):
         """Inicializa o cliente Gemini quando o usuário começa"""
         try:
-            # Randomly select one of the three personas for this user
-            self.persona_file = f'personas/persona_{random.randint(1,3)}.txt'
+            if not persona_files:
+                logger.error(f"❌ No personas loaded from {PERSONAS_GLOB}")
+                return
             
-            # Load the selected persona
-            try:
-                with open(self.persona_file, 'r') as p:
-                    persona_content = p.read()
-            except FileNotFoundError:
-                logger.error(f"❌ Persona file not found: {self.persona_file}")
-                persona_content = ""
-            
-            # Print user data before replacement
-            print(f"\n📋 User data for replacement - Phone: {self.user_data['telefone']}, Email: {self.user_data['email']}, CPF: {self.user_data['cpf_formatted']}")
-            
-            # Customize persona with generated user data based on persona file
-            # Note: CPF in personas is unformatted (numbers only), but we replace with formatted version
-            customized_persona = persona_content
-
-            if self.persona_file == 'personas/persona_1.txt':
-                customized_persona = customized_persona.replace("5531988776655", self.user_data['telefone'])
-                customized_persona = customized_persona.replace("kataryna.smart@smarttalks.ai", self.user_data['email'])
-                customized_persona = customized_persona.replace("87325940548", self.user_data['cpf_formatted'])
-            elif self.persona_file == 'personas/persona_2.txt':
-                customized_persona = customized_persona.replace("5521987654321", self.user_data['telefone'])
-                customized_persona = customized_persona.replace("talliz.smart@smarttalks.ai", self.user_data['email'])
-                customized_persona = customized_persona.replace("12345678901", self.user_data['cpf_formatted'])
-            elif self.persona_file == 'personas/persona_3.txt':
-                customized_persona = customized_persona.replace("5511976543210", self.user_data['telefone'])
-                customized_persona = customized_persona.replace("edman.smart@smarttalks.ai", self.user_data['email'])
-                customized_persona = customized_persona.replace("98765432100", self.user_data['cpf_formatted'])
-            else:
-                logger.error(f"❌ Unknown persona file: {self.persona_file}")
+            # Randomly select one of the precompiled personas and fill in this user's data
+            self.persona_file = random.choice(persona_files)
+            customized_persona = persona_templates[self.persona_file].render(self.user_data)
+            logger.debug(f"🎭 Persona for user {self.user_id} ({self.persona_file}):\n{customized_persona}")
+            
+            if USER_SIMULATOR == "scripted":
+                # Local rule-based persona: no Gemini client, no tokens
+                self.gemini_chat = ScriptedPersonaChat(
+                    customized_persona, self.user_data, delay=SCRIPTED_RESPONSE_DELAY, seed=self.user_id
+                )
+                logger.info(f"✅ Scripted persona created for user {self.user_id} with persona: {self.persona_file}")
                 return
             
-            # Print the final customized persona for debugging
-            print("=" * 80)
-            print(f"🎭 FINAL CUSTOMIZED PERSONA for user {self.user_id}:")
-            print("=" * 80)
-            print(customized_persona)
-            print("=" * 80)
-            print()
-            
-            # Store client as instance variable to prevent it from being closed
-            self.gemini_client = genai.Client(
-                api_key=os.environ.get('GOOGLE_API_KEY') or os.environ.get('GEMINI_API_KEY')
-            )
-            self.gemini_chat = self.gemini_client.chats.create(
-                model="gemini-2.5-flash",
-                config=genai.types.GenerateContentConfig(system_instruction=customized_persona)
-            )
+            # Tokens expected in the next Gemini call (system prompt + history), refined from usage_metadata
+            self.gemini_token_estimate = estimate_tokens(customized_persona)
+            
+            # Per-user chat on a shared, pooled client (no per-user connection pool)
+            persona_config = genai.types.GenerateContentConfig(system_instruction=customized_persona)
+            if GEMINI_HISTORY_TURNS:
+                # Resends only the last turns (plus a running summary), not the whole history
+                self.gemini_chat = gemini_pool.create_windowed_chat(
+                    model="gemini-2.5-flash",
+                    config=persona_config,
+                    max_turns=GEMINI_HISTORY_TURNS,
+                    summary=GEMINI_HISTORY_SUMMARY,
+                    summary_max_chars=GEMINI_HISTORY_SUMMARY_MAX_CHARS
+                )
+            else:
+                self.gemini_chat = gemini_pool.create_chat(model="gemini-2.5-flash", config=persona_config)
             logger.info(f"✅ Gemini chat session created for user {self.user_id} with persona: {self.persona_file} and customized data")
         except Exception as e:
             logger.error(f"❌ Error creating Gemini session: {e}")
             self.gemini_chat = None
-            self.gemini_client = None
     
     def on_stop(self):
-        """Clean up Gemini client when user stops"""
-        try:
-            if hasattr(self, 'gemini_client') and self.gemini_client:
-                self.gemini_client.close()
-                logger.info("✅ Gemini client closed")
-        except Exception as e:
-            logger.error(f"⚠️  Error closing Gemini client: {e}")
+        """Releases the user's Gemini chat (the shared clients are closed on quit)"""
+        self.gemini_chat = None
+    
+    def recycle(self):
+        """Open model: a user whose conversation finished comes back as a new customer"""
+        self.on_stop()
+        self.new_customer()
+        self.on_start()
     
     def wait_for_webhook(self, session_id, timeout=WEBHOOK_TIMEOUT):
         """
-        Aguarda a resposta do webhook por polling
+        Aguarda a resposta do webhook (acordado pelo handler, sem polling)
         
         Args:
             session_id: ID da sessão para verificar
             timeout: Tempo máximo de espera em segundos
             
         Returns:
-            dict: Payload recebido ou None se timeout
+            WebhookTurn: Payload do turno (todos os webhooks combinados) e
+            instantes do primeiro/último webhook, ou None se timeout
+        """
+        return webhook_store.wait(session_id, timeout)
+    
+    def call_gemini(self, call, estimated_tokens):
         """
-        start_time = time.time()
+        Runs one Gemini call (a persona turn or a history summary)
         
-        while time.time() - start_time < timeout:
-            with responses_lock:
-                if session_id in webhook_responses:
-                    response = webhook_responses[session_id]
-                    # Remove da memória após recuperar
-                    if CLEAR_WEBHOOKS_AFTER_READ:
-                        del webhook_responses[session_id]
-                    return response
-            
-            # Aguarda antes de verificar novamente
-            time.sleep(POLLING_INTERVAL)
+        The call first waits for the RPM/TPM scheduler and for a pool slot; only
+        then the clock starts, so quota pressure shows up as "Gemini Queue Wait"
+        and "Gemini Pool Wait" instead of Gemini latency.
+        
+        Returns:
+            tuple: (response, Gemini time in ms)
+        """
+        # Fail fast while Gemini is down, before taking a slot from the quota
+        probe = gemini_breaker.before_call()
+        
+        ticket = None
+        if gemini_scheduler:
+            ticket = gemini_scheduler.admit(estimated_tokens)
+        
+        with gemini_pool.slot() if gemini_pool else nullcontext():
+            gemini_start = time.time()
+            try:
+                gemini_response = call()
+            except Exception as e:
+                gemini_breaker.record_failure(probe)
+                if gemini_scheduler and getattr(e, 'code', None) == 429:
+                    # Quota exceeded: hold every user back, not only this one
+                    gemini_scheduler.pause(GEMINI_429_COOLDOWN)
+                raise
+            gemini_time = (time.time() - gemini_start) * 1000
+        gemini_breaker.record_success(probe)
+        
+        usage = getattr(gemini_response, 'usage_metadata', None)
+        if usage and ticket:
+            gemini_scheduler.settle(ticket, (usage.prompt_token_count or 0) + (usage.candidates_token_count or 0))
         
-        return None
+        return gemini_response, gemini_time
+    
+    def send_to_gemini(self, message):
+        """
+        Sends one message to the persona chat
+        
+        Returns:
+            tuple: (response, Gemini time in ms)
+        """
+        gemini_response, gemini_time = self.call_gemini(
+            lambda: self.gemini_chat.send_message(message),
+            self.gemini_token_estimate + estimate_tokens(message)
+        )
+        
+        usage = getattr(gemini_response, 'usage_metadata', None)
+        if usage:
+            # The next prompt carries this exchange (or the history window of it)
+            self.gemini_token_estimate = (usage.prompt_token_count or 0) + (usage.candidates_token_count or 0)
+        
+        return gemini_response, gemini_time
+    
+    def summarize_gemini_history(self):
+        """
+        Folds the turns that left the history window into the running summary
+        
+        Only used with GEMINI_HISTORY_SUMMARY = "gemini". A failure is not fatal:
+        the turns stay pending, keep being sent and are summarized next turn.
+        
+        Returns:
+            tuple: (input tokens, output tokens) of the summary call
+        """
+        try:
+            summary_response, summary_time = self.call_gemini(self.gemini_chat.summarize, self.gemini_token_estimate)
+        except Exception as e:
+            logger.warning(f"⚠️  Gemini history summary failed: {e}")
+            events.request.fire(
+                request_type="GEMINI",
+                name="Gemini History Summary",
+                response_time=0,
+                response_length=0,
+                exception=e,
+                context={}
+            )
+            return 0, 0
+        
+        events.request.fire(
+            request_type="GEMINI",
+            name="Gemini History Summary",
+            response_time=summary_time,
+            response_length=len(self.gemini_chat.summary),
+            exception=None,
+            context={}
+        )
+        usage = getattr(summary_response, 'usage_metadata', None)
+        if not usage:
+            return 0, 0
+        return usage.prompt_token_count or 0, usage.candidates_token_count or 0
+    
+    def record_cached_turn(self, voyager_message, reply):
+        """Adds a turn answered from the cache to the Gemini chat history"""
+        self.gemini_chat.record_history(
+            user_input=genai.types.Content(role='user', parts=[genai.types.Part(text=voyager_message)]),
+            model_output=[genai.types.Content(role='model', parts=[genai.types.Part(text=reply)])],
+            is_valid=True
+        )
     
     def extract_voyager_messages(self, webhook_response):
         """
@@ -432,18 +873,11 @@ class VoyagerUser(HttpUser):
     
     def save_conversation_log(self, conversation_data, gemini_input_tokens, gemini_output_tokens, total_cost):
         """
-        Save individual conversation to JSON file
-        """
-        # Create logs folder if it doesn't exist
-        logs_dir = "logs"
-        if not os.path.exists(logs_dir):
-            os.makedirs(logs_dir)
-        
-        # Generate filename with timestamp and session_id (short version)
-        short_session = conversation_data['session_id'][:8]
-        timestamp = time.strftime('%d_%m_%y_%H_%M_%S')
-        output_file = os.path.join(logs_dir, f"conversation_fast_{short_session}_{timestamp}.json")
+        Queue the conversation log for the background writer (conversation_log)
         
+        Serialization and disk I/O happen off the hub, so they don't land in the
+        next conversation's timings; only a full queue makes the user wait.
+        """
         # Build conversation log similar to voyager_chat.py
         log_data = {
             'summary': {
@@ -479,15 +913,67 @@ class VoyagerUser(HttpUser):
                 },
                 'total_cost_usd': round(total_cost, 6)
             },
+            'turns': conversation_data.get('turns', []),
             'messages': conversation_data['messages']
         }
         
-        try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(log_data, f, indent=2, ensure_ascii=False)
-            logger.info(f"💾 Conversation saved to: {output_file}")
-        except Exception as e:
-            logger.error(f"❌ Error saving conversation log: {e}")
+        waited = conversation_log.submit(log_data)
+        events.request.fire(
+            request_type="LOG",
+            name="Conversation Log Queue Wait",
+            response_time=waited * 1000,
+            response_length=0,
+            exception=None,
+            context={}
+        )
+        logger.debug(f"💾 Conversation queued for {conversation_log.name} (queue depth: {conversation_log.queue_depth()})")
+    
+    def post_to_voyager(self, payload):
+        """
+        POSTs the message to Voyager, retrying 429/5xx and connection errors
+        with exponential backoff and jitter (VOYAGER_RETRY)
+        
+        Returns:
+            tuple: (response, start time of the accepted attempt, breaker probe id),
+            or (None, None, None) when the attempts ran out or the Voyager
+            circuit breaker is open
+        """
+        voyager_retry.record_request()
+        
+        for attempt in range(voyager_retry.max_attempts):
+            try:
+                probe = voyager_breaker.before_call()
+            except CircuitOpenError as e:
+                logger.error(f"🔌 {e} - message not sent")
+                on_circuit_open("Voyager", e)
+                return None, None, None
+            
+            start_time = time.time()
+            response = self.client.post(
+                VOYAGER_ENDPOINT,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                name="Voyager Message"
+            )
+            
+            if response.status_code in [200, 201, 202]:
+                # Success is recorded on the breaker when the webhook arrives
+                return response, start_time, probe
+            
+            voyager_breaker.record_failure(probe)
+            logger.error(f"❌ Voyager API error - Status: {response.status_code}")
+            console.info(f"❌ FastAPI: Voyager API error - Status: {response.status_code}")
+            
+            # Other 4xx won't get better on retry; status 0 is a connection error
+            retryable = response.status_code in (0, 429) or response.status_code >= 500
+            if not retryable or attempt == voyager_retry.max_attempts - 1 or not voyager_retry.can_retry():
+                return None, None, None
+            
+            delay = voyager_retry.backoff(attempt)
+            logger.warning(f"   Retrying Voyager in {delay:.1f}s (attempt {attempt + 2}/{voyager_retry.max_attempts})")
+            time.sleep(delay)
+        
+        return None, None, None
     
     def send_to_voyager(self, message_text, iteration_suffix):
         """
@@ -497,7 +983,7 @@ class VoyagerUser(HttpUser):
         """
         # Unique webhook session ID for this specific request
         webhook_session_id = f"{self.base_session_id}_{iteration_suffix}"
-        webhook_url = f"{ngrok_url}{WEBHOOK_PATH}/{webhook_session_id}"
+        webhook_url = f"{callback_url}{WEBHOOK_PATH}/{webhook_session_id}"
         
         payload = {
             "type": "text",
@@ -507,46 +993,50 @@ class VoyagerUser(HttpUser):
             "webhook": webhook_url
         }
         
-        print(f"📤 FastAPI: Sending to Voyager with webhook URL: {webhook_url}")
+        console.info(f"📤 FastAPI: Sending to Voyager with webhook URL: {webhook_url}")
         logger.info(f"📤 Sending to Voyager with webhook URL: {webhook_url}")
         
-        start_time = time.time()
-        
+        probe = None
         try:
-            response = self.client.post(
-                VOYAGER_ENDPOINT,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                name="Voyager Message"
-            )
-            
-            if response.status_code not in [200, 201, 202]:
-                logger.error(f"❌ Voyager API error - Status: {response.status_code}")
-                print(f"❌ FastAPI: Voyager API error - Status: {response.status_code}")
+            response, start_time, probe = self.post_to_voyager(payload)
+            if response is None:
                 return None
+            record_turn_latency('voyager_post', iteration_suffix, (time.time() - start_time) * 1000)
             
             # Wait for webhook response
             logger.info(f"⏳ Waiting for webhook response (timeout: {WEBHOOK_TIMEOUT}s)")
-            webhook_response = self.wait_for_webhook(webhook_session_id, timeout=WEBHOOK_TIMEOUT)
+            webhook_turn = self.wait_for_webhook(webhook_session_id, timeout=WEBHOOK_TIMEOUT)
+            webhook_response = webhook_turn.payload if webhook_turn else None
             
             # Log webhook response status
             if webhook_response:
-                logger.info(f"✅ Got webhook response in {(time.time() - start_time):.1f}s")
+                voyager_breaker.record_success(probe)
+                logger.info(f"✅ Got webhook response in {(webhook_turn.last_at - start_time):.3f}s ({webhook_turn.parts} webhook(s))")
                 logger.debug(f"Webhook response: {json.dumps(webhook_response)[:500]}")
             else:
+                voyager_breaker.record_failure(probe)
                 logger.error(f"❌ Webhook timeout after {WEBHOOK_TIMEOUT}s")
             
-            # Fire custom event for webhook
+            # Fire custom events for webhook: first message and complete turn (last message)
             total_time = (time.time() - start_time) * 1000
             if webhook_response:
+                events.request.fire(
+                    request_type="WEBHOOK",
+                    name="Voyager Webhook First Message",
+                    response_time=(webhook_turn.first_at - start_time) * 1000,
+                    response_length=len(str(webhook_response)),
+                    exception=None,
+                    context={}
+                )
                 events.request.fire(
                     request_type="WEBHOOK",
                     name="Voyager Webhook",
-                    response_time=total_time,
+                    response_time=(webhook_turn.last_at - start_time) * 1000,
                     response_length=len(str(webhook_response)),
                     exception=None,
                     context={}
                 )
+                record_turn_latency('voyager_webhook', iteration_suffix, (webhook_turn.last_at - start_time) * 1000)
             else:
                 events.request.fire(
                     request_type="WEBHOOK",
@@ -556,14 +1046,29 @@ class VoyagerUser(HttpUser):
                     exception=Exception("Webhook timeout"),
                     context={}
                 )
+                record_turn_latency('voyager_webhook', iteration_suffix, total_time, exception=Exception("Webhook timeout"))
             
             return webhook_response
             
         except Exception as e:
+            voyager_breaker.record_failure(probe)
             logger.error(f"❌ Error sending to Voyager: {e}")
             return None
     
     @task
+    def start_conversation(self):
+        """Closed model: one conversation per user. Open model: one conversation per scheduled arrival"""
+        if arrival_driver is None:
+            self.run_complete_conversation()
+            return
+        
+        # The user that finished the previous arrival comes back as a new customer before the next one
+        if self.conversation_completed:
+            self.recycle()
+        arrival_driver.wait()
+        with arrival_driver.in_flight():
+            self.run_complete_conversation()
+    
     def run_complete_conversation(self):
         """Runs a complete conversation between Gemini and Voyager"""
         
@@ -582,6 +1087,9 @@ class VoyagerUser(HttpUser):
         
         # Initialize conversation tracking
         conversation_messages = []
+        turn_timings = []
+        conversation_stages = ConversationStages(stage_classifier)
+        voyager_history = []  # normalized Voyager messages (Gemini cache key)
         iteration_count = 0
         current_message = INITIAL_MESSAGE
         found_link = False
@@ -591,10 +1099,11 @@ class VoyagerUser(HttpUser):
         gemini_output_tokens = 0
         
         conversation_start_time = time.time()
+        schedule = TurnSchedule(conversation_start_time, interval=TURN_PACING_INTERVAL)
         
-        print(f"\n{'='*80}")
-        print(f"🎬 STARTING CONVERSATION (FastAPI) - Base Session ID: {self.base_session_id}")
-        print(f"{'='*80}\n")
+        console.info(f"\n{'='*80}")
+        console.info(f"🎬 STARTING CONVERSATION (FastAPI) - Base Session ID: {self.base_session_id}")
+        console.info(f"{'='*80}\n")
         logger.info(f"🎬 Starting conversation - Base Session ID: {self.base_session_id}")
         
         try:
@@ -606,10 +1115,13 @@ class VoyagerUser(HttpUser):
                 
                 # A. Send message to Voyager
                 logger.info(f"📤 Sending to Voyager (iteration {iteration_count}): {current_message[:100]}...")
+                turn_start_time = time.time()
+                send_lag_ms = schedule.lag(iteration_count, turn_start_time) * 1000
                 voyager_response = self.send_to_voyager(current_message, iteration_count)
+                turn_webhook_ms = (time.time() - turn_start_time) * 1000
                 
                 if not voyager_response:
-                    print(f"❌ VOYAGER WEBHOOK TIMEOUT (iteration {iteration_count}) - Breaking conversation")
+                    console.info(f"❌ VOYAGER WEBHOOK TIMEOUT (iteration {iteration_count}) - Breaking conversation")
                     logger.error(f"❌ Failed to get response from Voyager (iteration {iteration_count}) - Ending conversation")
                     logger.error(f"   Message sent: {current_message[:200]}")
                     break
@@ -619,8 +1131,8 @@ class VoyagerUser(HttpUser):
                 logger.info(f"📨 Received {len(voyager_messages)} message(s) from Voyager")
                 
                 if not voyager_messages:
-                    print(f"❌ NO MESSAGES IN VOYAGER RESPONSE (iteration {iteration_count})")
-                    print(f"   Full Voyager response: {json.dumps(voyager_response, indent=2)[:500]}")
+                    console.info(f"❌ NO MESSAGES IN VOYAGER RESPONSE (iteration {iteration_count})")
+                    console.info(f"   Full Voyager response: {json.dumps(voyager_response, indent=2)[:500]}")
                     logger.error(f"❌ No messages in Voyager response (iteration {iteration_count}) - Ending conversation")
                     logger.error(f"   Voyager response: {str(voyager_response)[:500]}")
                     
@@ -629,12 +1141,12 @@ class VoyagerUser(HttpUser):
                         # Try to extract text from different possible formats
                         text_content = voyager_response.get('text') or voyager_response.get('content') or voyager_response.get('message')
                         if text_content:
-                            print(f"   Found text content in alternative field: {text_content[:200]}")
+                            console.info(f"   Found text content in alternative field: {text_content[:200]}")
                             # Create a synthetic message from this text
                             voyager_messages = [{'role': 'assistant', 'content': text_content}]
                             logger.info(f"   ✅ Recovered message from alternative field")
                         else:
-                            print(f"   Response keys: {list(voyager_response.keys())}")
+                            console.info(f"   Response keys: {list(voyager_response.keys())}")
                             break
                     else:
                         break
@@ -645,11 +1157,24 @@ class VoyagerUser(HttpUser):
                     'content': current_message
                 })
                 
+                # Record turn timing (compiled into the replay corpus)
+                turn_timings.append({
+                    'iteration': iteration_count,
+                    'sent_offset_ms': round((turn_start_time - conversation_start_time) * 1000),
+                    'webhook_ms': round(turn_webhook_ms),
+                    'send_lag_ms': round(send_lag_ms)
+                })
+                record_turn_pacing(iteration_count, turn_webhook_ms, send_lag_ms, paced=schedule.paced)
+                
                 # Add Voyager assistant messages to conversation history
                 for msg in voyager_messages:
                     conversation_messages.append(msg)
                 
-                # C. Check for HTTP link in Voyager response
+                # C. Tag the reply with its booking stage, then check for an HTTP link
+                turn_timings[-1]['stage'] = conversation_stages.observe(
+                    [msg['content'] for msg in voyager_messages],
+                    (turn_start_time - conversation_start_time) * 1000 + turn_webhook_ms
+                )
                 for msg in voyager_messages:
                     voyager_links = re.findall(r'https?://[^\s]+', msg['content'])
                     if voyager_links:
@@ -670,63 +1195,109 @@ class VoyagerUser(HttpUser):
                 
                 logger.info(f"🤖 Sending to Gemini (iteration {iteration_count}): {last_voyager_message[:100]}...")
                 
-                # E. Send to Gemini (with retry on failure)
-                max_gemini_retries = 3
+                # E. Reuse a cached persona reply for this turn, if there is one
+                max_gemini_retries = gemini_retry.max_attempts
                 gemini_success = False
+                cache_key = None
                 
-                for retry_attempt in range(max_gemini_retries):
-                    try:
-                        gemini_start = time.time()
-                        logger.info(f"⏳ Sending message to Gemini (attempt {retry_attempt + 1}/{max_gemini_retries})")
-                        gemini_response = self.gemini_chat.send_message(last_voyager_message)
-                        gemini_message = gemini_response.text
-                        gemini_time = (time.time() - gemini_start) * 1000
-                        logger.info(f"✅ Got Gemini response in {gemini_time/1000:.1f}s")
-                        
-                        # Extract Gemini token usage
-                        if hasattr(gemini_response, 'usage_metadata') and gemini_response.usage_metadata:
-                            gemini_input_tokens += getattr(gemini_response.usage_metadata, 'prompt_token_count', 0)
-                            gemini_output_tokens += getattr(gemini_response.usage_metadata, 'candidates_token_count', 0)
-                        
-                        # Fire custom event for Gemini
+                if gemini_cache:
+                    normalized_message = normalize_message(last_voyager_message, self.user_data)
+                    cache_key = gemini_cache.make_key(self.persona_file, normalized_message, iteration_count, voyager_history)
+                    voyager_history.append(normalized_message)
+                    
+                    cached_reply = gemini_cache.get(cache_key)
+                    if cached_reply is not None:
+                        gemini_message = personalize(cached_reply, self.user_data)
+                        self.record_cached_turn(last_voyager_message, gemini_message)
                         events.request.fire(
                             request_type="GEMINI",
-                            name="Gemini Response",
-                            response_time=gemini_time,
+                            name="Gemini Cache Hit",
+                            response_time=0,
                             response_length=len(gemini_message),
                             exception=None,
                             context={}
                         )
-                        
-                        logger.info(f"✅ Gemini responded (iteration {iteration_count}): {gemini_message[:100]}...")
+                        logger.info(f"🗃️  Gemini reply served from cache (iteration {iteration_count}): {gemini_message[:100]}...")
                         gemini_success = True
-                        break  # Success, exit retry loop
-                        
-                    except Exception as e:
-                        if retry_attempt < max_gemini_retries - 1:
-                            # Not the last attempt, wait and retry
-                            logger.warning(f"⚠️  Gemini API error (attempt {retry_attempt + 1}/{max_gemini_retries}): {e}")
-                            logger.info(f"   Waiting 1 second before retry...")
-                            time.sleep(1)
-                        else:
-                            # Last attempt failed
-                            logger.error(f"❌ Gemini API error (all {max_gemini_retries} attempts failed): {e}")
-                            logger.error(f"   Iteration: {iteration_count}, Messages so far: {len(conversation_messages)}")
+                
+                # Otherwise send to Gemini (with retry on failure)
+                if not gemini_success:
+                    gemini_retry.record_request()
+                    for retry_attempt in range(max_gemini_retries):
+                        try:
+                            logger.info(f"⏳ Sending message to Gemini (attempt {retry_attempt + 1}/{max_gemini_retries})")
+                            gemini_response, gemini_time = self.send_to_gemini(last_voyager_message)
+                            gemini_message = gemini_response.text
+                            logger.info(f"✅ Got Gemini response in {gemini_time/1000:.1f}s")
+                            
+                            # Extract Gemini token usage
+                            if hasattr(gemini_response, 'usage_metadata') and gemini_response.usage_metadata:
+                                gemini_input_tokens += getattr(gemini_response.usage_metadata, 'prompt_token_count', 0)
+                                gemini_output_tokens += getattr(gemini_response.usage_metadata, 'candidates_token_count', 0)
+                                
+                                # Per-turn input tokens: should stay flat as MAX_ITERATIONS grows (history window)
+                                turn_timings[-1]['gemini_input_tokens'] = gemini_response.usage_metadata.prompt_token_count or 0
+                                turn_timings[-1]['gemini_output_tokens'] = gemini_response.usage_metadata.candidates_token_count or 0
+                            turn_timings[-1]['gemini_ms'] = round(gemini_time)
+                            
+                            # Fire custom event for Gemini
                             events.request.fire(
-                                request_type="GEMINI",
-                                name="Gemini Response",
-                                response_time=0,
-                                response_length=0,
-                                exception=e,
+                                request_type=PERSONA_REQUEST_TYPE,
+                                name=PERSONA_EVENT_NAME,
+                                response_time=gemini_time,
+                                response_length=len(gemini_message),
+                                exception=None,
                                 context={}
                             )
-                
+                            record_turn_latency('gemini', iteration_count, gemini_time)
+                            
+                            logger.info(f"✅ Gemini responded (iteration {iteration_count}): {gemini_message[:100]}...")
+                            
+                            if cache_key is not None:
+                                gemini_cache.put(cache_key, depersonalize(gemini_message, self.user_data))
+                            gemini_success = True
+                            break  # Success, exit retry loop
+                            
+                        except CircuitOpenError as e:
+                            # Gemini is failing for everyone: fail fast, no retries
+                            logger.error(f"🔌 {e} - skipping Gemini (iteration {iteration_count})")
+                            on_circuit_open("Gemini", e)
+                            break
+                            
+                        except Exception as e:
+                            if retry_attempt < max_gemini_retries - 1 and gemini_retry.can_retry():
+                                # Not the last attempt, back off (exponential, full jitter) and retry
+                                delay = gemini_retry.backoff(retry_attempt)
+                                logger.warning(f"⚠️  Gemini API error (attempt {retry_attempt + 1}/{max_gemini_retries}): {e}")
+                                logger.info(f"   Waiting {delay:.1f}s before retry...")
+                                time.sleep(delay)
+                            else:
+                                # Last attempt failed (or the retry budget ran out)
+                                logger.error(f"❌ Gemini API error (giving up after attempt {retry_attempt + 1}/{max_gemini_retries}): {e}")
+                                logger.error(f"   Iteration: {iteration_count}, Messages so far: {len(conversation_messages)}")
+                                events.request.fire(
+                                    request_type=PERSONA_REQUEST_TYPE,
+                                    name=PERSONA_EVENT_NAME,
+                                    response_time=0,
+                                    response_length=0,
+                                    exception=e,
+                                    context={}
+                                )
+                                record_turn_latency('gemini', iteration_count, 0, exception=e)
+                                break
+                    
                 # End conversation if Gemini failed after all retries
                 if not gemini_success:
-                    print(f"❌ GEMINI FAILED AFTER RETRIES (iteration {iteration_count}) - Breaking conversation")
+                    console.info(f"❌ GEMINI FAILED AFTER RETRIES (iteration {iteration_count}) - Breaking conversation")
                     logger.error(f"❌ Gemini failed after {max_gemini_retries} retries (iteration {iteration_count}) - Ending conversation")
                     break
                 
+                # Fold the turns that left the history window into the running summary
+                if isinstance(self.gemini_chat, WindowedPersonaChat) and self.gemini_chat.needs_summary():
+                    summary_input_tokens, summary_output_tokens = self.summarize_gemini_history()
+                    gemini_input_tokens += summary_input_tokens
+                    gemini_output_tokens += summary_output_tokens
+                
                 # F. Check for HTTP link in Gemini response
                 gemini_links = re.findall(r'https?://[^\s]+', gemini_message)
                 if gemini_links:
@@ -737,21 +1308,21 @@ class VoyagerUser(HttpUser):
                 # G. Prepare next iteration
                 current_message = gemini_message
                 
-                # Small delay between iterations
-                time.sleep(0.5)
+                # Small delay between iterations, never ahead of the pacing schedule (TURN_PACING_INTERVAL)
+                schedule.wait_for(iteration_count + 1)
             
             # Log why conversation ended
-            print(f"\n{'='*80}")
+            console.info(f"\n{'='*80}")
             if found_link:
-                print(f"✅ CONVERSATION ENDED: Link found (iteration {iteration_count})")
+                console.info(f"✅ CONVERSATION ENDED: Link found (iteration {iteration_count})")
                 logger.info(f"✅ Conversation ended: Link found (iteration {iteration_count})")
             elif iteration_count >= MAX_ITERATIONS:
-                print(f"⚠️  CONVERSATION ENDED: Max iterations reached ({iteration_count}/{MAX_ITERATIONS})")
+                console.info(f"⚠️  CONVERSATION ENDED: Max iterations reached ({iteration_count}/{MAX_ITERATIONS})")
                 logger.warning(f"⚠️  Conversation ended: Max iterations reached ({iteration_count}/{MAX_ITERATIONS})")
             else:
-                print(f"⚠️  CONVERSATION ENDED: Broke early at iteration {iteration_count}/{MAX_ITERATIONS}")
+                console.info(f"⚠️  CONVERSATION ENDED: Broke early at iteration {iteration_count}/{MAX_ITERATIONS}")
                 logger.warning(f"⚠️  Conversation ended: Broke early at iteration {iteration_count}/{MAX_ITERATIONS}")
-            print(f"{'='*80}\n")
+            console.info(f"{'='*80}\n")
             
             # Conversation complete
             total_conversation_time = (time.time() - conversation_start_time) * 1000
@@ -786,11 +1357,13 @@ class VoyagerUser(HttpUser):
                 'gemini_input_tokens': gemini_input_tokens,
                 'gemini_output_tokens': gemini_output_tokens,
                 'cost': total_cost,
+                **conversation_stages.result(found_link),
+                'turns': turn_timings,
                 'messages': conversation_messages
             }
             
-            with results_lock:
-                conversation_results.append(conversation_data)
+            results_sink.record(conversation_data)
+            stage_funnel.record(conversation_data)
             
             # Save individual conversation log
             self.save_conversation_log(conversation_data, gemini_input_tokens, gemini_output_tokens, total_cost)
@@ -809,9 +1382,7 @@ class VoyagerUser(HttpUser):
             )
             
         except Exception as e:
-            logger.error(f"💥 Unexpected error in conversation: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"💥 Unexpected error in conversation: {e}")
             
             # Store failed conversation result
             total_conversation_time = (time.time() - conversation_start_time) * 1000
@@ -835,11 +1406,13 @@ class VoyagerUser(HttpUser):
                 'gemini_output_tokens': gemini_output_tokens,
                 'cost': error_cost,
                 'error': str(e),
+                **conversation_stages.result(False),
+                'turns': turn_timings,
                 'messages': conversation_messages
             }
             
-            with results_lock:
-                conversation_results.append(conversation_data)
+            results_sink.record(conversation_data)
+            stage_funnel.record(conversation_data)
             
             # Save individual conversation log even for failed conversations
             self.save_conversation_log(conversation_data, gemini_input_tokens, gemini_output_tokens, error_cost)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Voyager local (mock) para testar o harness sem consumir a API real
+
+Aceita o mesmo payload que VoyagerUser.send_to_voyager envia para
+/v1/webhooks/widget, responde 202 e, depois de um atraso sorteado da
+distribuição configurada (MOCK_LATENCY), faz POST no `webhook` com a próxima
+resposta roteirizada de fixed_conversation/user_assistant_messages.txt (a
+última traz o link https://pay.smarttalks.ai).
+
+Tudo roda em um único event loop asyncio, então milhares de sessões
+simultâneas custam apenas uma task por webhook pendente.
+
+Perfis de falha (MOCK_FAULT_PROFILES) injetam, com probabilidade por turno,
+webhooks perdidos, duplicados, fora de ordem, em formato alternativo ou
+vazios, 5xx no POST e latência de cauda pesada.
+
+Uso:
+    python mock_voyager.py
+    python mock_voyager.py --port 8081 --latency '{"type": "constant", "ms": 500}'
+    python mock_voyager.py --fault-profile flaky
+
+Depois aponte o harness para ele em config.py:
+    VOYAGER_API_URL = "http://127.0.0.1:8081"
+    CALLBACK_TRANSPORT = "direct"
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, web
+
+from config import (
+    VOYAGER_ENDPOINT, LOG_FORMAT,
+    MOCK_VOYAGER_HOST, MOCK_VOYAGER_PORT, MOCK_LATENCY, MOCK_SCRIPT_FILE, MOCK_SESSION_TTL,
+    MOCK_FAULT_PROFILES, MOCK_FAULT_PROFILE
+)
+
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+logger = logging.getLogger("mock_voyager")
+
+REQUIRED_FIELDS = ("text", "channelId", "clientIdentifier", "webhook")
+
+
+class LatencySampler:
+    """
+    Sorteia o atraso (em segundos) até o webhook
+
+    Tipos suportados em `spec`:
+        {"type": "constant", "ms": 2000}
+        {"type": "lognormal", "median_ms": 2500, "sigma": 0.6}
+        {"type": "histogram", "file": "latencias.json"}
+    O arquivo do histograma é uma lista de amostras em ms ou
+    {"buckets": [[ms, peso], ...]}.
+    """
+
+    def __init__(self, spec, seed=None):
+        self.spec = spec
+        self.kind = spec.get("type", "constant")
+        self.rng = random.Random(seed)
+
+        if self.kind == "constant":
+            self.ms = float(spec.get("ms", 0))
+        elif self.kind == "lognormal":
+            self.mu = math.log(float(spec["median_ms"]))
+            self.sigma = float(spec.get("sigma", 0.5))
+        elif self.kind == "histogram":
+            with open(spec["file"], 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.values = [float(ms) for ms, _ in data["buckets"]]
+                self.weights = [float(weight) for _, weight in data["buckets"]]
+            else:
+                self.values = [float(ms) for ms in data]
+                self.weights = None
+            if not self.values:
+                raise ValueError(f"Empty latency histogram: {spec['file']}")
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+
+    def sample(self):
+        if self.kind == "constant":
+            ms = self.ms
+        elif self.kind == "lognormal":
+            ms = self.rng.lognormvariate(self.mu, self.sigma)
+        elif self.weights:
+            ms = self.rng.choices(self.values, weights=self.weights)[0]
+        else:
+            ms = self.rng.choice(self.values)
+        return max(0.0, ms) / 1000
+
+
+class FaultInjector:
+    """
+    Sorteia as falhas de cada turno a partir de um perfil
+
+    Chaves do perfil (probabilidades por turno, 0 a 1):
+        http_5xx   - POST responde 503 e o turno não avança
+        drop       - 202, mas o webhook nunca é enviado
+        duplicate  - o mesmo webhook é enviado duas vezes
+        reorder    - a resposta vai em vários webhooks, fora de ordem
+        alt_field  - webhook sem `messages`, com o texto em `text`
+        empty      - webhook com `messages` vazio
+        slow_tail  - atraso multiplicado por uma Pareto(slow_tail_alpha)
+    """
+
+    KINDS = ("http_5xx", "drop", "duplicate", "reorder", "alt_field", "empty", "slow_tail")
+
+    def __init__(self, profile, seed=None):
+        unknown = set(profile) - set(self.KINDS) - {"slow_tail_alpha"}
+        if unknown:
+            raise ValueError(f"Unknown fault kinds: {', '.join(sorted(unknown))}")
+        self.profile = profile
+        self.slow_tail_alpha = float(profile.get("slow_tail_alpha", 1.2))
+        self.rng = random.Random(seed)
+        self.counts = {kind: 0 for kind in self.KINDS}
+
+    def roll(self, kind):
+        probability = self.profile.get(kind, 0)
+        if probability and self.rng.random() < probability:
+            self.counts[kind] += 1
+            return True
+        return False
+
+    def tail_factor(self):
+        return self.rng.paretovariate(self.slow_tail_alpha)
+
+
+class MockVoyager:
+    """Estado do mock: roteiro, sessões e contadores"""
+
+    def __init__(self, script, sampler, faults=None, session_ttl=MOCK_SESSION_TTL):
+        self.replies = [turn["assistant"] for turn in script]
+        self.sampler = sampler
+        self.faults = faults or FaultInjector({})
+        self.session_ttl = session_ttl
+        self.sessions = {}  # clientIdentifier -> [próximo turno, último acesso]
+        self.http = None
+        self.stats = {
+            'accepted': 0,
+            'rejected': 0,
+            'delivered': 0,
+            'delivery_errors': 0,
+            'in_flight': 0,
+            'completed_conversations': 0
+        }
+
+    def next_reply(self, client_identifier):
+        """Devolve a próxima resposta do roteiro para a conversa"""
+        session = self.sessions.get(client_identifier)
+        if session is None:
+            session = self.sessions[client_identifier] = [0, 0.0]
+        turn = session[0]
+        session[0] += 1
+        session[1] = time.monotonic()
+
+        reply = self.replies[min(turn, len(self.replies) - 1)]
+        if turn >= len(self.replies) - 1:
+            # Link de pagamento enviado: a conversa termina aqui
+            del self.sessions[client_identifier]
+            self.stats['completed_conversations'] += 1
+        return reply
+
+    def build_webhook_payload(self, reply):
+        return {"messages": [{"role": "assistant", "type": "text", "text": reply}]}
+
+    def plan_deliveries(self, reply):
+        """
+        Decide os webhooks do turno conforme o perfil de falhas
+
+        Returns:
+            list: pares (atraso em segundos, payload); vazia se o webhook foi perdido
+        """
+        delay = self.sampler.sample()
+        if self.faults.roll("slow_tail"):
+            delay *= self.faults.tail_factor()
+        if self.faults.roll("drop"):
+            return []
+
+        if self.faults.roll("empty"):
+            deliveries = [(delay, {"messages": []})]
+        elif self.faults.roll("alt_field"):
+            deliveries = [(delay, {"text": reply})]
+        elif self.faults.roll("reorder"):
+            # Cada parágrafo vira um webhook; o último sai primeiro
+            parts = [part for part in reply.split("\n\n") if part.strip()] or [reply]
+            if len(parts) == 1:
+                parts = [reply[:len(reply) // 2], reply[len(reply) // 2:]]
+            deliveries = [(delay + 0.05 * i, self.build_webhook_payload(part))
+                          for i, part in enumerate(reversed(parts))]
+        else:
+            deliveries = [(delay, self.build_webhook_payload(reply))]
+
+        if self.faults.roll("duplicate"):
+            last_delay, last_payload = deliveries[-1]
+            deliveries.append((last_delay + 0.05, last_payload))
+        return deliveries
+
+    async def deliver(self, webhook_url, payload, delay):
+        """Aguarda o atraso sorteado e faz POST no webhook do harness"""
+        self.stats['in_flight'] += 1
+        try:
+            await asyncio.sleep(delay)
+            async with self.http.post(webhook_url, json=payload) as response:
+                await response.read()
+                if response.status < 300:
+                    self.stats['delivered'] += 1
+                else:
+                    self.stats['delivery_errors'] += 1
+                    logger.warning(f"⚠️  Webhook {webhook_url} respondeu {response.status}")
+        except Exception as e:
+            self.stats['delivery_errors'] += 1
+            logger.warning(f"⚠️  Falha ao entregar webhook {webhook_url}: {e}")
+        finally:
+            self.stats['in_flight'] -= 1
+
+    async def handle_message(self, request):
+        try:
+            body = await request.json()
+        except Exception:
+            self.stats['rejected'] += 1
+            return web.json_response({"error": "invalid json"}, status=400)
+
+        missing = [field for field in REQUIRED_FIELDS if not body.get(field)]
+        if missing:
+            self.stats['rejected'] += 1
+            return web.json_response({"error": f"missing fields: {', '.join(missing)}"}, status=400)
+
+        if self.faults.roll("http_5xx"):
+            return web.json_response({"error": "injected fault"}, status=503)
+
+        self.stats['accepted'] += 1
+        reply = self.next_reply(body["clientIdentifier"])
+        for delay, payload in self.plan_deliveries(reply):
+            asyncio.create_task(self.deliver(body["webhook"], payload, delay))
+        return web.json_response({"status": "accepted"}, status=202)
+
+    async def handle_health(self, request):
+        return web.json_response({"status": "ok", "sessions": len(self.sessions)})
+
+    async def handle_stats(self, request):
+        return web.json_response(dict(self.stats, sessions=len(self.sessions), faults=self.faults.counts))
+
+    async def expire_sessions(self):
+        """Descarta conversas abandonadas (sem mensagens há MOCK_SESSION_TTL segundos)"""
+        while True:
+            await asyncio.sleep(max(1.0, self.session_ttl / 10))
+            cutoff = time.monotonic() - self.session_ttl
+            for client_identifier, (_, last_seen) in list(self.sessions.items()):
+                if last_seen < cutoff:
+                    del self.sessions[client_identifier]
+
+    async def on_startup(self, app):
+        self.http = ClientSession(
+            connector=TCPConnector(limit=0, ttl_dns_cache=300),
+            timeout=ClientTimeout(total=30)
+        )
+        app['expire_task'] = asyncio.create_task(self.expire_sessions())
+
+    async def on_cleanup(self, app):
+        app['expire_task'].cancel()
+        await self.http.close()
+        logger.info(f"📊 Mock Voyager stats: {self.stats} - faults: {self.faults.counts}")
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post(VOYAGER_ENDPOINT, self.handle_message)
+        app.router.add_get('/health', self.handle_health)
+        app.router.add_get('/stats', self.handle_stats)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=MOCK_VOYAGER_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_VOYAGER_PORT)
+    parser.add_argument("--latency", type=json.loads, default=MOCK_LATENCY,
+                        help="distribuição do atraso em JSON (sobrescreve MOCK_LATENCY)")
+    parser.add_argument("--script", default=MOCK_SCRIPT_FILE)
+    parser.add_argument("--fault-profile", default=MOCK_FAULT_PROFILE, choices=sorted(MOCK_FAULT_PROFILES))
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.script, 'r', encoding='utf-8') as f:
+        script = json.load(f)
+
+    faults = FaultInjector(MOCK_FAULT_PROFILES[args.fault_profile], seed=args.seed)
+    mock = MockVoyager(script, LatencySampler(args.latency, seed=args.seed), faults)
+    logger.info(f"🤖 Mock Voyager em http://{args.host}:{args.port}{VOYAGER_ENDPOINT} - "
+                f"latência: {args.latency} - falhas: {args.fault_profile}")
+    web.run_app(mock.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
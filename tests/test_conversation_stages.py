@@ -0,0 +1,25 @@
+from utils.conversation_stages import ConversationStages, StageClassifier
+
+
+def test_mixed_case_payment_link():
+    stages = ConversationStages(StageClassifier())
+    stage = stages.observe(["Pague aqui: HTTPS://Pay.SmartTalks.ai/Checkout/123"], 1500)
+    assert stage == 'payment_link'
+    assert stages.payment_link == "HTTPS://Pay.SmartTalks.ai/Checkout/123"
+    assert stages.result(completed=True)['drop_off_stage'] is None
+
+
+def test_multi_stage_turn_times_every_stage():
+    stages = ConversationStages(StageClassifier())
+    stage = stages.observe([
+        "Olá! Sou a atendente virtual. Você autoriza o envio de mensagens?",
+        "Temos o passaporte por R$ 120,00",
+    ], 2000)
+    assert stage == 'product_list'
+    assert stages.time_to_stage == {'greeting': 2000, 'opt_in': 2000, 'product_list': 2000}
+
+    # Estágios já vistos mantêm o primeiro tempo
+    stages.observe(["Qual o seu nome completo e CPF?"], 5000)
+    assert stages.time_to_stage['greeting'] == 2000
+    assert stages.time_to_stage['data_collection'] == 5000
+    assert stages.result(completed=False)['drop_off_stage'] == 'data_collection'
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from utils.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_late_results_do_not_change_open_breaker(clock):
+    breaker = CircuitBreaker("Voyager", failure_threshold=2, recovery_timeout=30)
+    open_breaker(breaker)
+
+    # Webhook de uma mensagem enviada antes da abertura
+    breaker.record_success()
+    assert breaker.state == OPEN
+
+    clock[0] += 30
+    probe = breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == HALF_OPEN
+
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED
+
+
+def test_probe_reporting_after_recovery_timeout(clock):
+    breaker = CircuitBreaker("Voyager", failure_threshold=2, recovery_timeout=30, probe_timeout=150)
+    open_breaker(breaker)
+
+    clock[0] += 30
+    probe = breaker.before_call()
+
+    # Ainda dentro do probe_timeout: nenhum teste novo
+    clock[0] += 60
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED
+    assert breaker.stats['abandoned_probes'] == 0
+
+
+def test_abandoned_probe_result_is_ignored(clock):
+    breaker = CircuitBreaker("Voyager", failure_threshold=2, recovery_timeout=30, probe_timeout=150)
+    open_breaker(breaker)
+
+    clock[0] += 30
+    old_probe = breaker.before_call()
+    clock[0] += 150
+    new_probe = breaker.before_call()
+    assert breaker.stats['abandoned_probes'] == 1
+
+    # O teste perdido responde depois: vale só o resultado do teste atual
+    breaker.record_success(old_probe)
+    assert breaker.state == HALF_OPEN
+    breaker.record_failure(new_probe)
+    assert breaker.state == OPEN
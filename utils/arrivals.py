@@ -0,0 +1,156 @@
+"""
+Modelo aberto: conversas iniciadas em um ritmo de chegada (conversas/s)
+
+No modelo fechado cada usuário do Locust faz uma conversa e fica parado: a
+vazão é decidida pela taxa de spawn. No modelo aberto (LOAD_MODEL = "open")
+as conversas começam nos horários de um cronograma de chegadas e os usuários
+do Locust (-u) são só o limite de conversas simultâneas: cada usuário livre
+pega a próxima chegada, espera o horário dela e volta como um novo cliente.
+
+Perfis (ARRIVAL_PROFILE, mesmo formato de dicionário do MOCK_LATENCY):
+
+    {"type": "constant", "rate": 0.5}                                  0.5 conversa/s
+    {"type": "ramp", "start_rate": 0.1, "end_rate": 2.0, "duration": 600}
+    {"type": "poisson", "rate": 0.5}                                   intervalos exponenciais
+
+"constant" e "ramp" também aceitam "poisson": true.
+
+Se todos os usuários estiverem ocupados, a chegada espera um usuário livre (o
+atraso aparece como "Conversation Start Delay"); passando de `max_delay` ela é
+descartada ("Missed Arrival"), como um cliente que desistiu. summary() compara
+a vazão alcançada com a planejada.
+"""
+import random
+import time
+from contextlib import contextmanager
+
+from utils.turn_histograms import LatencyHistogram
+
+ARRIVAL_TYPES = ("constant", "ramp", "poisson")
+
+
+class ArrivalSchedule:
+    """
+    Ritmo planejado de chegadas
+
+    Args:
+        profile: Dicionário do perfil (ver docstring do módulo)
+        seed: Semente dos intervalos aleatórios (Poisson)
+    """
+
+    def __init__(self, profile, seed=None):
+        self.type = profile.get("type", "constant")
+        if self.type not in ARRIVAL_TYPES:
+            raise ValueError(f"Unknown arrival profile type: {self.type}")
+        if self.type == "ramp":
+            self.start_rate = float(profile["start_rate"])
+            self.end_rate = float(profile["end_rate"])
+            self.duration = float(profile["duration"])
+        else:
+            self.start_rate = self.end_rate = float(profile["rate"])
+            self.duration = 0.0
+        if self.start_rate <= 0 or self.end_rate <= 0:
+            raise ValueError("Arrival rates must be positive")
+        self.poisson = self.type == "poisson" or bool(profile.get("poisson", False))
+        self._rng = random.Random(seed)
+
+    def rate_at(self, elapsed):
+        """Conversas/s planejadas `elapsed` segundos após o início"""
+        if self.duration <= 0 or elapsed >= self.duration:
+            return self.end_rate
+        return self.start_rate + (self.end_rate - self.start_rate) * elapsed / self.duration
+
+    def next_gap(self, elapsed):
+        """Segundos até a próxima chegada, a partir de uma chegada em `elapsed`"""
+        rate = self.rate_at(elapsed)
+        return self._rng.expovariate(rate) if self.poisson else 1 / rate
+
+    def expected(self, elapsed):
+        """Chegadas planejadas nos primeiros `elapsed` segundos (integral do ritmo)"""
+        ramp = min(elapsed, self.duration)
+        total = self.start_rate * ramp
+        if self.duration > 0:
+            total += (self.end_rate - self.start_rate) * ramp * ramp / (2 * self.duration)
+        return total + self.end_rate * max(0.0, elapsed - self.duration)
+
+
+class ArrivalDriver:
+    """
+    Distribui as chegadas do cronograma entre os usuários livres
+
+    Args:
+        schedule: ArrivalSchedule
+        max_delay: Atraso máximo (s) de uma chegada esperando um usuário livre;
+            acima disso ela é descartada (None = nunca descarta)
+        on_start: Callback (atraso em s) quando uma conversa começa
+        on_missed: Callback (atraso em s) para cada chegada descartada
+    """
+
+    def __init__(self, schedule, max_delay=None, on_start=None, on_missed=None):
+        self.schedule = schedule
+        self.max_delay = max_delay
+        self.on_start = on_start
+        self.on_missed = on_missed
+        self.started_at = None
+        self._next = None
+        self.in_flight_count = 0
+        self.start_delay = LatencyHistogram()
+        self.stats = {'started': 0, 'missed': 0, 'peak_concurrency': 0}
+
+    def _claim(self):
+        """Reserva a próxima chegada do cronograma (sem ceder o hub: uma chegada, um usuário)"""
+        if self.started_at is None:
+            self.started_at = self._next = time.time()
+        due = self._next
+        self._next = due + self.schedule.next_gap(due - self.started_at)
+        return due
+
+    def wait(self):
+        """
+        Espera a próxima chegada livre para este usuário
+
+        Returns:
+            float: Atraso (s) do início da conversa em relação ao horário planejado
+        """
+        while True:
+            due = self._claim()
+            delay = time.time() - due
+            if self.max_delay is None or delay <= self.max_delay:
+                break
+            self.stats['missed'] += 1
+            if self.on_missed:
+                self.on_missed(delay)
+
+        if delay < 0:
+            time.sleep(-delay)
+            delay = 0.0
+        self.stats['started'] += 1
+        self.start_delay.record(delay * 1000)
+        if self.on_start:
+            self.on_start(delay)
+        return delay
+
+    @contextmanager
+    def in_flight(self):
+        """Conta a conversa como em andamento (concorrência atual e pico)"""
+        self.in_flight_count += 1
+        self.stats['peak_concurrency'] = max(self.stats['peak_concurrency'], self.in_flight_count)
+        try:
+            yield
+        finally:
+            self.in_flight_count -= 1
+
+    def summary(self):
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        target = self.schedule.expected(elapsed)
+        return dict(
+            self.stats,
+            profile=self.schedule.type,
+            poisson=self.schedule.poisson,
+            elapsed_s=round(elapsed, 1),
+            target_arrivals=round(target, 1),
+            target_rate=round(target / elapsed, 4) if elapsed else 0.0,
+            achieved_rate=round(self.stats['started'] / elapsed, 4) if elapsed else 0.0,
+            in_flight=self.in_flight_count,
+            start_delay_ms=self.start_delay.summary()
+        )
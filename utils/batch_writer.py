@@ -0,0 +1,107 @@
+"""
+Gravação em lotes fora do hub do gevent
+
+Base do log de conversas (utils/conversation_log.py) e do arquivo de
+resultados (utils/results_sink.py): quem grava só coloca o item em uma fila;
+um greenlet escritor junta os itens em lotes e entrega cada lote a uma thread
+do threadpool do gevent, que grava fora do hub. Assim a escrita em disco não
+trava os outros usuários nem cai dentro dos tempos medidos.
+
+Ciclo de vida único: start() inicia o escritor (no on_locust_init) e close()
+grava o que ainda está na fila, chama `close_files` no threadpool e encerra.
+Itens colocados depois do close() não são gravados (contados em `dropped`).
+"""
+import time
+
+import gevent
+from gevent.queue import Queue, Empty
+
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    Fila + greenlet escritor que grava em lotes no threadpool do gevent
+
+    Args:
+        write_batch: Função chamada com a lista de itens do lote (roda em uma
+            thread do threadpool, fora do hub)
+        close_files: Função chamada no threadpool depois do último lote
+        queue_size: Itens aguardando gravação antes de put() esperar (None = sem limite)
+        batch_size: Máximo de itens gravados por lote
+        on_written: Callback chamado (no hub) com (instante do put, item) de cada
+            item gravado
+    """
+
+    def __init__(self, write_batch, close_files=None, queue_size=None, batch_size=50, on_written=None):
+        self.write_batch = write_batch
+        self.close_files = close_files
+        self.batch_size = max(1, batch_size)
+        self.on_written = on_written
+        self._queue = Queue(maxsize=queue_size)
+        self._greenlet = None
+        self._closed = False
+        self.last_error = None
+        self.stats = {'written': 0, 'batches': 0, 'errors': 0, 'dropped': 0}
+
+    def start(self):
+        """Inicia o greenlet escritor"""
+        if self._greenlet is None and not self._closed:
+            self._greenlet = gevent.spawn(self._run)
+        return self
+
+    def put(self, item):
+        """Coloca o item na fila de gravação (espera uma vaga se a fila estiver cheia)"""
+        if self._closed:
+            self.stats['dropped'] += 1
+            return
+        self._queue.put((time.time(), item))
+
+    def full(self):
+        return self._queue.full()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        hub = gevent.get_hub()
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            batch = []
+            while entry is not _STOP:
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    entry = self._queue.get_nowait()
+                except Empty:
+                    break
+            stopping = entry is _STOP
+            if not batch:
+                continue
+            try:
+                hub.threadpool.apply(self.write_batch, ([item for _, item in batch],))
+            except Exception as e:
+                self.stats['errors'] += len(batch)
+                self.last_error = str(e)
+                continue
+            self.stats['written'] += len(batch)
+            self.stats['batches'] += 1
+            if self.on_written:
+                for enqueued_at, item in batch:
+                    self.on_written(enqueued_at, item)
+        if self.close_files:
+            hub.threadpool.apply(self.close_files)
+
+    def close(self, timeout=30):
+        """Grava o que ainda está na fila e fecha os arquivos"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._greenlet is None:
+            # Nunca iniciado: nada foi gravado, mas a fila ainda é escrita
+            self._greenlet = gevent.spawn(self._run)
+        self._queue.put(_STOP)
+        self._greenlet.join(timeout)
+        self._greenlet = None
@@ -0,0 +1,181 @@
+"""
+Logs de conversa gravados em segundo plano, em segmentos com índice
+
+Gravar um conversation_*.json por conversa (json.dump com indent e escrita
+síncrona) roda no greenlet do usuário: sob o gevent isso trava o hub e o
+tempo travado cai dentro dos tempos da próxima conversa. Aqui o usuário só
+coloca o log em uma fila limitada (utils/batch_writer.py); os logs são
+serializados e gravados em lotes, fora do hub.
+
+Os logs vão para arquivos de segmento JSONL (uma conversa por linha):
+
+    logs/conversations_<execução>_0001.jsonl, _0002.jsonl, ...
+    logs/conversations_<execução>.idx   session_id, segmento, offset, tamanho
+
+Um segmento novo começa quando o atual passa de `segment_max_bytes`. O índice
+permite ler uma conversa pelo session_id sem percorrer os segmentos:
+
+    from utils.conversation_log import find_conversation
+    find_conversation("logs/conversations_17_10_26_02_16_05.idx", session_id)
+
+Se a fila encher, quem chega espera (cooperativamente) uma vaga: o tempo de
+espera é devolvido por submit() e a defasagem do escritor e a profundidade da
+fila aparecem em summary().
+"""
+import json
+import os
+import time
+
+from utils.batch_writer import BatchWriter
+
+
+class ConversationLogWriter:
+    """
+    Escritor em segundo plano dos logs de conversa
+
+    Args:
+        directory: Pasta dos segmentos (ex.: "logs")
+        name: Nome da execução; prefixo dos segmentos e do índice
+        segment_max_bytes: Tamanho a partir do qual um segmento novo é aberto
+        queue_size: Logs aguardando gravação antes de submit() esperar
+        batch_size: Máximo de logs gravados por lote
+        on_written: Callback chamado (no hub) com a defasagem em segundos de cada
+            log gravado, do submit() até o fim da gravação
+    """
+
+    def __init__(self, directory, name, segment_max_bytes=64 * 1024 * 1024, queue_size=1000, batch_size=50,
+                 on_written=None):
+        self.directory = directory
+        self.name = name
+        self.segment_max_bytes = segment_max_bytes
+        self.on_written = on_written
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        self._writer = BatchWriter(self._write_batch, close_files=self._close_files, queue_size=queue_size,
+                                   batch_size=batch_size, on_written=self._written)
+        # Estado dos arquivos: só a thread que grava o lote mexe nele
+        self._segment = None
+        self._segment_number = 0
+        self._segment_bytes = 0
+        self._index = None
+        self.stats = {
+            'bytes': 0,
+            'segments': 0,
+            'peak_queue_depth': 0,
+            'queue_full_waits': 0,
+            'max_enqueue_wait_ms': 0.0,
+            'total_lag_ms': 0.0,
+            'max_lag_ms': 0.0
+        }
+
+    def start(self):
+        """Inicia o greenlet escritor"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._writer.start()
+        return self
+
+    def submit(self, log_data):
+        """
+        Coloca o log na fila de gravação
+
+        Returns:
+            float: Segundos esperando vaga na fila (0 se havia vaga)
+        """
+        if self._writer.full():
+            self.stats['queue_full_waits'] += 1
+        start = time.time()
+        self._writer.put(log_data)
+        waited = time.time() - start
+        self.stats['peak_queue_depth'] = max(self.stats['peak_queue_depth'], self._writer.qsize())
+        self.stats['max_enqueue_wait_ms'] = max(self.stats['max_enqueue_wait_ms'], round(waited * 1000, 1))
+        return waited
+
+    def queue_depth(self):
+        return self._writer.qsize()
+
+    def _written(self, enqueued_at, log_data):
+        """Defasagem de um log gravado (no hub)"""
+        lag_ms = (time.time() - enqueued_at) * 1000
+        self.stats['total_lag_ms'] += lag_ms
+        self.stats['max_lag_ms'] = max(self.stats['max_lag_ms'], round(lag_ms, 1))
+        if self.on_written:
+            self.on_written(lag_ms / 1000)
+
+    def _roll_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_number += 1
+        path = os.path.join(self.directory, f"{self.name}_{self._segment_number:04d}.jsonl")
+        self._segment = open(path, 'wb')
+        self._segment_bytes = 0
+        self.stats['segments'] += 1
+        if self._index is None:
+            self._index = open(self.index_path, 'w', encoding='utf-8')
+
+    def _write_batch(self, batch):
+        """Serializa e grava um lote (roda em uma thread do threadpool, fora do hub)"""
+        index_lines = []
+        for log_data in batch:
+            line = (json.dumps(log_data, ensure_ascii=False) + '\n').encode('utf-8')
+            if self._segment is None or (self._segment_bytes and self._segment_bytes + len(line) > self.segment_max_bytes):
+                if index_lines:
+                    self._index.write(''.join(index_lines))
+                    index_lines = []
+                self._roll_segment()
+            session_id = log_data.get('summary', {}).get('session_id', '')
+            index_lines.append(f"{session_id}\t{os.path.basename(self._segment.name)}\t{self._segment_bytes}\t{len(line)}\n")
+            self._segment.write(line)
+            self._segment_bytes += len(line)
+            self.stats['bytes'] += len(line)
+        self._segment.flush()
+        self._index.write(''.join(index_lines))
+        self._index.flush()
+
+    def _close_files(self):
+        for f in (self._segment, self._index):
+            if f is not None:
+                f.close()
+        self._segment = self._index = None
+
+    def close(self, timeout=30):
+        """Grava o que ainda está na fila e fecha os arquivos"""
+        self._writer.close(timeout)
+
+    def summary(self):
+        written = self._writer.stats['written']
+        summary = dict(self._writer.stats)
+        summary.update((key, value) for key, value in self.stats.items() if key != 'total_lag_ms')
+        summary['avg_lag_ms'] = round(self.stats['total_lag_ms'] / written, 1) if written else 0.0
+        summary['queue_depth'] = self._writer.qsize()
+        summary['index'] = self.index_path
+        summary['last_error'] = self._writer.last_error
+        return summary
+
+
+def read_index(index_path):
+    """{session_id: (caminho do segmento, offset, tamanho)} de um arquivo .idx"""
+    directory = os.path.dirname(index_path)
+    entries = {}
+    with open(index_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            session_id, segment, offset, length = line.rstrip('\n').split('\t')
+            entries[session_id] = (os.path.join(directory, segment), int(offset), int(length))
+    return entries
+
+
+def find_conversation(index_path, session_id):
+    """Lê do segmento o log de uma conversa pelo session_id (None se não estiver no índice)"""
+    entry = read_index(index_path).get(session_id)
+    if entry is None:
+        return None
+    segment, offset, length = entry
+    with open(segment, 'rb') as f:
+        f.seek(offset)
+        return json.loads(f.read(length).decode('utf-8'))
+
+
+def iter_segment(path):
+    """Logs de conversa de um segmento, um por vez (ignora uma última linha incompleta)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.endswith('\n') and line.strip():
+                yield json.loads(line)
@@ -0,0 +1,181 @@
+"""
+Estágios da conversa de compra e funil do teste
+
+Cada resposta da Voyager é classificada em um estágio do fluxo de compra, com
+expressões regulares compiladas uma única vez no início do teste:
+
+    greeting           saudação / pede o nome
+    opt_in             autorização para enviar mensagens
+    product_list       opções de ingresso com preços
+    date_availability  datas disponíveis / escolha da data
+    data_collection    nome completo, celular, e-mail, CPF
+    payment_link       link https://pay.smarttalks.ai
+
+Uma mensagem que casa com mais de um estágio fica com o mais avançado. Cada
+conversa guarda o tempo (desde o início da conversa) até chegar a cada
+estágio (todos os que casaram no turno, não só o mais avançado), o estágio mais avançado e, se não chegou ao link, o estágio em que
+parou (drop_off_stage; "start" se nenhuma resposta foi reconhecida).
+
+StageFunnel soma as conversas no funil do resumo final: quantas chegaram a
+cada estágio, quantas pararam em cada um e os percentis do tempo até o estágio
+e da latência do webhook dos turnos de cada estágio (LatencyHistogram, memória
+fixa).
+"""
+import re
+
+from utils.turn_histograms import LatencyHistogram
+
+# Link de pagamento: encerra a conversa com sucesso (found_link)
+PAYMENT_LINK = re.compile(r'https://pay\.smarttalks\.ai\S*', re.IGNORECASE)
+
+# (estágio, padrões), na ordem do fluxo
+STAGE_PATTERNS = (
+    ('greeting', (r'atendente virtual', r'qual (?:é )?o seu nome', r'^\W*(?:olá|oi|bom dia|boa tarde|boa noite)\b')),
+    ('opt_in', (r'\bautoriz', r'envio de mensagens')),
+    ('product_list', (r'R\$\s?\d', r'op[çc](?:ões|oes) de ingresso', r'\bpassaporte\b')),
+    ('date_availability', (r'\b\d{1,2}/\d{1,2}/\d{2,4}\b', r'\bdisponibilidade\b', r'datas? dispon[íi]ve')),
+    ('data_collection', (r'nome completo', r'\bcelular\b', r'\be-?mail\b', r'\bCPF\b')),
+    ('payment_link', (PAYMENT_LINK.pattern,)),
+)
+
+# Conversas sem nenhuma resposta reconhecida param "antes" do primeiro estágio
+NO_STAGE = 'start'
+
+
+class StageClassifier:
+    """
+    Classifica mensagens da Voyager nos estágios de `stage_patterns`
+
+    Args:
+        stage_patterns: ((estágio, (regex, ...)), ...) na ordem do fluxo
+    """
+
+    def __init__(self, stage_patterns=STAGE_PATTERNS):
+        self.stages = tuple(stage for stage, _ in stage_patterns)
+        self.order = {stage: i for i, stage in enumerate(self.stages)}
+        # Do estágio mais avançado para o primeiro: vale o primeiro que casar
+        self._patterns = [
+            (stage, re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE | re.MULTILINE))
+            for stage, patterns in reversed(stage_patterns)
+        ]
+
+    def classify(self, text):
+        """Estágio mais avançado que casa com o texto (None se nenhum)"""
+        for stage, pattern in self._patterns:
+            if pattern.search(text):
+                return stage
+        return None
+
+    def matches(self, text):
+        """Todos os estágios que casam com o texto, na ordem do fluxo"""
+        return [stage for stage, pattern in reversed(self._patterns) if pattern.search(text)]
+
+
+class ConversationStages:
+    """
+    Estágios alcançados em uma conversa
+
+    Args:
+        classifier: StageClassifier compartilhado
+    """
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self.time_to_stage = {}  # {estágio: ms desde o início da conversa}
+        self.last_stage = None
+        self.payment_link = None
+
+    def observe(self, texts, elapsed_ms):
+        """
+        Classifica as mensagens de um turno da Voyager
+
+        Args:
+            texts: Mensagens do turno
+            elapsed_ms: Tempo desde o início da conversa até a resposta
+
+        Returns:
+            str: Estágio mais avançado do turno (None se nenhum)
+        """
+        order = self.classifier.order
+        turn_stage = None
+        for text in texts:
+            stages = self.classifier.matches(text)
+            if not stages:
+                continue
+            # Todos os estágios do turno entram no funil, não só o mais avançado
+            for stage in stages:
+                self.time_to_stage.setdefault(stage, round(elapsed_ms))
+            if 'payment_link' in stages and self.payment_link is None:
+                match = PAYMENT_LINK.search(text)
+                if match is not None:
+                    self.payment_link = match.group()
+            stage = stages[-1]
+            if turn_stage is None or order[stage] > order[turn_stage]:
+                turn_stage = stage
+
+        if turn_stage is not None:
+            if self.last_stage is None or order[turn_stage] > order[self.last_stage]:
+                self.last_stage = turn_stage
+        return turn_stage
+
+    def result(self, completed):
+        """Campos da conversa: time_to_stage_ms, last_stage e drop_off_stage (None se `completed`)"""
+        return {
+            'time_to_stage_ms': dict(self.time_to_stage),
+            'last_stage': self.last_stage,
+            'drop_off_stage': None if completed else (self.last_stage or NO_STAGE)
+        }
+
+
+class StageFunnel:
+    """
+    Funil de estágios somado durante o teste
+
+    Args:
+        stages: Estágios na ordem do fluxo (StageClassifier.stages)
+        max_ms: Maior tempo rastreado pelos histogramas
+    """
+
+    def __init__(self, stages, max_ms=600_000):
+        self.stages = tuple(stages)
+        self._order = {stage: i for i, stage in enumerate(self.stages)}
+        self.conversations = 0
+        self.reached = dict.fromkeys(self.stages, 0)
+        self.dropped_off = dict.fromkeys((NO_STAGE,) + self.stages, 0)
+        self._time_to_stage = {stage: LatencyHistogram(max_ms) for stage in self.stages}
+        self._turn_webhook = {stage: LatencyHistogram(max_ms) for stage in self.stages}
+
+    def record(self, conversation):
+        """Soma uma conversa (com os campos de ConversationStages.result e os turnos)"""
+        self.conversations += 1
+        last_stage = conversation.get('last_stage')
+        if last_stage is not None:
+            # Chegar a um estágio conta também os anteriores (mesmo sem mensagem própria)
+            for stage in self.stages[:self._order[last_stage] + 1]:
+                self.reached[stage] += 1
+        drop_off_stage = conversation.get('drop_off_stage')
+        if drop_off_stage is not None:
+            self.dropped_off[drop_off_stage] += 1
+        for stage, ms in conversation.get('time_to_stage_ms', {}).items():
+            self._time_to_stage[stage].record(ms)
+        for turn in conversation.get('turns', []):
+            if turn.get('stage') and 'webhook_ms' in turn:
+                self._turn_webhook[turn['stage']].record(turn['webhook_ms'])
+
+    def summary(self):
+        """{conversations, dropped_before_first_stage, stages: {estágio: {reached, reached_pct, dropped_off, ...}}}"""
+        stages = {}
+        for stage in self.stages:
+            reached = self.reached[stage]
+            stages[stage] = {
+                'reached': reached,
+                'reached_pct': f"{(reached / self.conversations * 100):.2f}%" if self.conversations else "0%",
+                'dropped_off': self.dropped_off[stage],
+                'time_to_stage_ms': self._time_to_stage[stage].summary(),
+                'turn_webhook_ms': self._turn_webhook[stage].summary()
+            }
+        return {
+            'conversations': self.conversations,
+            'dropped_before_first_stage': self.dropped_off[NO_STAGE],
+            'stages': stages
+        }
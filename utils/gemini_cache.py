@@ -0,0 +1,192 @@
+"""
+Cache de respostas do Gemini para os turnos da persona
+
+A maior parte dos turnos é praticamente igual entre usuários (saudação, opt-in,
+"qual parque?"), então a resposta da persona pode ser reaproveitada. A chave é
+(arquivo da persona, mensagem da Voyager normalizada, turno ou hash do
+histórico); a resposta é guardada sem os dados do usuário (telefone, e-mail,
+CPF viram placeholders) e preenchida com os dados de quem a recebe.
+
+O cache é um LRU limitado por tamanho e por TTL (segundos de relógio, para
+valer entre execuções) e pode ser salvo em disco ao final do teste.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# Campos de user_data trocados por placeholders nas respostas guardadas.
+# cpf_formatted vem antes de cpf_numbers para não quebrar o CPF formatado.
+PERSONAL_FIELDS = ('telefone', 'email', 'cpf_formatted', 'cpf_numbers')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def depersonalize(text, user_data):
+    """Troca os dados do usuário no texto por placeholders {campo}"""
+    for field in PERSONAL_FIELDS:
+        value = user_data.get(field)
+        if value:
+            text = text.replace(value, '{' + field + '}')
+    return text
+
+
+def personalize(text, user_data):
+    """Preenche os placeholders {campo} com os dados do usuário"""
+    for field in PERSONAL_FIELDS:
+        value = user_data.get(field)
+        if value:
+            text = text.replace('{' + field + '}', value)
+    return text
+
+
+def normalize_message(text, user_data):
+    """Mensagem da Voyager sem dados do usuário, em minúsculas e com espaços colapsados"""
+    return _WHITESPACE.sub(' ', depersonalize(text, user_data)).strip().lower()
+
+
+def history_digest(messages):
+    """Hash curto de uma lista de mensagens já normalizadas"""
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(message.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+class GeminiResponseCache:
+    """
+    LRU das respostas da persona, com TTL e persistência opcional
+
+    `key_mode` define o terceiro elemento da chave:
+        "turn"    - número do turno (mais acertos)
+        "history" - hash de todas as mensagens da Voyager até aqui (mais fiel)
+    `hit_rate` é a fração dos acertos que de fato é servida do cache; o
+    restante vai ao Gemini e atualiza a entrada. Útil para manter parte do
+    tráfego real no Gemini.
+    """
+
+    def __init__(self, max_entries=5000, ttl=86400, key_mode="turn", hit_rate=1.0, path=None):
+        if key_mode not in ("turn", "history"):
+            raise ValueError(f"Unknown cache key mode: {key_mode}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key_mode = key_mode
+        self.hit_rate = hit_rate
+        self.path = path
+        self._lock = Lock()
+        self._entries = OrderedDict()  # chave -> (resposta sem dados pessoais, criado em)
+        self._rng = random.Random()
+        self.stats = {'hits': 0, 'misses': 0, 'skipped': 0, 'stores': 0, 'expired': 0, 'evicted': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def make_key(self, persona_file, voyager_message, turn, history):
+        """
+        Monta a chave do turno
+
+        Args:
+            persona_file: Arquivo da persona do usuário
+            voyager_message: Mensagem da Voyager já normalizada
+            turn: Número do turno (iteração)
+            history: Mensagens da Voyager normalizadas dos turnos anteriores
+        """
+        context = turn if self.key_mode == "turn" else history_digest(history)
+        return f"{persona_file}|{context}|{voyager_message}"
+
+    def get(self, key):
+        """Devolve a resposta (com placeholders) ou None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            reply, created_at = entry
+            if now - created_at > self.ttl:
+                del self._entries[key]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            if self.hit_rate < 1.0 and self._rng.random() >= self.hit_rate:
+                self.stats['skipped'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return reply
+
+    def put(self, key, reply):
+        with self._lock:
+            self._entries[key] = (reply, time.time())
+            self._entries.move_to_end(key)
+            self.stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def hit_ratio(self):
+        lookups = self.stats['hits'] + self.stats['misses'] + self.stats['skipped']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def load(self):
+        """Carrega as entradas salvas em `path` que ainda estão dentro do TTL (só se gravadas com o mesmo key_mode)"""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with _open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Could not load Gemini cache {self.path}: {e}")
+            return 0
+        if data.get('version') != CACHE_VERSION:
+            logger.warning(f"⚠️  Ignoring Gemini cache {self.path}: unsupported version {data.get('version')}")
+            return 0
+        if data.get('key_mode') != self.key_mode:
+            # As chaves de outro modo nunca casariam com as deste (ou casariam errado)
+            logger.warning(f"⚠️  Ignoring Gemini cache {self.path}: saved with key mode "
+                           f"{data.get('key_mode')!r}, current key mode is {self.key_mode!r}")
+            return 0
+
+        cutoff = time.time() - self.ttl
+        loaded = 0
+        with self._lock:
+            for key, reply, created_at in data.get('entries', []):
+                if created_at >= cutoff:
+                    self._entries[key] = (reply, created_at)
+                    loaded += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return loaded
+
+    def save(self):
+        """Grava as entradas em `path` (da menos para a mais recente)"""
+        if not self.path:
+            return
+        with self._lock:
+            entries = [[key, reply, created_at] for key, (reply, created_at) in self._entries.items()]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Grava em um arquivo temporário com a mesma extensão e troca no fim
+        tmp_path = os.path.join(directory, '.tmp_' + os.path.basename(self.path))
+        with _open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'key_mode': self.key_mode, 'entries': entries},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
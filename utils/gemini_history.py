@@ -0,0 +1,160 @@
+"""
+Janela de histórico do chat da persona no Gemini
+
+O Chat do google-genai reenvia o histórico inteiro a cada turno, então os
+tokens de entrada crescem a cada iteração e o custo da conversa cresce de forma
+quadrática. WindowedPersonaChat envia só a instrução de sistema (a persona) e
+os últimos GEMINI_HISTORY_TURNS turnos; os turnos que saem da janela podem ser
+condensados em um resumo anexado à instrução de sistema:
+
+    "none"   - turnos antigos são descartados
+    "local"  - resumo montado aqui mesmo com as linhas dos turnos antigos
+               (sem chamada extra, tamanho limitado)
+    "gemini" - o Gemini reescreve o resumo a cada lote de turnos que sai da
+               janela (uma chamada extra por lote)
+
+A interface é a mesma do Chat do google-genai (send_message, record_history,
+get_history), para que o loop da conversa e o cache não mudem.
+"""
+from google import genai
+
+SUMMARY_MODES = ("none", "local", "gemini")
+
+SUMMARY_HEADER = "RESUMO DA CONVERSA ATÉ AQUI (turnos antigos, já respondidos):"
+
+SUMMARY_PROMPT = """Resuma a conversa abaixo entre a Atendente e Você (o cliente) em até {max_chars} caracteres.
+Mantenha apenas os fatos úteis para continuar: o que já foi pedido, informado, escolhido ou recusado.
+
+Resumo anterior:
+{summary}
+
+Novos turnos:
+{transcript}"""
+
+# Tamanho máximo de cada fala nas linhas do resumo local
+_LINE_CHARS = 160
+
+
+def _text(content):
+    """Texto de um Content (partes de texto concatenadas)"""
+    return "".join(part.text or "" for part in (content.parts or []))
+
+
+def _clip(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def transcript(turns):
+    """Linhas 'Atendente: ... / Você: ...' dos turnos (a Voyager é o 'user' do chat da persona)"""
+    lines = []
+    for user_input, model_output in turns:
+        lines.append(f"Atendente: {_clip(_text(user_input), _LINE_CHARS)}")
+        lines.append(f"Você: {_clip(_text(model_output), _LINE_CHARS)}")
+    return "\n".join(lines)
+
+
+class WindowedPersonaChat:
+    """
+    Chat da persona que envia só os últimos turnos do histórico
+
+    Args:
+        models: `client.models` de um genai.Client (compartilhado)
+        model: Nome do modelo (ex.: "gemini-2.5-flash")
+        config: GenerateContentConfig com a persona em system_instruction
+        max_turns: Turnos (mensagem da Voyager + resposta) mantidos na janela
+        summary: "none", "local" ou "gemini" (ver docstring do módulo)
+        summary_max_chars: Tamanho máximo do resumo
+    """
+
+    def __init__(self, models, model, config, max_turns=8, summary="local", summary_max_chars=1500):
+        if summary not in SUMMARY_MODES:
+            raise ValueError(f"Unknown history summary mode: {summary}")
+        self._models = models
+        self.model = model
+        self.config = config
+        self.max_turns = max(1, max_turns)
+        self.summary_mode = summary
+        self.summary_max_chars = summary_max_chars
+        # Com "gemini", o resumo é refeito a cada lote de turnos que sai da janela
+        self.summary_batch = max(1, self.max_turns // 2)
+        self.summary = ""
+        self.turns_evicted = 0
+        self._turns = []    # (Content do usuário, Content do modelo) dentro da janela
+        self._pending = []  # turnos fora da janela ainda não resumidos (continuam sendo enviados)
+        self._summary_turns = []  # linhas do resumo local, um item por turno
+
+    def _request_config(self):
+        if not self.summary:
+            return self.config
+        system_instruction = f"{self.config.system_instruction}\n\n{SUMMARY_HEADER}\n{self.summary}"
+        return self.config.model_copy(update={'system_instruction': system_instruction})
+
+    def _contents(self):
+        return [content for turn in self._pending + self._turns for content in turn]
+
+    def _fold_local(self, turn):
+        """Acrescenta o turno ao resumo local, descartando os turnos mais antigos se passar do limite"""
+        self._summary_turns.append(transcript([turn]))
+        while len(self._summary_turns) > 1 and sum(len(t) + 1 for t in self._summary_turns) > self.summary_max_chars:
+            self._summary_turns.pop(0)
+        self.summary = "\n".join(self._summary_turns)[-self.summary_max_chars:]
+
+    def send_message(self, message):
+        """Envia a mensagem com a janela do histórico; mesma assinatura do Chat do google-genai"""
+        user_input = genai.types.Content(role='user', parts=[genai.types.Part(text=message)])
+        response = self._models.generate_content(
+            model=self.model,
+            contents=self._contents() + [user_input],
+            config=self._request_config()
+        )
+        model_output = ([response.candidates[0].content]
+                        if response.candidates and response.candidates[0].content else [])
+        self.record_history(user_input=user_input, model_output=model_output, is_valid=bool(model_output))
+        return response
+
+    def record_history(self, user_input, model_output, is_valid=True):
+        """Guarda o turno na janela e tira dela os turnos mais antigos"""
+        if not is_valid:
+            return
+        self._turns.append((user_input, model_output[0] if model_output else genai.types.Content(role='model', parts=[])))
+        while len(self._turns) > self.max_turns:
+            turn = self._turns.pop(0)
+            self.turns_evicted += 1
+            if self.summary_mode == "local":
+                self._fold_local(turn)
+            elif self.summary_mode == "gemini":
+                self._pending.append(turn)
+
+    def needs_summary(self):
+        """True quando há um lote de turnos esperando para entrar no resumo do Gemini"""
+        return len(self._pending) >= self.summary_batch
+
+    def summarize(self):
+        """
+        Reescreve o resumo com os turnos pendentes (uma chamada ao Gemini)
+
+        Se a resposta vier vazia, os turnos continuam pendentes e são enviados
+        normalmente até a próxima tentativa.
+
+        Returns:
+            GenerateContentResponse: Resposta da chamada de resumo (para contar tokens)
+        """
+        prompt = SUMMARY_PROMPT.format(max_chars=self.summary_max_chars, summary=self.summary or "(vazio)",
+                                       transcript=transcript(self._pending))
+        response = self._models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=genai.types.GenerateContentConfig(
+                temperature=0,
+                thinking_config=genai.types.ThinkingConfig(thinking_budget=0)
+            )
+        )
+        if response.text and response.text.strip():
+            self.summary = response.text.strip()[:self.summary_max_chars]
+            self._pending = []
+        return response
+
+    def get_history(self):
+        """Conteúdos enviados no próximo turno (sem os turnos já resumidos ou descartados)"""
+        return self._contents()
@@ -0,0 +1,137 @@
+"""
+Pool compartilhado de clientes do Gemini
+
+Criar um genai.Client por usuário virtual custa um pool HTTP, dois contextos
+SSL e um handshake TLS por usuário. Aqui o processo inteiro usa poucos
+clientes (GEMINI_POOL_CLIENTS), criados sob demanda, com o total de sockets
+limitado por httpx.Limits; cada usuário cria apenas o seu chat a partir de um
+deles, o que é barato.
+
+Um semáforo limita as chamadas simultâneas ao Gemini (GEMINI_POOL_MAX_IN_FLIGHT).
+O tempo de espera por uma vaga é medido e as conexões TCP/handshakes TLS
+abertos são contados pelo trace do httpcore.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from google import genai
+
+from utils.gemini_history import WindowedPersonaChat
+
+
+class GeminiClientPool:
+    """
+    Clientes genai.Client compartilhados entre os usuários virtuais
+
+    Args:
+        api_key: Chave da API do Gemini
+        clients: Quantos genai.Client (pools HTTP independentes) criar
+        max_connections: Máximo de sockets abertos somando todos os clientes
+        max_in_flight: Máximo de chamadas simultâneas (None = sem limite)
+        on_wait: Callback chamado com os segundos de espera por uma vaga
+    """
+
+    def __init__(self, api_key, clients=1, max_connections=100, max_in_flight=None, on_wait=None):
+        self.api_key = api_key
+        self.size = max(1, clients)
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.on_wait = on_wait
+        self._clients = []
+        self._next = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.stats = {
+            'clients_created': 0,
+            'chats_created': 0,
+            'connections_opened': 0,
+            'tls_handshakes': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'acquired': 0,
+            'waited': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0
+        }
+
+    def _trace(self, event_name, info):
+        # Eventos do httpcore: só conexões novas geram connect_tcp/start_tls
+        if event_name == 'connection.connect_tcp.complete':
+            self.stats['connections_opened'] += 1
+        elif event_name == 'connection.start_tls.complete':
+            self.stats['tls_handshakes'] += 1
+
+    def _on_request(self, request):
+        request.extensions['trace'] = self._trace
+
+    def _create_client(self):
+        per_client = max(1, self.max_connections // self.size)
+        http_options = genai.types.HttpOptions(client_args={
+            'limits': httpx.Limits(max_connections=per_client, max_keepalive_connections=per_client),
+            'event_hooks': {'request': [self._on_request]}
+        })
+        self.stats['clients_created'] += 1
+        return genai.Client(api_key=self.api_key, http_options=http_options)
+
+    def client(self):
+        """Devolve o próximo cliente compartilhado (rodízio), criando-o se preciso"""
+        with self._lock:
+            if len(self._clients) < self.size:
+                client = self._create_client()
+                self._clients.append(client)
+                return client
+            client = self._clients[self._next]
+            self._next = (self._next + 1) % self.size
+            return client
+
+    def create_chat(self, **kwargs):
+        """Cria o chat de um usuário a partir de um cliente compartilhado"""
+        self.stats['chats_created'] += 1
+        return self.client().chats.create(**kwargs)
+
+    def create_windowed_chat(self, **kwargs):
+        """Cria o chat de um usuário com janela de histórico (WindowedPersonaChat)"""
+        self.stats['chats_created'] += 1
+        return WindowedPersonaChat(self.client().models, **kwargs)
+
+    @contextmanager
+    def slot(self):
+        """Reserva uma vaga para uma chamada ao Gemini, medindo a espera"""
+        wait_started = time.time()
+        if self._slots:
+            self._slots.acquire()
+        waited = time.time() - wait_started
+
+        with self._lock:
+            self.stats['acquired'] += 1
+            self.stats['in_use'] += 1
+            self.stats['peak_in_use'] = max(self.stats['peak_in_use'], self.stats['in_use'])
+            if waited > 0.001:
+                self.stats['waited'] += 1
+            self.stats['total_wait_ms'] += waited * 1000
+            self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], waited * 1000)
+        if self.on_wait:
+            self.on_wait(waited)
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stats['in_use'] -= 1
+            if self._slots:
+                self._slots.release()
+
+    def summary(self):
+        stats = dict(self.stats)
+        stats['avg_wait_ms'] = round(stats['total_wait_ms'] / stats['acquired'], 2) if stats['acquired'] else 0.0
+        stats['total_wait_ms'] = round(stats['total_wait_ms'], 2)
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 2)
+        return stats
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
@@ -0,0 +1,159 @@
+"""
+Agendador de chamadas ao Gemini por RPM/TPM
+
+Todos os usuários do processo passam por aqui antes de send_message. Uma
+chamada só é admitida se, na janela dos últimos 60 segundos, couber mais uma
+requisição (GEMINI_RPM) e os tokens estimados dela (GEMINI_TPM). Quem não cabe
+entra em uma fila FIFO: só o primeiro da fila é admitido, então ninguém fura a
+fila nem todos disparam juntos quando a janela abre.
+
+A estimativa de tokens é acertada depois com o uso real (settle), e um 429 do
+Gemini pausa as admissões por alguns segundos (pause).
+"""
+import threading
+import time
+from collections import deque
+
+WINDOW_SECONDS = 60.0
+
+# Aproximação usada antes de o Gemini informar o uso real
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Estimativa grosseira de tokens de um texto (~4 caracteres por token)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class GeminiRateScheduler:
+    """
+    Fila justa que admite chamadas dentro dos orçamentos por minuto
+
+    Args:
+        rpm: Requisições por minuto (None = sem limite)
+        tpm: Tokens por minuto (None = sem limite)
+        on_wait: Callback chamado com os segundos de espera na fila
+    """
+
+    def __init__(self, rpm=None, tpm=None, on_wait=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.on_wait = on_wait
+        self._lock = threading.Lock()
+        self._queue = deque()   # Events dos usuários esperando, na ordem de chegada
+        self._window = deque()  # [instante, tokens] das chamadas admitidas nos últimos 60s
+        self._window_tokens = 0
+        self._paused_until = 0.0
+        self.stats = {
+            'admitted': 0,
+            'queued': 0,
+            'max_queue': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'pauses': 0,
+            'estimated_tokens': 0,
+            'actual_tokens': 0
+        }
+
+    def _expire(self, now):
+        cutoff = now - WINDOW_SECONDS
+        while self._window and self._window[0][0] <= cutoff:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _delay(self, now, tokens):
+        """Segundos até a chamada caber nos orçamentos; deve ser chamado com o lock"""
+        delay = self._paused_until - now
+        if self.rpm and len(self._window) >= self.rpm:
+            delay = max(delay, self._window[len(self._window) - self.rpm][0] + WINDOW_SECONDS - now)
+        if self.tpm and self._window_tokens + tokens > self.tpm:
+            excess = self._window_tokens + tokens - self.tpm
+            for admitted_at, admitted_tokens in self._window:
+                excess -= admitted_tokens
+                if excess <= 0:
+                    delay = max(delay, admitted_at + WINDOW_SECONDS - now)
+                    break
+        return delay
+
+    def admit(self, tokens):
+        """
+        Aguarda a vez na fila e registra a chamada na janela
+
+        Args:
+            tokens: Tokens estimados da chamada (entrada + saída)
+
+        Returns:
+            list: Registro [instante, tokens] da chamada, para settle()
+        """
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        waiter = threading.Event()
+        wait_started = time.time()
+        with self._lock:
+            self._queue.append(waiter)
+            self.stats['max_queue'] = max(self.stats['max_queue'], len(self._queue))
+
+        try:
+            while True:
+                with self._lock:
+                    now = time.time()
+                    self._expire(now)
+                    timeout = None
+                    if self._queue[0] is waiter:
+                        timeout = self._delay(now, tokens)
+                        if timeout <= 0:
+                            entry = [now, tokens]
+                            self._window.append(entry)
+                            self._window_tokens += tokens
+                            self._queue.popleft()
+                            if self._queue:
+                                self._queue[0].set()
+                            break
+                    waiter.clear()
+                waiter.wait(timeout)
+        except BaseException:
+            # Usuário interrompido na fila (ex.: fim do teste): libera a vez
+            with self._lock:
+                if waiter in self._queue:
+                    was_head = self._queue[0] is waiter
+                    self._queue.remove(waiter)
+                    if was_head and self._queue:
+                        self._queue[0].set()
+            raise
+
+        waited = time.time() - wait_started
+        with self._lock:
+            self.stats['admitted'] += 1
+            self.stats['estimated_tokens'] += tokens
+            if waited > 0.001:
+                self.stats['queued'] += 1
+            self.stats['total_wait_ms'] += waited * 1000
+            self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], waited * 1000)
+        if self.on_wait:
+            self.on_wait(waited)
+        return entry
+
+    def settle(self, entry, actual_tokens):
+        """Troca a estimativa da chamada pelo uso real informado pelo Gemini"""
+        with self._lock:
+            self.stats['actual_tokens'] += actual_tokens
+            now = time.time()
+            self._expire(now)
+            if entry[0] > now - WINDOW_SECONDS:
+                # Ainda está na janela: corrige também o total da janela
+                self._window_tokens += actual_tokens - entry[1]
+            entry[1] = actual_tokens
+
+    def pause(self, seconds):
+        """Suspende as admissões (ex.: após um 429 do Gemini)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+            self.stats['pauses'] += 1
+
+    def summary(self):
+        stats = dict(self.stats)
+        stats['avg_wait_ms'] = round(stats['total_wait_ms'] / stats['admitted'], 2) if stats['admitted'] else 0.0
+        stats['total_wait_ms'] = round(stats['total_wait_ms'], 2)
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 2)
+        stats['rpm'] = self.rpm
+        stats['tpm'] = self.tpm
+        return stats
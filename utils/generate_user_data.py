@@ -1,68 +1,351 @@
 import random
+import string
+from collections import OrderedDict
+
+import numpy as np
+
+NOMES = ['João', 'Maria', 'Pedro', 'Ana', 'Carlos', 'Fernanda', 'Ricardo', 'Juliana']
+
+# Nomes completos compartilhados por todos os registros (cada usuário guarda só o índice)
+NOMES_COMPLETOS = tuple(f"{nome} Smart Talks" for nome in NOMES)
+
+# Usuários mantidos em cache por padrão (cada usuário é gerado uma vez, então o
+# cache só precisa cobrir quem ainda está ativo)
+DEFAULT_CACHE_SIZE = 10_000
+
+# Usuários por bloco do lote NumPy: cada bloco tem um gerador próprio, então os
+# dados de um usuário não dependem do tamanho do lote
+_BATCH_BLOCK = 65_536
+
+# Trechos de "ddd.ddd.ddd-dd": (colunas no CPF formatado, colunas nos dígitos)
+_CPF_GROUPS = ((slice(0, 3), slice(0, 3)), (slice(4, 7), slice(3, 6)),
+               (slice(8, 11), slice(6, 9)), (slice(12, 14), slice(9, 11)))
+
+
+def _check_digit(digits, count):
+    """Dígito verificador do CPF sobre os `count` primeiros dígitos de cada linha"""
+    total = np.zeros(len(digits), dtype=np.uint16)
+    for column in range(count):
+        total += digits[:, column] * np.uint16(count + 1 - column)
+    remainder = total % 11
+    return np.where(remainder > 1, 11 - remainder, 0).astype(np.uint8)
+
+
+def _as_strings(codes):
+    """Matriz (N, largura) de códigos ASCII -> array de N bytes strings"""
+    codes = np.ascontiguousarray(codes, dtype=np.uint8)
+    return codes.view(f'S{codes.shape[1]}').ravel()
+
+
+def _generate_block(seed, block):
+    """
+    Colunas dos usuários do bloco `block` (ids block * _BATCH_BLOCK + 1 em diante)
+    
+    Returns:
+        tuple: (telefone, email, cpf_formatted, cpf_numbers, nome_index)
+    """
+    rng = np.random.default_rng([seed, block])
+    n = _BATCH_BLOCK
+    
+    # Telefone (with country code 55)
+    telefone = np.empty((n, 12), dtype=np.uint8)
+    telefone[:, :4] = np.frombuffer(b'5545', dtype=np.uint8)
+    telefone[:, 4:] = rng.integers(ord('0'), ord('9') + 1, size=(n, 8), dtype=np.uint8)
+    
+    # Email
+    domain = b'@smarttalks.com.br'
+    email = np.empty((n, 8 + len(domain)), dtype=np.uint8)
+    email[:, :8] = rng.integers(ord('a'), ord('z') + 1, size=(n, 8), dtype=np.uint8)
+    email[:, 8:] = np.frombuffer(domain, dtype=np.uint8)
+    
+    # CPF
+    cpf_formatted, cpf_numbers = FastCPFGenerator.generate_batch(n, rng)
+    
+    # Nome
+    nome_index = rng.integers(0, len(NOMES), size=n, dtype=np.uint8)
+    
+    return _as_strings(telefone), _as_strings(email), cpf_formatted, cpf_numbers, nome_index
+
+
+class LRUCache:
+    """
+    Cache LRU limitado, com estatísticas de acertos, faltas e descartes
+    
+    Args:
+        max_entries: Máximo de entradas (None = sem limite)
+    """
+    
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return value
+    
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._evict()
+    
+    def resize(self, max_entries):
+        self.max_entries = max_entries
+        self._evict()
+    
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+    
+    def clear(self):
+        """Esvazia o cache e zera as estatísticas"""
+        self._entries.clear()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def summary(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries,
+                    hit_ratio=round(self.stats['hits'] / lookups, 4) if lookups else 0.0)
+
+
+class UserRecord:
+    """
+    Dados de um usuário em um registro compacto (__slots__)
+    
+    Acessado como o antigo dicionário: user['email'], user.get('nome').
+    `nome` e `cpf_numbers` são derivados no acesso, não guardados.
+    """
+    __slots__ = ('user_id', 'telefone', 'email', 'cpf_formatted', 'nome_index')
+    
+    FIELDS = ('user_id', 'telefone', 'email', 'cpf_formatted', 'cpf_numbers', 'nome')
+    
+    def __init__(self, user_id, telefone, email, cpf_formatted, nome_index):
+        self.user_id = user_id
+        self.telefone = telefone
+        self.email = email
+        self.cpf_formatted = cpf_formatted
+        self.nome_index = nome_index
+    
+    @property
+    def nome(self):
+        return NOMES_COMPLETOS[self.nome_index]
+    
+    @property
+    def cpf_numbers(self):
+        return self.cpf_formatted.replace('.', '').replace('-', '')
+    
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+    
+    def keys(self):
+        return self.FIELDS
+    
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.FIELDS}
+    
+    def __eq__(self, other):
+        return isinstance(other, UserRecord) and self.to_dict() == other.to_dict()
+    
+    def __repr__(self):
+        return f"UserRecord({self.to_dict()})"
+
 
 # Create FastCPFGenerator class
 class FastCPFGenerator:
     """Gerador de CPF otimizado"""
-    _cache = {}
+    _cache = LRUCache()
     
     @classmethod
     def generate_cpf(cls, user_id):
-        """Gera CPF com cache"""
-        if user_id in cls._cache:
-            return cls._cache[user_id]
-            
-        random.seed(user_id)
-        cpf = [random.randint(0, 9) for x in range(9)]
+        """Gera CPF com cache (RNG próprio: não mexe no estado global de `random`)"""
+        formatted = cls._cache.get(user_id)
+        if formatted is None:
+            formatted = cls.compute_cpf(user_id)
+            cls._cache.put(user_id, formatted)
+        return formatted
+    
+    @staticmethod
+    def compute_cpf(user_id):
+        """Gera o CPF do usuário sem passar pelo cache"""
+        rng = random.Random(user_id)
+        cpf = [rng.randint(0, 9) for x in range(9)]
         
         for _ in range(2):
             val = sum([(len(cpf) + 1 - i) * v for i, v in enumerate(cpf)]) % 11
             cpf.append(11 - val if val > 1 else 0)
         
-        formatted = '%s%s%s.%s%s%s.%s%s%s-%s%s' % tuple(cpf)
-        cls._cache[user_id] = formatted
-        return formatted
+        return '%s%s%s.%s%s%s.%s%s%s-%s%s' % tuple(cpf)
     
     @staticmethod
     def cpf_only_numbers(cpf_formatted):
         return ''.join(filter(str.isdigit, cpf_formatted))
+    
+    @staticmethod
+    def generate_batch(n, rng):
+        """
+        Gera N CPFs válidos de uma vez
+        
+        Args:
+            n: Quantidade de CPFs
+            rng: numpy.random.Generator
+        
+        Returns:
+            tuple: (formatados, só números) como arrays de bytes strings
+        """
+        digits = np.empty((n, 11), dtype=np.uint8)
+        digits[:, :9] = rng.integers(0, 10, size=(n, 9), dtype=np.uint8)
+        digits[:, 9] = _check_digit(digits, 9)
+        digits[:, 10] = _check_digit(digits, 10)
+        
+        codes = digits + np.uint8(ord('0'))
+        formatted = np.empty((n, 14), dtype=np.uint8)
+        formatted[:, 3] = formatted[:, 7] = ord('.')
+        formatted[:, 11] = ord('-')
+        for formatted_columns, digit_columns in _CPF_GROUPS:
+            formatted[:, formatted_columns] = codes[:, digit_columns]
+        return _as_strings(formatted), _as_strings(codes)
+
+
+class UserDataBatch:
+    """
+    Dados de N usuários gerados de uma vez, em colunas (arrays NumPy)
+    
+    `batch[i]` e `batch.user(user_id)` devolvem um UserRecord, o mesmo tipo de
+    OptimizedUserData.generate_data (os valores vêm da semente do lote, não
+    são os do RNG por usuário); as strings só são montadas no acesso.
+    O lote em si já é o armazenamento compacto (~64 bytes por usuário).
+    """
+
+    def __init__(self, start_id, telefone, email, cpf_formatted, cpf_numbers, nome_index):
+        self.start_id = start_id
+        self.telefone = telefone
+        self.email = email
+        self.cpf_formatted = cpf_formatted
+        self.cpf_numbers = cpf_numbers
+        self.nome_index = nome_index
+    
+    def __len__(self):
+        return len(self.telefone)
+    
+    def __contains__(self, user_id):
+        return 0 <= user_id - self.start_id < len(self)
+    
+    def __getitem__(self, i):
+        return UserRecord(self.start_id + i, self.telefone[i].decode(), self.email[i].decode(),
+                          self.cpf_formatted[i].decode(), int(self.nome_index[i]))
+    
+    def user(self, user_id):
+        return self[user_id - self.start_id]
+    
+    def columns(self):
+        """{campo: array de bytes UTF-8 com o valor de cada usuário}, para preencher textos em lote"""
+        nomes = np.array([nome.encode() for nome in NOMES_COMPLETOS])
+        return {
+            'telefone': self.telefone,
+            'email': self.email,
+            'cpf_formatted': self.cpf_formatted,
+            'cpf_numbers': self.cpf_numbers,
+            'nome': nomes[self.nome_index]
+        }
+
 
 # Create OptimizedUserData class
 class OptimizedUserData:
-    """Geração de dados otimizada com cache"""
-    _cache = {}
+    """Geração de dados otimizada com cache (LRU limitado)"""
+    _cache = LRUCache()
+    _batch = None
     
     @classmethod
     def generate_data(cls, user_id):
-        if user_id in cls._cache:
-            return cls._cache[user_id]
-            
-        import string
-        random.seed(user_id)
+        # Usuários pré-gerados vêm direto do lote, sem ocupar o cache
+        if cls._batch is not None and user_id in cls._batch:
+            return cls._batch.user(user_id)
+        
+        data = cls._cache.get(user_id)
+        if data is not None:
+            return data
+        
+        # RNG próprio por usuário: reproduzível e sem reiniciar o `random` global
+        # (que decide, por exemplo, a persona de cada usuário)
+        rng = random.Random(user_id)
         
         # Telefone (with country code 55)
-        telefone_numero = ''.join([str(random.randint(0, 9)) for _ in range(8)])
+        telefone_numero = ''.join([str(rng.randint(0, 9)) for _ in range(8)])
         telefone = f"5545{telefone_numero}"
         
         # Email
-        nome_base = ''.join(random.choices(string.ascii_lowercase, k=8))
+        nome_base = ''.join(rng.choices(string.ascii_lowercase, k=8))
         email = f"{nome_base}@smarttalks.com.br"
         
-        # CPF
-        cpf_formatted = FastCPFGenerator.generate_cpf(user_id)
-        cpf_numbers = FastCPFGenerator.cpf_only_numbers(cpf_formatted)
-        
-        # Nome
-        nomes = ['João', 'Maria', 'Pedro', 'Ana', 'Carlos', 'Fernanda', 'Ricardo', 'Juliana']
-        nome = f"{random.choice(nomes)} {'Smart Talks'}"
-        
-        data = {
-            'user_id': user_id,
-            'telefone': telefone,
-            'email': email, 
-            'cpf_formatted': cpf_formatted,
-            'cpf_numbers': cpf_numbers,
-            'nome': nome
-        }
+        # CPF (o registro já guarda o CPF: não precisa do cache de CPFs)
+        cpf_formatted = FastCPFGenerator.compute_cpf(user_id)
+        
+        # Nome (índice em NOMES_COMPLETOS)
+        nome_index = rng.randrange(len(NOMES))
+        
+        data = UserRecord(user_id, telefone, email, cpf_formatted, nome_index)
         
-        cls._cache[user_id] = data
+        cls._cache.put(user_id, data)
         return data
+    
+    @staticmethod
+    def generate_batch(n, seed=0, start_id=1):
+        """
+        Gera os dados de N usuários de uma vez (vetorizado com NumPy)
+        
+        Os ids são sorteados em blocos fixos de _BATCH_BLOCK usuários, cada
+        bloco com um numpy.random.Generator próprio (semente [seed, bloco]):
+        os dados de um usuário dependem só de (seed, user_id), não de `n` nem
+        de `start_id`, então mudar USER_DATA_PRELOAD não troca os dados de
+        ninguém. O estado do `random` global não muda.
+        
+        Args:
+            n: Quantidade de usuários
+            seed: Semente base
+            start_id: user_id do primeiro usuário do lote (>= 1)
+        
+        Returns:
+            UserDataBatch: Usuários start_id .. start_id + n - 1
+        """
+        first_block = (start_id - 1) // _BATCH_BLOCK
+        last_block = max(first_block, (start_id + n - 2) // _BATCH_BLOCK)
+        blocks = [_generate_block(seed, block) for block in range(first_block, last_block + 1)]
+        
+        # Colunas dos blocos emendadas e cortadas no intervalo pedido (cópia:
+        # o lote não segura o resto dos blocos na memória)
+        offset = start_id - 1 - first_block * _BATCH_BLOCK
+        columns = [np.concatenate(column)[offset:offset + n].copy() for column in zip(*blocks)]
+        return UserDataBatch(start_id, *columns)
+    
+    @classmethod
+    def preload(cls, n, seed=0):
+        """Gera os usuários 1..N de uma vez; generate_data passa a lê-los do lote"""
+        cls._batch = cls.generate_batch(n, seed=seed)
+        return cls._batch
+    
+    @classmethod
+    def set_cache_size(cls, max_entries):
+        """Limita os caches de usuários e de CPFs (None = sem limite)"""
+        cls._cache.resize(max_entries)
+        FastCPFGenerator._cache.resize(max_entries)
+    
+    @classmethod
+    def cache_summary(cls):
+        """Estatísticas dos caches (acertos, faltas, descartes, entradas)"""
+        return {'users': cls._cache.summary(), 'cpfs': FastCPFGenerator._cache.summary()}
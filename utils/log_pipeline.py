@@ -0,0 +1,182 @@
+"""
+Logging sem bloquear os usuários (QueueHandler/QueueListener)
+
+Os logs do locustfile só entram em uma fila (QueueHandler); uma thread do
+threadpool do gevent (QueueListener) formata e grava no arquivo e no terminal,
+fora do hub. Assim a escrita no terminal e em disco não trava os usuários nem
+entra nos tempos medidos.
+
+O logger do locustfile e o dos módulos de utils/ ("utils") não propagam para
+o root: o Locust reconfigura o root depois de importar o locustfile, e os
+handlers daqui continuariam valendo só até lá. As mensagens de console (antigos print, sem formato) vão por um
+logger filho, "<locustfile>.console", e aparecem só no terminal.
+
+LOG_MODE:
+    "verbose" - todos os registros a partir de LOG_LEVEL
+    "quiet"   - WARNING e ERROR sempre; INFO/DEBUG (os logs de cada turno)
+                só em uma amostra de LOG_SAMPLE_RATE
+
+A amostragem só vale com o teste em andamento (listener.set_sampling, ligado
+nos eventos test_start/test_stop): as mensagens de início e o resumo final
+saem completos.
+"""
+import logging
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+import gevent
+from gevent import monkey
+
+LOG_MODES = ("verbose", "quiet")
+
+# Logger pai dos módulos de utils/ (logging.getLogger(__name__) em cada um)
+UTILS_LOGGER = "utils"
+
+# Fila nativa (não a do gevent): a thread do listener bloqueia nela sem
+# polling e acorda assim que o hub coloca um registro
+_NativeSimpleQueue = monkey.get_original('queue', 'SimpleQueue')
+
+
+class SamplingFilter(logging.Filter):
+    """Deixa passar WARNING ou acima e uma amostra (`rate`) dos demais registros (se `active`)"""
+
+    def __init__(self, rate, active=True):
+        super().__init__()
+        self.rate = rate
+        self.active = active
+        self._rng = random.Random()
+        self.stats = {'passed': 0, 'sampled_out': 0}
+
+    def filter(self, record):
+        if not self.active or record.levelno >= logging.WARNING or self._rng.random() < self.rate:
+            self.stats['passed'] += 1
+            return True
+        self.stats['sampled_out'] += 1
+        return False
+
+
+class _NameFilter(logging.Filter):
+    """Separa as mensagens de console (sem formato) dos logs normais"""
+
+    def __init__(self, console_name, console):
+        super().__init__()
+        self.console_name = console_name
+        self.console = console
+
+    def filter(self, record):
+        return (record.name == self.console_name) == self.console
+
+
+class _RecordQueue:
+    """
+    Fila entre o hub e a thread do listener
+
+    put_nowait nunca bloqueia quem loga: com `maxsize` registros pendentes, os
+    registros abaixo de WARNING são descartados (e contados). get bloqueia a
+    thread do listener na fila nativa até chegar um registro.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._records = _NativeSimpleQueue()
+        self.dropped = 0
+
+    def put_nowait(self, record):
+        if (self._records.qsize() >= self.maxsize and record is not QueueListener._sentinel
+                and record.levelno < logging.WARNING):
+            self.dropped += 1
+            return
+        self._records.put_nowait(record)
+
+    def get(self, block=True):
+        return self._records.get(block)
+
+    def qsize(self):
+        return self._records.qsize()
+
+
+class ThreadpoolQueueListener(QueueListener):
+    """QueueListener que roda em uma thread do threadpool do gevent (não em um greenlet)"""
+
+    sampler = None
+
+    def set_sampling(self, active):
+        """Liga/desliga a amostragem do modo "quiet" (sem efeito no "verbose")"""
+        if self.sampler is not None:
+            self.sampler.active = active
+
+    def start(self):
+        self._thread = gevent.get_hub().threadpool.spawn(self._monitor)
+
+    def stop(self):
+        if self._thread is not None:
+            self.enqueue_sentinel()
+            self._thread.get()
+            self._thread = None
+        for handler in self.handlers:
+            handler.close()
+
+
+def setup_logging(name, log_file, level, fmt, mode="verbose", sample_rate=0.01, queue_size=10000):
+    """
+    Liga o logger `name` (e o filho `name.console`) e os loggers de utils/ à fila e inicia o listener
+
+    Args:
+        name: Nome do logger do locustfile (__name__)
+        log_file: Arquivo de log
+        level: Nível mínimo (ex.: "INFO")
+        fmt: Formato dos registros
+        mode: "verbose" ou "quiet" (ver docstring do módulo)
+        sample_rate: Fração dos registros INFO/DEBUG mantida no modo "quiet"
+        queue_size: Registros pendentes antes de descartar os abaixo de WARNING
+
+    Returns:
+        tuple: (logger, logger de console, listener) - chame listener.stop() no fim
+    """
+    if mode not in LOG_MODES:
+        raise ValueError(f"Unknown log mode: {mode}")
+
+    console_name = f"{name}.console"
+    formatter = logging.Formatter(fmt)
+
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    stream_handler = logging.StreamHandler()
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+        handler.addFilter(_NameFilter(console_name, console=False))
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    console_handler.addFilter(_NameFilter(console_name, console=True))
+
+    record_queue = _RecordQueue(queue_size)
+    queue_handler = QueueHandler(record_queue)
+    sampler = None
+    if mode == "quiet":
+        sampler = SamplingFilter(sample_rate, active=False)
+        queue_handler.addFilter(sampler)
+
+    logger = logging.getLogger(name)
+    # Os módulos de utils/ (receptor de webhooks, cache do Gemini, ...) logam
+    # em "utils.*": passam pela mesma fila e amostragem
+    for pipeline_logger in (logger, logging.getLogger(UTILS_LOGGER)):
+        pipeline_logger.setLevel(getattr(logging, level))
+        pipeline_logger.handlers = [queue_handler]
+        pipeline_logger.propagate = False
+
+    listener = ThreadpoolQueueListener(record_queue, file_handler, stream_handler, console_handler)
+    listener.sampler = sampler
+    listener.start()
+    return logger, logging.getLogger(console_name), listener
+
+
+def pipeline_stats(logger):
+    """Registros descartados pela amostragem e pela fila cheia (para o resumo do teste)"""
+    stats = {'pending': 0, 'dropped_queue_full': 0, 'sampled_out': 0}
+    for handler in logger.handlers:
+        if isinstance(handler, QueueHandler):
+            stats['pending'] = handler.queue.qsize()
+            stats['dropped_queue_full'] = handler.queue.dropped
+            for log_filter in handler.filters:
+                if isinstance(log_filter, SamplingFilter):
+                    stats['sampled_out'] = log_filter.stats['sampled_out']
+    return stats
@@ -0,0 +1,104 @@
+"""
+Cronograma de envio dos turnos e correção de coordinated omission
+
+Cada usuário espera o webhook antes de mandar a próxima mensagem: quando a
+Voyager fica lenta, o teste manda menos mensagens e as latências medidas
+subestimam o que um cliente de verdade veria (coordinated omission). Aqui cada
+turno tem um horário planejado de envio:
+
+    - TURN_PACING_INTERVAL segundos depois do turno anterior no cronograma
+      (locustfile*.py, locust_fixed.py)
+    - o cronograma gravado da conversa, escalado por REPLAY_SPEED (locust_replay.py)
+
+O usuário nunca envia antes do horário planejado. Se o turno anterior atrasou
+e o envio sai depois do horário, o atraso (send lag) entra na latência
+corrigida: corrigida = resposta - horário planejado = medida + atraso. Sem
+cronograma (TURN_PACING_INTERVAL = None) os turnos continuam separados só pelo
+intervalo mínimo e a latência corrigida é a própria medida.
+"""
+import time
+
+from utils.turn_histograms import LatencyHistogram
+
+
+class TurnSchedule:
+    """
+    Horários planejados de envio dos turnos de uma conversa
+
+    Args:
+        start: Início da conversa (time.time())
+        interval: Segundos entre os envios planejados de turnos seguidos
+        offsets: Segundos desde o início até o envio planejado de cada turno
+            (substitui `interval`; ex.: o cronograma gravado no replay)
+        min_gap: Espera mínima entre a resposta e o próximo envio
+        tolerance: Atraso (s) ainda considerado no horário (imprecisão do sleep)
+    """
+
+    def __init__(self, start, interval=None, offsets=None, min_gap=0.5, tolerance=0.01):
+        self.start = start
+        self.interval = interval
+        self.offsets = offsets
+        self.min_gap = min_gap
+        self.tolerance = tolerance
+
+    @property
+    def paced(self):
+        """Há cronograma (intervalo ou horários gravados)"""
+        return self.offsets is not None or bool(self.interval)
+
+    def intended_at(self, turn):
+        """Horário planejado de envio do turno `turn` (1, 2, ...), ou None sem cronograma"""
+        if self.offsets is not None:
+            return self.start + self.offsets[turn - 1] if turn <= len(self.offsets) else None
+        if self.interval:
+            return self.start + (turn - 1) * self.interval
+        return None
+
+    def lag(self, turn, sent_at):
+        """Segundos de atraso do envio do turno em relação ao cronograma (0 se no horário)"""
+        intended = self.intended_at(turn)
+        if intended is None or sent_at - intended <= self.tolerance:
+            return 0.0
+        return sent_at - intended
+
+    def wait_for(self, turn, min_gap=None):
+        """Espera até poder enviar o turno: pelo menos `min_gap` e nunca antes do horário planejado"""
+        now = time.time()
+        send_at = now + (self.min_gap if min_gap is None else min_gap)
+        intended = self.intended_at(turn)
+        if intended is not None and intended > send_at:
+            send_at = intended
+        if send_at > now:
+            time.sleep(send_at - now)
+
+
+class CoordinatedOmissionStats:
+    """
+    Distribuições da latência medida e corrigida (e do atraso de envio) de todos os turnos
+
+    Args:
+        max_ms: Maior latência rastreada pelos histogramas
+    """
+
+    def __init__(self, max_ms=600_000):
+        self.raw = LatencyHistogram(max_ms)
+        self.corrected = LatencyHistogram(max_ms)
+        self.send_lag = LatencyHistogram(max_ms)
+        self.late_turns = 0
+
+    def record(self, raw_ms, lag_ms):
+        """Grava um turno: latência medida desde o envio e atraso do envio (ms)"""
+        self.raw.record(raw_ms)
+        self.corrected.record(raw_ms + lag_ms)
+        self.send_lag.record(lag_ms)
+        if lag_ms > 0:
+            self.late_turns += 1
+
+    def summary(self):
+        return {
+            'turns': self.raw.count,
+            'late_turns': self.late_turns,
+            'raw_ms': self.raw.summary(),
+            'corrected_ms': self.corrected.summary(),
+            'send_lag_ms': self.send_lag.summary()
+        }
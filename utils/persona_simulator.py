@@ -0,0 +1,179 @@
+"""
+Simulador local de persona (USER_SIMULATOR = "scripted")
+
+Substitui o chat do Gemini em testes de alta escala: lê o roteiro numerado de
+personas/persona_*.txt (já com os dados do usuário substituídos) e responde às
+perguntas da Voyager por regras - nome, opt-in, parque, data, quantidade,
+upselling, telefone, e-mail, CPF, pagamento e link. Não usa rede nem tokens,
+então a latência é só a configurada em SCRIPTED_RESPONSE_DELAY.
+
+A interface imita o Chat do google-genai (send_message devolve um objeto com
+`.text` e `.usage_metadata`), para que o loop da conversa não mude.
+"""
+import random
+import re
+import time
+from collections import namedtuple
+
+# Resposta no formato do google-genai (sem uso de tokens)
+SimulatedResponse = namedtuple('SimulatedResponse', ['text', 'usage_metadata'])
+
+_STEP = re.compile(r'^\s*\d+\.\s*(.+?)\s*$', re.MULTILINE)
+_DATE = re.compile(r'\d{1,2}/\d{1,2}(?:/\d{2,4})?|\bdia \d{1,2} de [a-zç]+', re.IGNORECASE)
+_LINK = re.compile(r'https?://\S+')
+
+# Perguntas da Voyager, na ordem em que são verificadas. O resumo do pedido
+# vem antes dos dados pessoais porque repete nome, celular, e-mail e CPF.
+_ASKS_SUMMARY = re.compile(r'confira|resumo|carrinho|revise')
+_ASKS_PAYMENT = re.compile(r'forma de pagamento|pagar com|pix ou|cart[ãa]o')
+_ASKS_CPF = re.compile(r'\bcpf\b')
+_ASKS_EMAIL = re.compile(r'e-?mail')
+_ASKS_PHONE = re.compile(r'celular|telefone|whatsapp|ddd')
+_ASKS_NAME = re.compile(r'\bnome\b')
+_ASKS_OPT_IN = re.compile(r'voc[êe] autoriza|autoriza o envio|aceita receber|receber (?:mensagens|novidades)')
+_OFFERS_UPSELL = re.compile(r'cabana|experi[êe]ncia|upgrade|adicionar')
+_ASKS_QUANTITY = re.compile(r'quant|tipos de ingresso|quais ingressos|quantas pessoas')
+_DATE_UNAVAILABLE = re.compile(r'indispon[íi]vel|esgotad|fechad|n[ãa]o (?:est[áa]|estar[áa]|temos|h[áa]) dispon')
+_ASKS_DATE = re.compile(r'\bdata\b|\bdatas\b|qual dia|\bdia\b|quando')
+_OFFERS_HELP = re.compile(r'posso te ajudar|como posso|ajudar com|em que posso')
+_IMAGE = re.compile(r'\.(?:jpe?g|png|webp|gif)\b|imagem|foto')
+
+
+def _find(pattern, steps):
+    for step in steps:
+        match = re.search(pattern, step, re.IGNORECASE)
+        if match:
+            return match.group(1).strip().rstrip('.')
+    return None
+
+
+class PersonaScript:
+    """Dados extraídos do roteiro da persona"""
+
+    def __init__(self, persona_text):
+        steps = _STEP.findall(persona_text)
+        self.name = _find(r'informe seu nome:\s*(.+)$', steps)
+        self.phone = _find(r'solicitado telefone, diga:\s*(\S+)', steps)
+        self.email = _find(r'solicitado email, diga:\s*(\S+)', steps)
+        self.cpf = _find(r'solicitado CPF, diga:\s*(\S+)', steps)
+        self.quantity = _find(r'quantidade, informe:\s*(.+)$', steps)
+        self.product = _find(r'(?:ingressos do|ingressos)\s+([A-ZÀ-Ú][\w ]*?)\s*$', steps)
+        self.accepts_upsell = not any(re.search(r'N[ÃA]O aceite', step) for step in steps
+                                      if re.search(r'upselling', step, re.IGNORECASE))
+        self.pays_with_pix = 'pix' in persona_text.lower()
+        self.thanks = "Obrigada" if re.search(r'\buma cliente\b', persona_text) else "Obrigado"
+
+        # Datas na ordem do roteiro: a primeira é a preferida, as outras são as alternativas
+        self.dates = [date for step in steps
+                      if not re.search(r'telefone|email|CPF', step, re.IGNORECASE)
+                      for date in _DATE.findall(step)]
+
+        # Perguntas que a persona deve fazer por conta própria ("Pergunte onde fica o local")
+        self.questions = []
+        for step in steps:
+            match = re.match(r'Pergunte\s+(.+?)(?:\s*\(.*\))?$', step)
+            if match:
+                self.questions.append(match.group(1)[0].upper() + match.group(1)[1:] + '?')
+
+
+class ScriptedPersonaChat:
+    """
+    Persona determinística que responde às mensagens da Voyager por regras
+
+    Args:
+        persona_text: Roteiro da persona já personalizado com os dados do usuário
+        user_data: Dados do usuário (OptimizedUserData); têm prioridade sobre o roteiro
+        delay: Faixa (mín, máx) em segundos do tempo de resposta simulado
+        seed: Semente das variações de texto (ex.: user_id), para repetir a conversa
+    """
+
+    def __init__(self, persona_text, user_data=None, delay=(0.0, 0.0), seed=None):
+        self.script = PersonaScript(persona_text)
+        user_data = user_data or {}
+        self.name = self.script.name or user_data.get('nome', '')
+        self.phone = user_data.get('telefone') or self.script.phone
+        self.email = user_data.get('email') or self.script.email
+        self.cpf = user_data.get('cpf_formatted') or self.script.cpf
+        self.delay = delay
+        self.rng = random.Random(seed)
+        self.pending_questions = list(self.script.questions)
+        self.date_index = 0
+        self.asked_product = False
+        self.history = []
+
+    def _pick(self, *options):
+        return self.rng.choice(options)
+
+    def _date(self):
+        if not self.script.dates:
+            return self._pick("Pode ser a data mais próxima disponível! 😊", "Qualquer data próxima serve!")
+        date = self.script.dates[min(self.date_index, len(self.script.dates) - 1)]
+        return self._pick(f"Quero para {date}, por favor! 📅", f"Pode ser {date}? 😊")
+
+    def _product(self):
+        self.asked_product = True
+        product = self.script.product or "o parque"
+        return self._pick(f"Quero comprar ingressos do {product}, por favor! 🎟️",
+                          f"Queria ingressos do {product}! 😊")
+
+    def respond(self, message):
+        """Escolhe a resposta da persona para a mensagem da Voyager"""
+        text = message.lower()
+        links = _LINK.findall(message)
+        thanks = self.script.thanks
+
+        if any('pay' in link for link in links):
+            return self._pick(f"Perfeito! Vou abrir o link e fazer o pagamento agora. {thanks}! 😊",
+                              "Show! Já vou clicar no link pra pagar 😉")
+
+        prefix = ""
+        if links or _IMAGE.search(text):
+            prefix = self._pick(f"Que lindo! 😍 {thanks} por mandar! ", f"Achei lindo, {thanks.lower()}! 🤩 ")
+
+        if _ASKS_SUMMARY.search(text):
+            payment = " Vou pagar com Pix 😉" if self.script.pays_with_pix else ""
+            return prefix + "Tudo certo! Pode gerar o link." + payment
+        if _ASKS_PAYMENT.search(text):
+            return prefix + ("Pix, por favor! 😊" if self.script.pays_with_pix else "Cartão, por favor!")
+        if _ASKS_CPF.search(text):
+            return prefix + f"Meu CPF é {self.cpf} 😉"
+        if _ASKS_EMAIL.search(text):
+            return prefix + f"É {self.email} 😊"
+        if _ASKS_PHONE.search(text):
+            return prefix + f"Meu celular é {self.phone}"
+        if _ASKS_NAME.search(text):
+            return prefix + self._pick(f"Meu nome é {self.name} 😊", f"Oi! {self.name} 😉")
+        if _ASKS_OPT_IN.search(text):
+            return prefix + self._pick("Sim, pode enviar! 😊", "Autorizo sim!")
+        if _OFFERS_UPSELL.search(text):
+            if self.script.accepts_upsell:
+                return prefix + "Opa, quero sim! Pode adicionar 😍"
+            return prefix + f"Não, {thanks.lower()}! Só os ingressos mesmo 😉"
+        if _DATE_UNAVAILABLE.search(text) and self.date_index + 1 < len(self.script.dates):
+            self.date_index += 1
+            date = self._date()
+            return prefix + "Poxa! Então " + date[0].lower() + date[1:]
+        if _ASKS_QUANTITY.search(text):
+            answer = f"Vou precisar de: {self.script.quantity}." if self.script.quantity else "Só um ingresso."
+            if _ASKS_DATE.search(text):
+                answer = self._date() + " " + answer
+            return prefix + answer
+        if _ASKS_DATE.search(text):
+            return prefix + self._date()
+        if self.pending_questions:
+            return prefix + self.pending_questions.pop(0)
+        if _OFFERS_HELP.search(text) or not self.asked_product:
+            return prefix + self._product()
+        return prefix + self._pick("Ok! 😊", f"Certo, {thanks.lower()}!", "Beleza 👍")
+
+    def send_message(self, message):
+        """Mesma assinatura do Chat do google-genai"""
+        low, high = self.delay
+        if high > 0:
+            time.sleep(self.rng.uniform(low, high))
+        reply = self.respond(message)
+        self.history.append((message, reply))
+        return SimulatedResponse(reply, None)
+
+    def get_history(self):
+        return list(self.history)
@@ -0,0 +1,126 @@
+"""
+Templates de persona pré-compilados
+
+Os roteiros em personas/persona_*.txt usam placeholders com os campos de
+OptimizedUserData: {nome}, {telefone}, {email}, {cpf_formatted} e
+{cpf_numbers}. Todos os arquivos são lidos e compilados uma única vez no início
+do teste (on_locust_init); cada usuário só preenche o texto com os seus dados,
+em uma passada, sem abrir arquivos. Chaves entre chaves que não são campos do
+usuário ficam como estão no texto.
+
+Uma persona nova colocada em personas/ é encontrada automaticamente.
+
+O roteiro fixo de locust_fixed.py (fixed_conversation/user_messages.txt) usa
+os mesmos placeholders: MessageScript preenche as mensagens de cada usuário
+antes da conversa, e para um lote pré-gerado (USER_DATA_PRELOAD) preenche
+todos os usuários de uma vez com NumPy.
+"""
+import glob
+import json
+import re
+
+import numpy as np
+
+PERSONA_FIELDS = ('nome', 'telefone', 'email', 'cpf_formatted', 'cpf_numbers')
+
+_PLACEHOLDER = re.compile(r'\{(' + '|'.join(PERSONA_FIELDS) + r')\}')
+
+
+class PersonaTemplate:
+    """
+    Roteiro de uma persona já dividido em trechos fixos e campos do usuário
+
+    Args:
+        path: Arquivo de origem (também identifica a persona, ex.: no cache)
+        text: Conteúdo do arquivo
+    """
+
+    def __init__(self, path, text):
+        self.path = path
+        # split com um grupo alterna: trecho, campo, trecho, campo, ..., trecho
+        parts = _PLACEHOLDER.split(text)
+        self._literals = parts[0::2]
+        self._fields = parts[1::2]
+        self.fields = frozenset(self._fields)
+
+    def render(self, user_data):
+        """Texto da persona com os dados do usuário"""
+        out = [self._literals[0]]
+        for field, literal in zip(self._fields, self._literals[1:]):
+            out.append(str(user_data[field]))
+            out.append(literal)
+        return ''.join(out)
+
+    def render_columns(self, columns):
+        """
+        Preenche o texto para vários usuários de uma vez
+
+        Args:
+            columns: {campo: array NumPy de bytes UTF-8, um valor por usuário}
+
+        Returns:
+            numpy.ndarray: Texto de cada usuário, em bytes UTF-8
+        """
+        out = self._literals[0].encode()
+        for field, literal in zip(self._fields, self._literals[1:]):
+            out = np.char.add(np.char.add(out, columns[field]), literal.encode())
+        return out
+
+
+def load_persona_templates(pattern):
+    """
+    Lê e compila todas as personas que casam com o padrão
+
+    Args:
+        pattern: Padrão glob dos arquivos (ex.: "personas/persona_*.txt")
+
+    Returns:
+        dict: {caminho do arquivo: PersonaTemplate}, em ordem alfabética
+    """
+    templates = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r', encoding='utf-8') as f:
+            templates[path] = PersonaTemplate(path, f.read())
+    return templates
+
+
+class MessageScript:
+    """
+    Roteiro de mensagens fixas com placeholders (ex.: fixed_conversation/user_messages.txt)
+
+    Mensagens sem placeholders são as mesmas strings para todos os usuários;
+    as demais são preenchidas uma vez por usuário, antes da conversa.
+
+    Args:
+        messages: Lista de mensagens (templates)
+    """
+
+    def __init__(self, messages):
+        self.templates = [PersonaTemplate(f"#{i}", message) for i, message in enumerate(messages)]
+        self._batch = None
+        self._rendered = {}  # {índice da mensagem: textos do lote em bytes UTF-8}
+
+    def __len__(self):
+        return len(self.templates)
+
+    @classmethod
+    def load(cls, path):
+        """Lê o roteiro de um arquivo JSON com a lista de mensagens"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def prerender(self, batch):
+        """Preenche de uma vez as mensagens de todos os usuários de um UserDataBatch"""
+        columns = batch.columns()
+        self._rendered = {i: template.render_columns(columns)
+                          for i, template in enumerate(self.templates) if template.fields}
+        self._batch = batch
+
+    def messages_for(self, user_data):
+        """Mensagens já preenchidas com os dados do usuário, na ordem do roteiro"""
+        user_id = user_data['user_id']
+        if self._batch is not None and user_id in self._batch:
+            position = user_id - self._batch.start_id
+            return [self._rendered[i][position].decode() if i in self._rendered else template.render(user_data)
+                    for i, template in enumerate(self.templates)]
+        return [template.render(user_data) for template in self.templates]
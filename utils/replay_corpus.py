@@ -0,0 +1,176 @@
+"""
+Corpus de replay compilado a partir dos logs de conversa
+
+Lê os segmentos logs/conversations_*.jsonl gravados em segundo plano por
+save_conversation_log (uma conversa por linha) e os logs antigos de um
+arquivo por conversa (logs/conversation_*.json), e gera um corpus compacto com, para cada conversa, as mensagens do usuário, a
+latência do webhook de cada turno e o tempo de "pensar" entre a resposta e a
+próxima mensagem. Textos repetidos entre conversas (saudação, opt-in...) são
+guardados uma única vez na tabela `texts`, e `index` mapeia session_id para a
+posição da conversa.
+
+Uso:
+    python -m utils.replay_corpus logs/conversations_*.jsonl -o logs/replay_corpus.json.gz
+    python -m utils.replay_corpus logs/conversations_*.jsonl --latency-histogram logs/webhook_latencies.json
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+
+from utils.conversation_log import iter_segment
+
+CORPUS_VERSION = 1
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def extract_turns(log_data):
+    """
+    Extrai os turnos [(texto, webhook_ms, think_ms), ...] de um log de conversa
+
+    Logs com `turns` (tempos por turno) dão os valores medidos. Logs antigos,
+    sem `turns`, dividem total_time_ms igualmente entre os turnos e não têm
+    tempo de pensar; nesse caso `estimated` é True.
+    """
+    user_texts = [m['content'] for m in log_data.get('messages', []) if m.get('role') == 'user']
+    timings = log_data.get('turns') or []
+
+    if timings and len(timings) == len(user_texts):
+        turns = []
+        for i, (text, timing) in enumerate(zip(user_texts, timings)):
+            if i + 1 < len(timings):
+                answered_at = timing['sent_offset_ms'] + timing['webhook_ms']
+                think_ms = max(0, timings[i + 1]['sent_offset_ms'] - answered_at)
+            else:
+                think_ms = 0
+            turns.append((text, timing['webhook_ms'], think_ms))
+        return turns, False
+
+    total_ms = log_data.get('summary', {}).get('total_time_ms') or 0
+    per_turn_ms = round(total_ms / len(user_texts)) if user_texts else 0
+    return [(text, per_turn_ms, 0) for text in user_texts], True
+
+
+def read_logs(paths):
+    """(caminho, log) de cada conversa: um por arquivo .json, um por linha nos segmentos .jsonl"""
+    for path in sorted(paths):
+        if path.endswith('.jsonl'):
+            for log_data in iter_segment(path):
+                yield path, log_data
+        else:
+            with _open(path, 'r') as f:
+                yield path, json.load(f)
+
+
+def build_corpus(paths):
+    """Compila os logs de conversa em um corpus de replay"""
+    texts = []
+    text_ids = {}
+    conversations = []
+    index = {}
+
+    for path, log_data in read_logs(paths):
+        turns, estimated = extract_turns(log_data)
+        if not turns:
+            continue
+
+        encoded = []
+        for text, webhook_ms, think_ms in turns:
+            text_id = text_ids.get(text)
+            if text_id is None:
+                text_id = text_ids[text] = len(texts)
+                texts.append(text)
+            encoded.append([text_id, webhook_ms, think_ms])
+
+        summary = log_data.get('summary', {})
+        session_id = summary.get('session_id') or os.path.basename(path)
+        index[session_id] = len(conversations)
+        conversations.append({
+            'session_id': session_id,
+            'found_link': summary.get('found_link', False),
+            'estimated': estimated,
+            'turns': encoded
+        })
+
+    return {
+        'version': CORPUS_VERSION,
+        'texts': texts,
+        'conversations': conversations,
+        'index': index
+    }
+
+
+def save_corpus(corpus, path):
+    with _open(path, 'w') as f:
+        json.dump(corpus, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_corpus(path):
+    with _open(path, 'r') as f:
+        corpus = json.load(f)
+    if corpus.get('version') != CORPUS_VERSION:
+        raise ValueError(f"Unsupported replay corpus version: {corpus.get('version')}")
+    return corpus
+
+
+def conversation_turns(corpus, position):
+    """Devolve os turnos da conversa já com os textos: [(texto, webhook_ms, think_ms), ...]"""
+    texts = corpus['texts']
+    return [(texts[text_id], webhook_ms, think_ms)
+            for text_id, webhook_ms, think_ms in corpus['conversations'][position]['turns']]
+
+
+def turn_offsets(turns, speed=1.0):
+    """
+    Cronograma gravado: segundos desde o início da conversa até o envio de cada turno
+
+    Args:
+        turns: Turnos de conversation_turns
+        speed: REPLAY_SPEED (0 = sem cronograma, devolve None)
+    """
+    if speed <= 0:
+        return None
+    offsets, elapsed_ms = [], 0
+    for _, webhook_ms, think_ms in turns:
+        offsets.append(elapsed_ms / 1000 / speed)
+        elapsed_ms += webhook_ms + think_ms
+    return offsets
+
+
+def webhook_latencies(corpus):
+    """Latências de webhook medidas (ms), no formato de histograma do mock_voyager.py"""
+    return [webhook_ms
+            for conversation in corpus['conversations'] if not conversation['estimated']
+            for _, webhook_ms, _ in conversation['turns']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="*", default=["logs/conversations_*.jsonl", "logs/conversation_*.json"],
+                        help="arquivos de log (aceita globs)")
+    parser.add_argument("-o", "--output", default="logs/replay_corpus.json.gz")
+    parser.add_argument("--latency-histogram", help="também grava as latências medidas para o MOCK_LATENCY")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.logs for path in glob.glob(pattern)})
+    corpus = build_corpus(paths)
+    save_corpus(corpus, args.output)
+
+    total_turns = sum(len(c['turns']) for c in corpus['conversations'])
+    print(f"💾 Replay corpus saved to: {args.output}")
+    print(f"   {len(corpus['conversations'])} conversations, {total_turns} turns, {len(corpus['texts'])} unique texts")
+
+    if args.latency_histogram:
+        with open(args.latency_histogram, 'w', encoding='utf-8') as f:
+            json.dump(webhook_latencies(corpus), f)
+        print(f"💾 Webhook latency samples saved to: {args.latency_histogram}")
+
+
+if __name__ == "__main__":
+    main()
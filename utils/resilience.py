@@ -0,0 +1,196 @@
+"""
+Retry com backoff exponencial e circuit breaker por dependência
+
+RetryPolicy decide quantas tentativas fazer e quanto esperar entre elas
+(backoff exponencial com "full jitter", para que os usuários não tentem de
+novo todos ao mesmo tempo) e limita o total de retries do processo a uma
+fração das requisições (orçamento), para não multiplicar a carga durante uma
+queda.
+
+CircuitBreaker abre depois de `failure_threshold` falhas seguidas: enquanto
+aberto, as chamadas falham na hora (CircuitOpenError) sem tocar na
+dependência. Depois de `recovery_timeout` segundos ele deixa passar uma
+chamada de teste (meio-aberto) e fecha se ela der certo. Só o resultado da
+própria chamada de teste muda o estado: resultados atrasados de chamadas
+anteriores (um webhook que chega depois da abertura) são contados, mas não
+fecham nem reabrem o circuito. Cada troca de estado fica registrada na linha
+do tempo (`timeline`).
+"""
+import random
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada porque o circuit breaker da dependência está aberto"""
+
+
+class RetryPolicy:
+    """
+    Política de retry com backoff exponencial, full jitter e orçamento
+
+    Args:
+        max_attempts: Tentativas por chamada (1 = sem retry)
+        base_delay: Espera base em segundos (dobra a cada tentativa)
+        max_delay: Teto da espera em segundos
+        budget_ratio: Retries que cada requisição acrescenta ao orçamento
+        budget_reserve: Orçamento inicial e máximo de retries acumulados
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=20.0, budget_ratio=0.2, budget_reserve=10):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_reserve = budget_reserve
+        self._budget = float(budget_reserve)
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self.stats = {'requests': 0, 'retries': 0, 'budget_exhausted': 0}
+
+    def record_request(self):
+        """Conta a primeira tentativa de uma chamada (alimenta o orçamento)"""
+        with self._lock:
+            self.stats['requests'] += 1
+            self._budget = min(self.budget_reserve, self._budget + self.budget_ratio)
+
+    def can_retry(self):
+        """Consome um retry do orçamento; False se ele acabou"""
+        with self._lock:
+            if self._budget >= 1:
+                self._budget -= 1
+                self.stats['retries'] += 1
+                return True
+            self.stats['budget_exhausted'] += 1
+            return False
+
+    def backoff(self, attempt):
+        """Espera antes da tentativa seguinte à `attempt` (0 = primeira): uniforme em [0, base * 2^attempt]"""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de uma dependência (ex.: "Gemini", "Voyager")
+
+    Args:
+        name: Nome da dependência (usado nos eventos e no resumo)
+        failure_threshold: Falhas seguidas que abrem o circuito
+        recovery_timeout: Segundos aberto antes de testar a dependência de novo
+        probe_timeout: Prazo da chamada de teste (padrão: recovery_timeout): sem
+            record_success/record_failure nesse prazo (greenlet morto, exceção
+            não tratada) ela é dada como perdida e a próxima chamada vira o novo
+            teste. Deve cobrir a chamada inteira (na Voyager, até o webhook)
+        on_state_change: Callback chamado com (name, estado anterior, novo estado)
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30, probe_timeout=None, on_state_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe_timeout = recovery_timeout if probe_timeout is None else probe_timeout
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+        self._probe_id = 0
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.timeline = []
+        self.stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0, 'abandoned_probes': 0}
+
+    def _transition(self, new_state, now):
+        """Troca de estado e registra na linha do tempo; deve ser chamado com o lock"""
+        old_state = self.state
+        self.state = new_state
+        self.timeline.append({
+            'at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)),
+            'elapsed_s': round(now - self.started_at, 3),
+            'from': old_state,
+            'to': new_state,
+            'consecutive_failures': self._failures
+        })
+        if new_state == OPEN:
+            self._opened_at = now
+            self.stats['opened'] += 1
+        return old_state
+
+    def _notify(self, change):
+        if change and self.on_state_change:
+            self.on_state_change(self.name, *change)
+
+    def before_call(self):
+        """
+        Libera a chamada ou levanta CircuitOpenError se o circuito estiver aberto
+
+        Returns:
+            int: Id da chamada de teste (None para uma chamada comum), a passar
+                para record_success/record_failure
+        """
+        change = None
+        with self._lock:
+            now = time.time()
+            if self.state == OPEN and now - self._opened_at >= self.recovery_timeout:
+                change = (self._transition(HALF_OPEN, now), HALF_OPEN)
+            if (self.state == HALF_OPEN and self._probe_in_flight
+                    and now - self._probe_started_at >= self.probe_timeout):
+                # A chamada de teste nunca registrou o resultado: libera um novo teste
+                self._probe_in_flight = False
+                self.stats['abandoned_probes'] += 1
+            probe = None
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probe_in_flight):
+                self.stats['rejected'] += 1
+                rejected = True
+            else:
+                if self.state == HALF_OPEN:
+                    self._probe_id += 1
+                    self._probe_in_flight = True
+                    self._probe_started_at = now
+                    probe = self._probe_id
+                rejected = False
+        self._notify(change)
+        if rejected:
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        return probe
+
+    def _is_current_probe(self, probe):
+        """Resultado da chamada de teste em andamento; deve ser chamado com o lock"""
+        return self.state == HALF_OPEN and self._probe_in_flight and probe == self._probe_id
+
+    def record_success(self, probe=None):
+        """Sucesso de uma chamada (`probe`: o retorno de before_call)"""
+        change = None
+        with self._lock:
+            self.stats['successes'] += 1
+            if self.state == CLOSED:
+                self._failures = 0
+            elif self._is_current_probe(probe):
+                self._failures = 0
+                self._probe_in_flight = False
+                change = (self._transition(CLOSED, time.time()), CLOSED)
+        self._notify(change)
+
+    def record_failure(self, probe=None):
+        """Falha de uma chamada (`probe`: o retorno de before_call)"""
+        change = None
+        with self._lock:
+            self.stats['failures'] += 1
+            if self.state == CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    change = (self._transition(OPEN, time.time()), OPEN)
+            elif self._is_current_probe(probe):
+                self._failures += 1
+                self._probe_in_flight = False
+                change = (self._transition(OPEN, time.time()), OPEN)
+        self._notify(change)
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, state=self.state, timeline=list(self.timeline))
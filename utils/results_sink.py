@@ -0,0 +1,168 @@
+"""
+Resultados das conversas gravados em streaming (JSONL)
+
+Cada conversa encerrada vira uma linha no arquivo de resultados (sem as
+mensagens, que ficam nos segmentos do log de conversas, utils/conversation_log.py)
+e os totais do resumo final são somados na hora. Nada fica acumulado em
+memória: o uso é o mesmo em um teste de 5 minutos ou de 5 horas, e se o
+processo cair as conversas já gravadas continuam no arquivo.
+
+Como no log de conversas, o usuário só coloca a linha em uma fila
+(utils/batch_writer.py): as linhas são gravadas em lotes, cada um descarregado
+com um flush, fora do hub. O escritor é iniciado com start() e encerrado com
+close().
+
+Com `compress=True` o arquivo é gzip (.jsonl.gz); o flush de cada lote é de
+sincronização, então um arquivo interrompido ainda pode ser lido até o último
+lote gravado.
+"""
+import gzip
+import json
+import os
+import zlib
+from threading import Lock
+
+from utils.batch_writer import BatchWriter
+
+# Campos da conversa copiados para a linha do JSONL (os ausentes são omitidos)
+SUMMARY_FIELDS = ('session_id', 'user_id', 'timestamp', 'iterations', 'total_messages',
+                  'found_link', 'total_time_ms', 'cost', 'error',
+                  'last_stage', 'drop_off_stage', 'time_to_stage_ms')
+
+
+class ResultsSink:
+    """
+    Arquivo JSONL de resultados com os totais calculados incrementalmente
+
+    Args:
+        path: Arquivo de saída (criado no primeiro lote gravado; substitui um
+            arquivo de mesmo nome, como o resumo .json)
+        compress: Grava em gzip
+        batch_size: Máximo de linhas gravadas por lote
+    """
+
+    def __init__(self, path, compress=False, batch_size=50):
+        self.path = path + '.gz' if compress and not path.endswith('.gz') else path
+        self.compress = compress
+        self._file = None  # Só a thread que grava o lote mexe nele
+        self._lock = Lock()
+        self._writer = BatchWriter(self._write_lines, close_files=self._close_file, batch_size=batch_size)
+        self.totals = {
+            'conversations': 0,
+            'successful': 0,
+            'iterations': 0,
+            'messages': 0,
+            'time_ms': 0.0,
+            'cost': 0.0,
+            'gemini_input_tokens': 0,
+            'gemini_output_tokens': 0
+        }
+        self._turn_tokens = {}  # {iteration: [soma dos tokens de entrada, turnos]}
+
+    def __len__(self):
+        return self.totals['conversations']
+
+    @property
+    def write_errors(self):
+        return self._writer.stats['errors']
+
+    @property
+    def last_error(self):
+        return self._writer.last_error
+
+    def start(self):
+        """Inicia o escritor em segundo plano"""
+        self._writer.start()
+        return self
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.compress:
+            return gzip.open(self.path, 'wt', encoding='utf-8')
+        return open(self.path, 'w', encoding='utf-8')
+
+    def record(self, conversation):
+        """Soma os números da conversa aos totais e entrega a linha ao escritor em segundo plano"""
+        line = {field: conversation[field] for field in SUMMARY_FIELDS if field in conversation}
+        text = json.dumps(line, ensure_ascii=False) + '\n'
+        with self._lock:
+            totals = self.totals
+            totals['conversations'] += 1
+            totals['successful'] += 1 if conversation['found_link'] else 0
+            totals['iterations'] += conversation['iterations']
+            totals['messages'] += conversation['total_messages']
+            totals['time_ms'] += conversation['total_time_ms']
+            totals['cost'] += conversation.get('cost', 0)
+            totals['gemini_input_tokens'] += conversation.get('gemini_input_tokens', 0)
+            totals['gemini_output_tokens'] += conversation.get('gemini_output_tokens', 0)
+            for turn in conversation.get('turns', []):
+                if 'gemini_input_tokens' in turn:
+                    sums = self._turn_tokens.setdefault(turn['iteration'], [0, 0])
+                    sums[0] += turn['gemini_input_tokens']
+                    sums[1] += 1
+
+        self._writer.put(text)
+
+    def _write_lines(self, lines):
+        """Grava um lote (roda em uma thread do threadpool, fora do hub)"""
+        if self._file is None:
+            self._file = self._open()
+        self._file.write(''.join(lines))
+        self._file.flush()
+
+    def avg_input_tokens_by_turn(self):
+        """Média de tokens de entrada do Gemini em cada turno, {"1": 812.0, "2": 1034.5, ...}"""
+        with self._lock:
+            return {str(i): round(total / count, 1) for i, (total, count) in sorted(self._turn_tokens.items())}
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self, timeout=30):
+        """Grava as linhas ainda na fila e fecha o arquivo"""
+        self._writer.close(timeout)
+
+
+def _gzip_lines(path, chunk_size=1 << 16):
+    """Linhas completas de um .gz, inclusive de um arquivo interrompido (sem o fim do stream)"""
+    decompressor = zlib.decompressobj(wbits=31)
+    rest = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            data = decompressor.decompress(chunk)
+            # Um arquivo pode ter mais de um membro gzip (ex.: arquivos concatenados)
+            while decompressor.eof and decompressor.unused_data:
+                unused = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=31)
+                data += decompressor.decompress(unused)
+            *lines, rest = (rest + data).split(b'\n')
+            for line in lines:
+                yield line.decode('utf-8')
+
+
+def _text_lines(path):
+    """Linhas completas de um .jsonl (uma última linha sem quebra foi interrompida)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.endswith('\n'):
+                yield line
+
+
+def read_results(path):
+    """
+    Lê as conversas de um arquivo de resultados (.jsonl ou .jsonl.gz), uma por vez
+
+    Funciona também com o arquivo de um teste que caiu: uma última linha
+    incompleta é ignorada.
+    """
+    lines = _gzip_lines(path) if path.endswith('.gz') else _text_lines(path)
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
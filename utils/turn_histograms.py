@@ -0,0 +1,149 @@
+"""
+Histogramas de latência por turno da conversa (estilo HDR)
+
+No Locust todos os turnos caem em uma única entrada ("Voyager Webhook",
+"Gemini Response"), mas o turno 1 (saudação) e o turno que gera o link de
+pagamento se comportam de forma bem diferente do lado do Voyager. Aqui cada
+etapa (POST aceito, espera do webhook, Gemini) tem um histograma por número do
+turno.
+
+LatencyHistogram segue o HdrHistogram: buckets log-lineares com precisão fixa
+(`significant_digits`) em toda a faixa, em uma lista de contadores de tamanho
+fixo (~3 mil contadores para 1 µs .. 10 min com 2 dígitos, ~1%). Gravar é O(1)
+e a memória não cresce com a duração do teste; valores acima de `max_ms` são
+contados no maior valor.
+
+    tracker = TurnLatencyTracker(max_ms=600_000)
+    tracker.record("voyager_webhook", turn=1, ms=812.4)
+    tracker.summary()  # {"voyager_webhook": {"1": {"count": 1, "p50": 812.0, ...}}}
+"""
+import bisect
+import math
+from itertools import accumulate
+
+# Percentis exportados no resumo: {nome: percentil}
+PERCENTILES = {'p50': 50.0, 'p90': 90.0, 'p99': 99.0, 'p99.9': 99.9}
+
+
+class LatencyHistogram:
+    """
+    Histograma HDR de latências (gravadas em ms, contadas em µs)
+
+    Args:
+        max_ms: Maior latência rastreada; valores acima contam como max_ms
+        significant_digits: Dígitos de precisão mantidos em toda a faixa (1-5)
+    """
+
+    def __init__(self, max_ms=600_000, significant_digits=2):
+        if not 1 <= significant_digits <= 5:
+            raise ValueError("significant_digits must be between 1 and 5")
+        self.max_ms = max_ms
+        self.significant_digits = significant_digits
+        self.highest = max(2, int(max_ms * 1000))
+
+        # Cada bucket dobra a faixa do anterior com o mesmo número de sub-buckets
+        sub_bucket_count = 2 ** math.ceil(math.log2(2 * 10 ** significant_digits))
+        self._half_count = sub_bucket_count // 2
+        self._half_magnitude = self._half_count.bit_length() - 1
+        self._mask = sub_bucket_count - 1
+        bucket_count = 1
+        while sub_bucket_count << (bucket_count - 1) <= self.highest:
+            bucket_count += 1
+        self.counts = [0] * ((bucket_count + 1) * self._half_count)
+
+        self.count = 0
+        self.clamped = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def _index(self, value):
+        bucket = (value | self._mask).bit_length() - (self._half_magnitude + 1)
+        sub_bucket = value >> bucket
+        return ((bucket + 1) << self._half_magnitude) + sub_bucket - self._half_count
+
+    def _highest_equivalent(self, index):
+        """Maior valor (µs) que cai no contador `index`"""
+        bucket = (index >> self._half_magnitude) - 1
+        sub_bucket = (index & (self._half_count - 1)) + self._half_count
+        if bucket < 0:
+            sub_bucket -= self._half_count
+            bucket = 0
+        return ((sub_bucket + 1) << bucket) - 1
+
+    def record(self, ms):
+        """Grava uma latência em ms"""
+        value = int(ms * 1000) if ms > 0 else 0
+        if value > self.highest:
+            value = self.highest
+            self.clamped += 1
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total_us += value
+        if value > self.max_us:
+            self.max_us = value
+
+    def __len__(self):
+        return self.count
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """{nome: latência em ms} (valor mais alto equivalente do bucket, como o HdrHistogram)"""
+        if not self.count:
+            return {name: 0.0 for name in percentiles}
+        cumulative = list(accumulate(self.counts))
+        result = {}
+        for name, percentile in percentiles.items():
+            target = max(1, math.ceil(percentile / 100 * self.count))
+            index = bisect.bisect_left(cumulative, target)
+            value = min(self._highest_equivalent(index), self.max_us)
+            result[name] = round(value / 1000, 1)
+        return result
+
+    def summary(self):
+        return dict(
+            count=self.count,
+            **self.percentiles(),
+            max=round(self.max_us / 1000, 1),
+            mean=round(self.total_us / self.count / 1000, 1) if self.count else 0.0,
+            clamped=self.clamped
+        )
+
+
+class TurnLatencyTracker:
+    """
+    Um LatencyHistogram por (etapa, turno)
+
+    Args:
+        max_turns: Turnos com histograma próprio; os seguintes entram no último
+        max_ms: Maior latência rastreada (ver LatencyHistogram)
+        significant_digits: Precisão dos histogramas
+    """
+
+    def __init__(self, max_turns=50, max_ms=600_000, significant_digits=2):
+        self.max_turns = max_turns
+        self.max_ms = max_ms
+        self.significant_digits = significant_digits
+        self._histograms = {}  # {etapa: {turno: LatencyHistogram}}
+
+    def record(self, stage, turn, ms):
+        """Grava a latência (ms) de uma etapa no turno `turn` (1, 2, ...)"""
+        turn = min(turn, self.max_turns)
+        by_turn = self._histograms.setdefault(stage, {})
+        histogram = by_turn.get(turn)
+        if histogram is None:
+            histogram = by_turn[turn] = LatencyHistogram(self.max_ms, self.significant_digits)
+        histogram.record(ms)
+
+    def summary(self):
+        """{etapa: {"turno": {count, p50, p90, p99, p99.9, max, mean, clamped}}}"""
+        return {stage: {str(turn): by_turn[turn].summary() for turn in sorted(by_turn)}
+                for stage, by_turn in self._histograms.items()}
+
+    def worst_turns(self, percentile='p99'):
+        """{etapa: (turno, latência em ms)} do turno com o maior percentil em cada etapa"""
+        worst = {}
+        for stage, by_turn in self._histograms.items():
+            values = {turn: histogram.percentiles({percentile: PERCENTILES[percentile]})[percentile]
+                      for turn, histogram in by_turn.items()}
+            turn = max(values, key=values.get)
+            worst[stage] = (turn, values[turn])
+        return worst
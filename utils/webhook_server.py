@@ -0,0 +1,75 @@
+import json
+import logging
+import socket
+
+from gevent.pywsgi import WSGIServer
+
+logger = logging.getLogger(__name__)
+
+
+class _NoDelayWSGIServer(WSGIServer):
+    """WSGIServer com TCP_NODELAY nas conexões aceitas"""
+
+    def handle(self, sock, address):
+        # O pywsgi envia cabeçalhos e corpo em dois writes; com Nagle + ACK
+        # atrasado do cliente isso soma ~40ms a cada webhook em keep-alive
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().handle(sock, address)
+
+
+def _json_response(start_response, status, body):
+    data = json.dumps(body).encode('utf-8')
+    start_response(status, [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(data)))
+    ])
+    return [data]
+
+
+def make_webhook_app(store, webhook_path="/responses"):
+    """
+    Cria uma app WSGI mínima com as mesmas rotas do receptor Flask
+
+    POST {webhook_path}/<session_id> guarda o payload no store e
+    GET /health devolve o número de respostas armazenadas.
+    """
+    prefix = webhook_path.rstrip('/') + '/'
+
+    def app(environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '')
+
+        if method == 'POST' and path.startswith(prefix) and len(path) > len(prefix):
+            session_id = path[len(prefix):]
+            try:
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+                payload = json.loads(environ['wsgi.input'].read(length) or b'null')
+
+                store.put(session_id, payload)
+
+                logger.debug(f"✅ Webhook recebido para session_id: {session_id}")
+                logger.debug(f"Payload: {payload}")
+
+                return _json_response(start_response, '200 OK', {"status": "received"})
+            except Exception as e:
+                logger.error(f"❌ Erro ao processar webhook: {e}")
+                return _json_response(start_response, '500 Internal Server Error', {"error": str(e)})
+
+        if method == 'GET' and path == '/health':
+            return _json_response(start_response, '200 OK', {"status": "ok", "responses_count": len(store)})
+
+        return _json_response(start_response, '404 Not Found', {"error": "not found"})
+
+    return app
+
+
+def start_gevent_server(app, host, port):
+    """
+    Inicia o receptor de webhooks no próprio hub do gevent (mesmo do Locust)
+
+    Não cria thread: o servidor roda em greenlets, lado a lado com os usuários.
+    Retorna o WSGIServer para que possa ser parado no encerramento.
+    """
+    server = _NoDelayWSGIServer((host, port), app, log=None)
+    server.start()
+    return server
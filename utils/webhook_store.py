@@ -0,0 +1,195 @@
+import time
+from collections import namedtuple
+from threading import Event, Lock
+
+# Resposta completa de um turno: payload combinado, instante do primeiro e do
+# último webhook (time.time()) e quantos webhooks compuseram o turno
+WebhookTurn = namedtuple('WebhookTurn', ['payload', 'first_at', 'last_at', 'parts'])
+
+
+class _Entry:
+    __slots__ = ('payloads', 'first_at', 'last_at', 'read', 'done')
+
+    def __init__(self, payload, now, done):
+        self.payloads = [payload]
+        self.first_at = now
+        self.last_at = now
+        self.read = False
+        self.done = done
+
+
+def merge_payloads(payloads):
+    """
+    Combina os webhooks de um mesmo turno em um único payload
+
+    As listas `messages` são concatenadas na ordem de chegada; partes sem
+    `messages` mas com texto em `text`/`content`/`message` viram uma mensagem.
+    Os demais campos vêm do último webhook.
+    """
+    if len(payloads) == 1:
+        return payloads[0]
+    if not all(isinstance(p, dict) for p in payloads):
+        return payloads[-1]
+
+    merged = dict(payloads[-1])
+    messages = []
+    for payload in payloads:
+        if payload.get('messages'):
+            messages.extend(payload['messages'])
+        else:
+            text = payload.get('text') or payload.get('content') or payload.get('message')
+            if text:
+                messages.append({'role': 'assistant', 'type': 'text', 'text': text})
+    merged['messages'] = messages
+    return merged
+
+
+class WebhookStore:
+    """
+    Armazena as respostas dos webhooks e acorda quem está esperando por elas
+
+    Cada sessão aguardada ganha um Event próprio: o handler do webhook sinaliza
+    o evento da sessão e o usuário acorda na hora, sem polling. Sob o gevent do
+    Locust, threading.Event é cooperativo, então a espera não bloqueia o hub.
+
+    Um turno pode chegar em vários webhooks: eles são acumulados até passar
+    `coalesce_window` segundos sem novidade ou chegar um payload com
+    `end_of_turn_field` verdadeiro. Com `coalesce_window=0` o turno fecha no
+    primeiro webhook.
+
+    As entradas expiram após `ttl` segundos. Um webhook que chega depois de o
+    turno ser fechado (timeout ou já entregue) é contado como atrasado
+    (`on_late`) e descartado; um webhook que expira sem nunca ter sido lido é
+    contado como órfão (`on_orphan`). Os callbacks recebem (session_id, segundos).
+    """
+
+    def __init__(self, clear_after_read=True, ttl=300, on_late=None, on_orphan=None,
+                 coalesce_window=0.0, end_of_turn_field=None):
+        self.clear_after_read = clear_after_read
+        self.ttl = ttl
+        self.on_late = on_late
+        self.on_orphan = on_orphan
+        self.coalesce_window = coalesce_window
+        self.end_of_turn_field = end_of_turn_field
+        self._lock = Lock()
+        self._responses = {}
+        self._waiters = {}
+        self._closed = {}  # session_id -> instante em que o turno foi fechado
+        self._sweep_interval = max(1.0, ttl / 10)
+        self._last_sweep = time.time()
+        self.stats = {'received': 0, 'late': 0, 'orphaned': 0, 'evicted': 0, 'multi_part_turns': 0}
+
+    def __len__(self):
+        return len(self._responses)
+
+    def _is_end_of_turn(self, payload):
+        return bool(self.end_of_turn_field and isinstance(payload, dict)
+                    and payload.get(self.end_of_turn_field))
+
+    def put(self, session_id, payload):
+        """Guarda o payload recebido e acorda o usuário que aguarda a sessão"""
+        now = time.time()
+        late_by = None
+        waiter = None
+        with self._lock:
+            self.stats['received'] += 1
+            closed_at = self._closed.get(session_id)
+            if closed_at is not None:
+                # Ninguém mais vai ler esta resposta
+                self.stats['late'] += 1
+                late_by = now - closed_at
+            else:
+                entry = self._responses.get(session_id)
+                if entry is None:
+                    self._responses[session_id] = _Entry(payload, now, self._is_end_of_turn(payload))
+                else:
+                    entry.payloads.append(payload)
+                    entry.last_at = now
+                    entry.done = entry.done or self._is_end_of_turn(payload)
+                waiter = self._waiters.get(session_id)
+            orphans = self._sweep(now)
+
+        if late_by is not None:
+            if self.on_late:
+                self.on_late(session_id, late_by)
+        elif waiter is not None:
+            waiter.set()
+        self._report_orphans(orphans)
+
+    def _close(self, session_id, entry, now):
+        """Fecha o turno e devolve o WebhookTurn; deve ser chamado com o lock"""
+        if self.clear_after_read:
+            del self._responses[session_id]
+        entry.read = True
+        self._closed[session_id] = now
+        if len(entry.payloads) > 1:
+            self.stats['multi_part_turns'] += 1
+        return WebhookTurn(merge_payloads(entry.payloads), entry.first_at, entry.last_at, len(entry.payloads))
+
+    def _sweep(self, now):
+        """Remove entradas mais velhas que o TTL; deve ser chamado com o lock"""
+        if now - self._last_sweep < self._sweep_interval:
+            return []
+        self._last_sweep = now
+        cutoff = now - self.ttl
+
+        orphans = []
+        for session_id, entry in list(self._responses.items()):
+            if entry.last_at < cutoff:
+                del self._responses[session_id]
+                self.stats['evicted'] += 1
+                if not entry.read:
+                    self.stats['orphaned'] += 1
+                    orphans.append((session_id, now - entry.first_at))
+
+        for session_id, closed_at in list(self._closed.items()):
+            if closed_at < cutoff:
+                del self._closed[session_id]
+
+        return orphans
+
+    def _report_orphans(self, orphans):
+        if self.on_orphan:
+            for session_id, age in orphans:
+                self.on_orphan(session_id, age)
+
+    def wait(self, session_id, timeout):
+        """
+        Aguarda o turno completo da sessão
+
+        Args:
+            session_id: ID da sessão para aguardar
+            timeout: Tempo máximo de espera em segundos
+
+        Returns:
+            WebhookTurn: Payload combinado e tempos de chegada, ou None se timeout
+        """
+        deadline = time.time() + timeout
+        waiter = Event()
+        with self._lock:
+            self._waiters[session_id] = waiter
+
+        try:
+            while True:
+                with self._lock:
+                    now = time.time()
+                    entry = self._responses.get(session_id)
+                    if entry is not None and not entry.read:
+                        quiet_for = now - entry.last_at
+                        if entry.done or quiet_for >= self.coalesce_window or now >= deadline:
+                            return self._close(session_id, entry, now)
+                        remaining = min(self.coalesce_window - quiet_for, deadline - now)
+                    elif now >= deadline:
+                        # Timeout: se o webhook chegar depois, conta como atrasado
+                        self._closed[session_id] = now
+                        return None
+                    else:
+                        remaining = deadline - now
+                    waiter.clear()
+
+                waiter.wait(remaining)
+        finally:
+            with self._lock:
+                self._waiters.pop(session_id, None)
+                orphans = self._sweep(time.time())
+            self._report_orphans(orphans)